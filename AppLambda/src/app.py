@@ -28,6 +28,7 @@ services = ServiceFactory()
 
 
 ### Route Setup ###
+from .clients import aws  # noqa: E402
 from .routes import account_linking, alexa, auth, core, event_handlers, mealie, todoist  # noqa: E402
 
 # Mypy bugs out when determining the router types, so we ignore the type errors
@@ -61,4 +62,14 @@ def home():
 sqs_handler = SQS.with_path(app.url_path_for("sqs_sync_event_handler"))
 
 # this enables API Gateway to invoke our app as a Lambda function
-handler = Mangum(app, custom_handlers=[sqs_handler])
+mangum_handler = Mangum(app, custom_handlers=[sqs_handler])
+
+
+def handler(event, context):
+    # long-running calls (e.g. waiting for Alexa callbacks) stop early if the invocation is about to time out
+    aws.set_invocation_deadline(aws.get_lambda_deadline(context))
+    try:
+        return mangum_handler(event, context)
+
+    finally:
+        services.metrics.flush()
@@ -40,9 +40,69 @@ class AppSettings(BaseSettings):
     ### App ###
     sync_event_sqs_queue_name: str = ""
     sync_event_dev_sqs_queue_name = ""
+
+    sync_event_max_concurrent_groups: int = 4
+    """Max number of SQS message groups (i.e. list maps) processed concurrently in a single batch"""
+
+    sync_event_coalesce_ttl_seconds: int = 60 * 10
+    """Number of seconds a completed sync is remembered, so older events for the same list can be skipped"""
+
+    sync_event_coalesce_margin_seconds: int = 2
+    """Events must be at least this many seconds older than a completed sync to be skipped"""
+
+    sync_event_deadline_buffer_seconds: int = 15
+    """New sync events aren't started if fewer than this many seconds remain before the Lambda times out"""
+
+    mealie_sync_debounce_seconds: int = 0
+    """
+    If set, Mealie notifications are debounced: the first notification for a list in each window of this many
+    seconds schedules a full list sync for when the window closes, and later notifications in the window are
+    absorbed by it. Scheduled syncs are hidden in the queue until the window closes, rather than waiting in the
+    Lambda, so the window may be longer than the Lambda timeout. Must not exceed the SQS FIFO deduplication
+    interval (5 minutes), and should be well below the queue's message retention period
+    """
+
+    todoist_sync_debounce_seconds: int = 0
+    """If set, Todoist webhooks are debounced the same way as `mealie_sync_debounce_seconds`"""
+
+    sync_fingerprints_enabled: bool = True
+    """Whether to skip comparing every item in a list map when neither side has changed since the last sync"""
+
+    expected_changes_enabled: bool = True
+    """Whether to ignore Alexa and Todoist notifications of changes this app made itself"""
+
+    expected_changes_ttl_seconds: int = 60 * 2
+    """Number of seconds to wait for a notification of a change this app made before the change is forgotten"""
+
+    item_links_enabled: bool = True
+    """Whether to store the links between Mealie items and Alexa items/Todoist tasks in DynamoDB"""
+
+    item_links_mirror_to_extras: bool = False
+    """
+    Whether to also write new links to Mealie item extras, which costs an extra Mealie write (and the sync it triggers)
+
+    Links are always written to extras if `item_links_enabled` is disabled
+    """
+
     debug: bool = False
     use_whitelist: bool = True
 
+    ### HTTP ###
+    http_pool_connections: int = 10
+    """Number of connection pools each per-host session caches"""
+
+    http_pool_maxsize: int = 10
+    """Max number of keep-alive connections per host"""
+
+    http_timeout_seconds: int = 30
+    """Default timeout for outbound HTTP requests which don't specify their own timeout"""
+
+    ### Metrics ###
+    metrics_enabled: bool = True
+    """Whether to write CloudWatch embedded metrics to the logs"""
+
+    metrics_namespace: str = "UnifiedShoppingList"
+
     ### Database ###
     access_token_expire_minutes: int = 60 * 24 * 30
     """Default token expiration time in minutes"""
@@ -67,6 +127,18 @@ class AppSettings(BaseSettings):
     users_tablename: str = "shopping-list-api-users"
     users_pk: str = "username"
 
+    alexa_list_shadow_tablename: str = "alexa-list-shadows"
+    alexa_list_shadow_pk: str = "list_id"
+
+    item_links_tablename: str = "shopping-list-item-links"
+    item_links_pk: str = "link_key"
+
+    sync_fingerprints_tablename: str = "list-sync-fingerprints"
+    sync_fingerprints_pk: str = "fingerprint_key"
+
+    expected_changes_tablename: str = "expected-sync-changes"
+    expected_changes_pk: str = "change_key"
+
     ### API ###
     rate_limit_minutely_read: int = 60
     """Number of times per minute a "read" API can be called"""
@@ -82,12 +154,64 @@ class AppSettings(BaseSettings):
     alexa_internal_source_id: str = "shopping_list_api"
     alexa_api_source_id: str = "user_api"
 
+    alexa_callback_poll_initial_interval_seconds: float = 0.05
+    """Number of seconds to wait before polling for an Alexa callback the second time"""
+
+    alexa_callback_poll_max_interval_seconds: float = 1
+    """Max number of seconds to wait between polls for an Alexa callback"""
+
+    alexa_callback_poll_backoff_multiplier: float = 2
+    """Multiplier applied to the polling interval after each poll that doesn't find the Alexa callback"""
+
+    alexa_callback_poll_timeout_seconds: float = 20
+    """Max number of seconds to wait for an Alexa callback"""
+
+    alexa_callback_poll_deadline_buffer_seconds: float = 1
+    """Stop waiting for an Alexa callback this many seconds before the Lambda times out"""
+
+    alexa_list_shadow_enabled: bool = True
+    """Whether to serve Alexa list reads from the shadow copy maintained from Alexa list events"""
+
+    alexa_list_shadow_max_age_seconds: int = 60 * 60
+    """Shadow copies older than this are refreshed from Alexa, even if no list events were received"""
+
     ### Mealie ###
     mealie_integration_id: str = "shopping_list_api"
     mealie_apprise_notifier_url_template: str = (
         "jsons://{full_path}?-username={username}&-security_hash={security_hash}"
     )
 
+    mealie_catalog_cache_ttl_seconds: int = 60 * 10
+    """Number of seconds a Mealie catalog (recipes, foods, labels) is cached in a warm container"""
+
+    mealie_catalog_cache_max_size: int = 100
+    """Max number of Mealie instances whose catalogs are cached in a warm container"""
+
+    mealie_pagination_per_page: int = 50
+    """Number of records to request per page when paginating through the Mealie API"""
+
+    mealie_pagination_max_concurrent_pages: int = 4
+    """Max number of pages fetched concurrently when paginating through the Mealie API"""
+
+    mealie_targeted_sync: bool = True
+    """Whether to sync only the items changed by a Mealie event notification, rather than the entire list"""
+
+    mealie_query_filter_max_ids: int = 50
+    """Max number of ids to include in a single Mealie query filter, to keep request URLs short"""
+
+    mealie_food_match_shortlist_size: int = 50
+    """
+    Max number of candidate foods scored when fuzzy matching a food
+
+    Catalogs with this many foods (including aliases) or fewer are always fully scored
+    """
+
+    mealie_food_match_full_scan_margin: int = 5
+    """
+    If the best shortlisted food scores less than this many points (0 - 100) above the confidence threshold,
+    every food in the catalog is scored instead, in case a better match wasn't shortlisted
+    """
+
     ### Todoist ###
     todoist_auth_request_url: str = "https://todoist.com/oauth/authorize"
     todoist_token_exchange_url: str = "https://todoist.com/oauth/access_token"
@@ -95,3 +219,31 @@ class AppSettings(BaseSettings):
     """https://developer.todoist.com/guides/#step-1-authorization-request"""
 
     todoist_mealie_label: str = "Mealie"
+
+    todoist_verify_task_updates: bool = False
+    """Whether to fetch each task from Todoist after updating it, rather than applying the update locally"""
+
+    todoist_section_catalog_cache_ttl_seconds: int = 60 * 10
+    """Number of seconds a Todoist project's sections are cached in a warm container"""
+
+    todoist_section_catalog_cache_max_size: int = 500
+    """Max number of Todoist projects whose sections are cached in a warm container"""
+
+    todoist_targeted_sync: bool = True
+    """Whether to sync only the tasks carried by Todoist webhooks, rather than the entire project"""
+
+    todoist_reconciliation_interval_seconds: int = 60 * 60
+    """
+    Number of seconds between full project syncs when syncing Todoist webhook tasks, to catch any missed changes
+
+    Set to 0 to only sync the entire project when a webhook doesn't carry its task
+    """
+
+    todoist_use_sync_api: bool = False
+    """Whether to sync tasks using the Todoist Sync API (incremental reads, batched writes) instead of the REST API"""
+
+    todoist_sync_state_cache_ttl_seconds: int = 60 * 10
+    """Number of seconds a user's Todoist Sync API state is kept in a warm container"""
+
+    todoist_sync_state_cache_max_size: int = 100
+    """Max number of users whose Todoist Sync API state is kept in a warm container"""
@@ -1,15 +1,16 @@
+import random
 import time
 from json import JSONDecodeError
 from typing import Any, cast
 from uuid import uuid4
 
-import requests
 from pydantic import ValidationError
 from requests import HTTPError, Response
 
 from ..app import secrets, settings
-from ..clients import aws
+from ..clients import aws, http
 from ..models.alexa import CallbackData, CallbackEvent, Message, MessageIn
+from ..services.metrics import metrics
 
 LWA_URL = "https://api.amazon.com/auth/o2/token"
 ALEXA_MESSAGE_API_URL = "https://api.amazonalexa.com/v1/skillmessages/users/{user_id}"
@@ -49,7 +50,7 @@ class ListManagerClient:
             "scope": "alexa:skill_messaging",
         }
 
-        r = requests.post(LWA_URL, json=payload)
+        r = http.sessions.get_session(LWA_URL).post(LWA_URL, json=payload)
         r.raise_for_status()
 
         try:
@@ -83,7 +84,7 @@ class ListManagerClient:
                     self._refresh_token()
                     headers = {"Authorization": f"Bearer {self.access_token}"}
 
-                r = requests.post(url, headers=headers, json=payload)
+                r = http.sessions.get_session(url).post(url, headers=headers, json=payload)
                 r.raise_for_status()
                 break
 
@@ -99,36 +100,80 @@ class ListManagerClient:
                 time.sleep(self.rate_limit_throttle)
                 continue
 
-    def _poll_for_event_response(self, event_id: str, poll_frequency=0.5, timeout=20) -> dict[str, Any]:
-        """Poll DynamoDB for a particular event response and returns the full JSON"""
+    def _get_poll_deadline(self, start_time: float, timeout: float) -> float:
+        """Returns the epoch time to stop polling, which is never later than the current invocation's deadline"""
+
+        deadline = start_time + timeout
+        invocation_deadline = aws.get_invocation_deadline()
+        if invocation_deadline:
+            deadline = min(deadline, invocation_deadline - settings.alexa_callback_poll_deadline_buffer_seconds)
+
+        return deadline
+
+    def _poll_for_event_responses(
+        self,
+        event_ids: list[str],
+        initial_interval: float | None = None,
+        max_interval: float | None = None,
+        timeout: float | None = None,
+    ) -> dict[str, dict[str, Any]]:
+        """
+        Poll DynamoDB for several event responses at once and returns a map of {event_id: full JSON}
+
+        The polling interval starts short and backs off exponentially (with jitter) up to `max_interval`
+        """
+
+        interval = initial_interval or settings.alexa_callback_poll_initial_interval_seconds
+        max_interval = max_interval or settings.alexa_callback_poll_max_interval_seconds
 
         start_time = time.time()
-        while True:
-            event = self.event_callback_db.get(event_id)
-            if event:
-                return event
+        deadline = self._get_poll_deadline(start_time, timeout or settings.alexa_callback_poll_timeout_seconds)
 
-            if time.time() >= start_time + timeout:
+        events: dict[str, dict[str, Any]] = {}
+        pending_event_ids = list(dict.fromkeys(event_ids))
+        polls = 0
+        while True:
+            polls += 1
+            if len(pending_event_ids) == 1:
+                event = self.event_callback_db.get(pending_event_ids[0], consistent_read=True)
+                polled_events = [event] if event else []
+
+            else:
+                polled_events = self.event_callback_db.batch_get(pending_event_ids, consistent_read=True)
+
+            for event in polled_events:
+                events[event[settings.alexa_event_callback_pk]] = event
+                metrics.record_timing("AlexaCallbackWaitTime", time.time() - start_time)
+
+            pending_event_ids = [event_id for event_id in pending_event_ids if event_id not in events]
+            if not pending_event_ids:
+                metrics.increment("AlexaCallbackPolls", polls)
+                return events
+
+            remaining_time = deadline - time.time()
+            if remaining_time <= 0:
+                metrics.increment("AlexaCallbackTimeouts", len(pending_event_ids))
+                metrics.increment("AlexaCallbackPolls", polls)
                 raise Exception("Timed out waiting for callback")
 
-            # the event doesn't exist yet, so we keep polling
-            time.sleep(poll_frequency)
+            # some events don't exist yet, so we keep polling
+            time.sleep(min(random.uniform(interval / 2, interval), remaining_time))
+            interval = min(interval * settings.alexa_callback_poll_backoff_multiplier, max_interval)
             continue
 
-    def call_api(self, user_id: str, message: MessageIn) -> list[dict[str, Any]] | None:
-        """Call the Alexa API and optionally wait for a response"""
-
-        if not message.event_id:
-            message.event_id = str(uuid4())
-
-        event_message = cast(Message, message)
-        self._send_message(user_id, event_message)
+    def _poll_for_event_response(
+        self,
+        event_id: str,
+        initial_interval: float | None = None,
+        max_interval: float | None = None,
+        timeout: float | None = None,
+    ) -> dict[str, Any]:
+        """Poll DynamoDB for a particular event response and returns the full JSON"""
 
-        if not message.send_callback_response:
-            return None
+        return self._poll_for_event_responses([event_id], initial_interval, max_interval, timeout)[event_id]
 
-        # fetch response from DynamoDB
-        data = self._poll_for_event_response(event_message.event_id)
+    @classmethod
+    def _parse_event_response(cls, data: dict[str, Any]) -> list[dict[str, Any]] | None:
         response = CallbackEvent.parse_obj(data)
         if not response:
             raise Exception(NO_RESPONSE_EXCEPTION)
@@ -141,3 +186,37 @@ class ListManagerClient:
 
         except (JSONDecodeError, ValidationError):
             raise Exception("Invalid callback response format")
+
+    def send_api_message(self, user_id: str, message: MessageIn) -> str | None:
+        """
+        Call the Alexa API without waiting for a response
+
+        Returns the event id to pass to `wait_for_responses`, or None if the message doesn't send a callback response
+        """
+
+        if not message.event_id:
+            message.event_id = str(uuid4())
+
+        event_message = cast(Message, message)
+        self._send_message(user_id, event_message)
+
+        return event_message.event_id if message.send_callback_response else None
+
+    def wait_for_responses(self, event_ids: list[str]) -> dict[str, list[dict[str, Any]] | None]:
+        """Wait for the responses to several messages sent by `send_api_message` and returns {event_id: response}"""
+
+        if not event_ids:
+            return {}
+
+        # fetch responses from DynamoDB
+        events = self._poll_for_event_responses(event_ids)
+        return {event_id: self._parse_event_response(events[event_id]) for event_id in event_ids}
+
+    def call_api(self, user_id: str, message: MessageIn) -> list[dict[str, Any]] | None:
+        """Call the Alexa API and optionally wait for a response"""
+
+        event_id = self.send_api_message(user_id, message)
+        if not event_id:
+            return None
+
+        return self.wait_for_responses([event_id])[event_id]
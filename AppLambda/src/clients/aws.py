@@ -1,6 +1,9 @@
 import json
 import logging
-from typing import TYPE_CHECKING, Any, cast
+import random
+import time
+from threading import RLock
+from typing import TYPE_CHECKING, Any, Iterable, cast
 
 import boto3
 from dynamodb_json import json_util as ddb_json  # type: ignore
@@ -20,45 +23,125 @@ class AWSClientResourceFactory:
         self._ddb: DynamoDBClient | None = None
         self._secrets: SecretsManagerClient | None = None
         self._sqs: SQSServiceResource | None = None
+        self._sqs_queues: dict[str, Any] = {}
+        """map of {queue_url: queue resource}"""
+
+        # boto3 sessions aren't thread-safe, so clients and resources are created one at a time
+        self._lock = RLock()
 
     @property
     def session(self):
-        if not self._session:
-            self._session = boto3.Session(region_name=secrets.aws_region)
+        with self._lock:
+            if not self._session:
+                self._session = boto3.Session(region_name=secrets.aws_region)
 
-        return self._session
+            return self._session
 
     @property
     def ddb(self):
-        if not self._ddb:
-            self._ddb = self.session.client("dynamodb")
+        with self._lock:
+            if not self._ddb:
+                self._ddb = self.session.client("dynamodb")
 
-        return self._ddb
+            return self._ddb
 
     @property
     def secrets(self):
-        if not self._secrets:
-            self._secrets = self.session.client("secretsmanager")
+        with self._lock:
+            if not self._secrets:
+                self._secrets = self.session.client("secretsmanager")
 
-        return self._secrets
+            return self._secrets
 
     @property
     def sqs(self):
-        if not self._sqs:
-            self._sqs = self.session.resource("sqs")
+        with self._lock:
+            if not self._sqs:
+                self._sqs = self.session.resource("sqs")
+
+            return self._sqs
+
+    def get_sqs_queue(self, queue_url: str):
+        """Returns the SQS queue resource for a queue, which is reused for the lifetime of this container"""
 
-        return self._sqs
+        with self._lock:
+            if queue_url not in self._sqs_queues:
+                self._sqs_queues[queue_url] = self.sqs.Queue(queue_url)
+
+            return self._sqs_queues[queue_url]
 
     def reset(self):
-        self._session = None
-        self._ddb = None
-        self._secrets = None
-        self._sqs = None
+        with self._lock:
+            self._session = None
+            self._ddb = None
+            self._secrets = None
+            self._sqs = None
+            self._sqs_queues.clear()
 
 
 _aws = AWSClientResourceFactory()
 
 
+def get_lambda_deadline(context: Any) -> float | None:
+    """
+    Returns the epoch time at which the current Lambda invocation times out
+
+    Returns None if there is no Lambda context (e.g. when running locally)
+    """
+
+    if not (context and hasattr(context, "get_remaining_time_in_millis")):
+        return None
+
+    return time.time() + context.get_remaining_time_in_millis() / 1000
+
+
+_invocation_deadline: float | None = None
+
+
+def set_invocation_deadline(deadline: float | None) -> None:
+    """Sets the epoch time at which the current invocation times out, so long-running calls can stop early"""
+
+    global _invocation_deadline
+    _invocation_deadline = deadline
+
+
+def get_invocation_deadline() -> float | None:
+    """Returns the epoch time at which the current invocation times out, or None if there is no deadline"""
+
+    return _invocation_deadline
+
+
+BATCH_GET_MAX_KEYS = 100
+"""https://docs.aws.amazon.com/amazondynamodb/latest/APIReference/API_BatchGetItem.html"""
+
+BATCH_WRITE_MAX_REQUESTS = 25
+"""https://docs.aws.amazon.com/amazondynamodb/latest/APIReference/API_BatchWriteItem.html"""
+
+BATCH_MAX_ATTEMPTS = 8
+"""Number of times unprocessed keys or requests are sent to DynamoDB before giving up"""
+
+BATCH_RETRY_DELAY_SECONDS = 0.05
+"""Seconds to wait before resending unprocessed keys or requests; doubled after each attempt, with jitter"""
+
+BATCH_MAX_RETRY_DELAY_SECONDS = 1
+"""Maximum seconds to wait before resending unprocessed keys or requests"""
+
+SQS_SEND_BATCH_MAX_MESSAGES = 10
+"""https://docs.aws.amazon.com/AWSSimpleQueueService/latest/APIReference/API_SendMessageBatch.html"""
+
+SQS_SEND_BATCH_MAX_BYTES = 256 * 1024
+"""https://docs.aws.amazon.com/AWSSimpleQueueService/latest/APIReference/API_SendMessageBatch.html"""
+
+SQS_SEND_BATCH_MAX_ATTEMPTS = 3
+"""Number of times a message which failed due to an SQS error is sent before giving up"""
+
+SQS_SEND_BATCH_RETRY_DELAY_SECONDS = 0.1
+"""Seconds to wait before resending messages which failed due to an SQS error; doubled after each attempt"""
+
+SQS_CHANGE_VISIBILITY_BATCH_MAX_MESSAGES = 10
+"""https://docs.aws.amazon.com/AWSSimpleQueueService/latest/APIReference/API_ChangeMessageVisibilityBatch.html"""
+
+
 class MissingPrimaryKeyError(ValueError):
     def __init__(self, primary_key: str) -> None:
         super().__init__(f'item is missing the primary key "{primary_key}"')
@@ -71,15 +154,54 @@ class DynamoDB:
         self.tablename = tablename
         self.pk = primary_key
 
-    def get(self, primary_key_value: str) -> dict[str, Any] | None:
-        """Gets a single item by primary key"""
+    @staticmethod
+    def _backoff(attempt: int) -> None:
+        """Waits before resending unprocessed keys or requests, as recommended by AWS for batch operations"""
+
+        delay = min(BATCH_MAX_RETRY_DELAY_SECONDS, BATCH_RETRY_DELAY_SECONDS * 2 ** (attempt - 1))
+        time.sleep(random.uniform(delay / 2, delay))
+
+    def get(self, primary_key_value: str, consistent_read: bool = False) -> dict[str, Any] | None:
+        """Gets a single item by primary key, optionally using a strongly consistent read"""
 
-        data = _aws.ddb.get_item(TableName=self.tablename, Key={self.pk: {"S": primary_key_value}})
+        data = _aws.ddb.get_item(
+            TableName=self.tablename, Key={self.pk: {"S": primary_key_value}}, ConsistentRead=consistent_read
+        )
         if "Item" not in data:
             return None
 
         return ddb_json.loads(data["Item"])
 
+    def batch_get(self, primary_key_values: list[str], consistent_read: bool = False) -> list[dict[str, Any]]:
+        """Gets many items by primary key; items which don't exist are omitted and order is not preserved"""
+
+        items: list[dict[str, Any]] = []
+        unique_values = list(dict.fromkeys(primary_key_values))
+        for i in range(0, len(unique_values), BATCH_GET_MAX_KEYS):
+            request_items: dict[str, Any] = {
+                self.tablename: {
+                    "Keys": [{self.pk: {"S": value}} for value in unique_values[i : i + BATCH_GET_MAX_KEYS]],
+                    "ConsistentRead": consistent_read,
+                }
+            }
+
+            # DynamoDB may not process every key in a single request, so we keep requesting the remaining keys
+            for attempt in range(BATCH_MAX_ATTEMPTS):
+                if attempt:
+                    self._backoff(attempt)
+
+                data = _aws.ddb.batch_get_item(RequestItems=request_items)
+                items.extend(ddb_json.loads(item) for item in data.get("Responses", {}).get(self.tablename, []))
+                request_items = data.get("UnprocessedKeys") or {}
+                if not request_items:
+                    break
+
+            if request_items:
+                unprocessed = len(request_items[self.tablename]["Keys"])
+                raise Exception(f"Unable to get {unprocessed} item(s) from DynamoDB; keys were not processed")
+
+        return items
+
     def query(self, index: str, value: str) -> list[dict[str, Any]]:
         """Queries by global secondary index and returns all items"""
 
@@ -114,6 +236,51 @@ class DynamoDB:
                 ConditionExpression=f"attribute_not_exists({self.pk})",
             )
 
+    def update(
+        self, primary_key_value: str, set_attributes: dict[str, Any], add_attributes: dict[str, int] | None = None
+    ) -> dict[str, Any]:
+        """
+        Sets and/or adds to top-level attributes of a single item, creating it if it doesn't exist
+
+        Missing attributes in `add_attributes` are treated as 0. Returns the full updated item
+        """
+
+        expression_attribute_names: dict[str, str] = {}
+        expression_attribute_values: dict[str, Any] = {}
+        set_expressions: list[str] = []
+        add_expressions: list[str] = []
+
+        for i, (attribute, value) in enumerate(set_attributes.items()):
+            expression_attribute_names[f"#set{i}"] = attribute
+            expression_attribute_values[f":set{i}"] = value
+            set_expressions.append(f"#set{i} = :set{i}")
+
+        for i, (attribute, value) in enumerate((add_attributes or {}).items()):
+            expression_attribute_names[f"#add{i}"] = attribute
+            expression_attribute_values[f":add{i}"] = value
+            add_expressions.append(f"#add{i} :add{i}")
+
+        expressions: list[str] = []
+        if set_expressions:
+            expressions.append(f"SET {', '.join(set_expressions)}")
+
+        if add_expressions:
+            expressions.append(f"ADD {', '.join(add_expressions)}")
+
+        if not expressions:
+            raise ValueError("at least one attribute must be set or added")
+
+        response_data = _aws.ddb.update_item(
+            TableName=self.tablename,
+            Key={self.pk: {"S": primary_key_value}},
+            ExpressionAttributeNames=expression_attribute_names,
+            ExpressionAttributeValues=ddb_json.dumps(expression_attribute_values, as_dict=True),
+            UpdateExpression=" ".join(expressions),
+            ReturnValues="ALL_NEW",
+        )
+
+        return ddb_json.loads(response_data["Attributes"])
+
     def atomic_op(
         self, primary_key_value: str, attribute: str, attribute_change_value: int, op: DynamoDBAtomicOp
     ) -> int:
@@ -163,6 +330,47 @@ class DynamoDB:
         _aws.ddb.delete_item(TableName=self.tablename, Key={self.pk: {"S": primary_key_value}})
         return
 
+    def batch_write(
+        self, put_items: list[dict[str, Any]] | None = None, delete_primary_key_values: list[str] | None = None
+    ) -> None:
+        """
+        Creates or replaces many items and deletes many items by primary key; the order of writes is not preserved
+
+        DynamoDB rejects batches which write the same key twice, so only the last put for each key is sent, and keys
+        which are put aren't also deleted
+        """
+
+        items_by_key: dict[str, dict[str, Any]] = {}
+        for item in put_items or []:
+            if self.pk not in item:
+                raise MissingPrimaryKeyError(self.pk)
+
+            items_by_key[item[self.pk]] = item
+
+        write_requests: list[dict[str, Any]] = [
+            {"PutRequest": {"Item": ddb_json.dumps(item, as_dict=True)}} for item in items_by_key.values()
+        ]
+        for value in dict.fromkeys(delete_primary_key_values or []):
+            if value not in items_by_key:
+                write_requests.append({"DeleteRequest": {"Key": {self.pk: {"S": value}}}})
+
+        for i in range(0, len(write_requests), BATCH_WRITE_MAX_REQUESTS):
+            request_items: dict[str, Any] = {self.tablename: write_requests[i : i + BATCH_WRITE_MAX_REQUESTS]}
+
+            # DynamoDB may not process every request in a single call, so we keep sending the remaining requests
+            for attempt in range(BATCH_MAX_ATTEMPTS):
+                if attempt:
+                    self._backoff(attempt)
+
+                data = _aws.ddb.batch_write_item(RequestItems=request_items)
+                request_items = data.get("UnprocessedItems") or {}
+                if not request_items:
+                    break
+
+            if request_items:
+                unprocessed = len(request_items[self.tablename])
+                raise Exception(f"Unable to write {unprocessed} item(s) to DynamoDB; requests were not processed")
+
 
 class SecretsManager:
     @staticmethod
@@ -177,7 +385,7 @@ class SQSFIFO:
     """Provides higher-level functions to interact with SQS FIFO queues"""
 
     def __init__(self, queue_url: str) -> None:
-        self.queue = _aws.sqs.Queue(queue_url)
+        self.queue = _aws.get_sqs_queue(queue_url)
 
     def send_message(self, content: str, de_dupe_id: str, group_id: str) -> None:
         self.queue.send_message(
@@ -185,3 +393,85 @@ class SQSFIFO:
             MessageDeduplicationId=de_dupe_id,
             MessageGroupId=group_id,
         )
+
+    @staticmethod
+    def _chunk_messages(messages: list[tuple[str, str, str]]) -> Iterable[list[tuple[str, str, str]]]:
+        """Splits messages into batches which fit in a single request, by both message count and total size"""
+
+        batch: list[tuple[str, str, str]] = []
+        batch_size = 0
+        for message in messages:
+            message_size = len(message[0].encode())
+            if batch and (
+                len(batch) >= SQS_SEND_BATCH_MAX_MESSAGES or batch_size + message_size > SQS_SEND_BATCH_MAX_BYTES
+            ):
+                yield batch
+                batch = []
+                batch_size = 0
+
+            batch.append(message)
+            batch_size += message_size
+
+        if batch:
+            yield batch
+
+    def send_message_batch(self, messages: list[tuple[str, str, str]]) -> None:
+        """
+        Sends many messages, as (content, de_dupe_id, group_id), in as few requests as possible
+
+        Messages which fail due to an SQS error are sent again after a short backoff; messages sent more than once are
+        dropped by SQS using their de-dupe id. Raises an exception if any message can't be sent
+        """
+
+        for batch in self._chunk_messages(messages):
+            entries: dict[str, dict[str, Any]] = {
+                str(j): {
+                    "Id": str(j),
+                    "MessageBody": content,
+                    "MessageDeduplicationId": de_dupe_id,
+                    "MessageGroupId": group_id,
+                }
+                for j, (content, de_dupe_id, group_id) in enumerate(batch)
+            }
+
+            for attempt in range(SQS_SEND_BATCH_MAX_ATTEMPTS):
+                if attempt:
+                    time.sleep(SQS_SEND_BATCH_RETRY_DELAY_SECONDS * 2 ** (attempt - 1))
+
+                response = self.queue.send_messages(Entries=list(entries.values()))
+                failed = response.get("Failed") or []
+
+                # messages rejected because of the request itself will fail again if they're retried
+                sender_faults = [failure for failure in failed if failure.get("SenderFault")]
+                if sender_faults:
+                    logging.error(sender_faults)
+                    raise Exception(f"Unable to send {len(sender_faults)} message(s) to SQS; rejected by SQS")
+
+                entries = {failure["Id"]: entries[failure["Id"]] for failure in failed}
+                if not entries:
+                    break
+
+            if entries:
+                raise Exception(f"Unable to send {len(entries)} message(s) to SQS")
+
+    def change_message_visibility_batch(self, receipt_handles: list[str], visibility_timeout: int) -> None:
+        """
+        Hides many received messages from consumers for `visibility_timeout` seconds from now
+
+        Raises an exception if any message's visibility can't be changed
+        """
+
+        for i in range(0, len(receipt_handles), SQS_CHANGE_VISIBILITY_BATCH_MAX_MESSAGES):
+            response = self.queue.change_message_visibility_batch(
+                Entries=[
+                    {"Id": str(j), "ReceiptHandle": receipt_handle, "VisibilityTimeout": visibility_timeout}
+                    for j, receipt_handle in enumerate(
+                        receipt_handles[i : i + SQS_CHANGE_VISIBILITY_BATCH_MAX_MESSAGES]
+                    )
+                ]
+            )
+
+            failed = response.get("Failed") or []
+            if failed:
+                logging.error(failed)
+                raise Exception(f"Unable to change the visibility of {len(failed)} message(s) in SQS")
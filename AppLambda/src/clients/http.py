@@ -0,0 +1,107 @@
+from http.cookiejar import DefaultCookiePolicy
+from threading import RLock
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..app import settings
+from ..models.http import HTTPHostStats
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTP adapter which applies a default timeout to requests that don't specify one"""
+
+    def __init__(self, timeout: float, *args, **kwargs) -> None:
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(request, timeout=timeout if timeout is not None else self.timeout, **kwargs)
+
+
+class HTTPSessionRegistry:
+    """
+    Process-wide registry of keep-alive sessions, one per host
+
+    Sessions are shared across users and messages in a warm container, so they
+    must never hold user-specific state, such as auth headers or cookies
+    """
+
+    def __init__(self, pool_connections: int, pool_maxsize: int, timeout: float) -> None:
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+
+        self._sessions: dict[str, requests.Session] = {}
+        """map of {scheme://host: session}"""
+
+        self._lock = RLock()
+
+    @classmethod
+    def _get_host(cls, url: str) -> str:
+        parts = urlsplit(url if "//" in url else f"https://{url}")
+        return f"{parts.scheme}://{parts.netloc}".lower()
+
+    def _build_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = TimeoutHTTPAdapter(
+            self.timeout, pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize
+        )
+
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        # cookies set for one user would otherwise be sent with every other user's requests
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        return session
+
+    def get_session(self, url: str) -> requests.Session:
+        """Fetches the shared session for a URL's host, creating it if it doesn't exist"""
+
+        host = self._get_host(url)
+        with self._lock:
+            if host not in self._sessions:
+                self._sessions[host] = self._build_session()
+
+            return self._sessions[host]
+
+    def get_stats(self) -> dict[str, HTTPHostStats]:
+        """Returns connection reuse stats for each host with a session"""
+
+        with self._lock:
+            sessions = dict(self._sessions)
+
+        stats: dict[str, HTTPHostStats] = {}
+        for host, session in sessions.items():
+            host_stats = HTTPHostStats(host=host)
+            for adapter in set(session.adapters.values()):
+                if not isinstance(adapter, HTTPAdapter):
+                    continue
+
+                pools = adapter.poolmanager.pools
+                for pool_key in pools.keys():
+                    pool = pools.get(pool_key)
+                    if not pool:
+                        continue
+
+                    host_stats.connections_opened += pool.num_connections
+                    host_stats.requests_sent += pool.num_requests
+
+            stats[host] = host_stats
+
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+
+            self._sessions.clear()
+
+
+sessions = HTTPSessionRegistry(
+    pool_connections=settings.http_pool_connections,
+    pool_maxsize=settings.http_pool_maxsize,
+    timeout=settings.http_timeout_seconds,
+)
@@ -1,10 +1,10 @@
 import time
-from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Any, Iterable
 
-import requests
-from requests import HTTPError, Response
+from requests import HTTPError, Response, Session
 
+from ..app import settings
 from ..models.mealie import (
     AuthToken,
     Food,
@@ -20,6 +20,7 @@ from ..models.mealie import (
     MealieShoppingListOut,
     Pagination,
 )
+from . import http
 
 STATUS_CODES_TO_RETRY = [429, 500]
 
@@ -60,6 +61,8 @@ class MealieBaseClient:
         timeout: int = 30,
         rate_limit_throttle: int = 5,
         max_attempts: int = 3,
+        per_page: int = 50,
+        max_concurrent_pages: int = 4,
     ) -> None:
         if not base_url:
             raise ValueError("base_url must not be empty")
@@ -71,21 +74,23 @@ class MealieBaseClient:
             base_url = "https://" + base_url
 
         self.base_url = base_url
-        self._client = self._get_client()
-        self._client.headers.update(
-            {
-                "content-type": "application/json",
-                "Authorization": f"Bearer {auth_token}",
-            }
-        )
+        self._client = self._get_client(base_url)
+
+        # sessions are shared across users, so auth headers are sent with each request instead
+        self._headers = {
+            "content-type": "application/json",
+            "Authorization": f"Bearer {auth_token}",
+        }
 
         self.timeout = timeout
         self.rate_limit_throttle = rate_limit_throttle
         self.max_attempts = max_attempts
+        self.per_page = per_page
+        self.max_concurrent_pages = max_concurrent_pages
 
     @classmethod
-    def _get_client(cls, *args, **kwargs):
-        return requests.session(*args, **kwargs)
+    def _get_client(cls, base_url: str) -> Session:
+        return http.sessions.get_session(base_url)
 
     def _request(
         self,
@@ -110,7 +115,7 @@ class MealieBaseClient:
                 r = self._client.request(
                     method.upper(),
                     url,
-                    headers=headers,
+                    headers={**self._headers, **(headers or {})},
                     params=params,
                     json=payload,
                     timeout=self.timeout,
@@ -132,32 +137,43 @@ class MealieBaseClient:
     def get(self, endpoint: str, headers: dict | None = None, params: dict | None = None) -> Response:
         return self._request("GET", endpoint, headers, params)
 
+    def _get_page(self, endpoint: str, page: int, headers: dict | None, params: dict) -> Pagination:
+        response = self.get(endpoint, headers, {**params, "page": page})
+        return Pagination.parse_response(response)
+
     def get_all(self, endpoint: str, headers: dict | None = None, params: dict | None = None) -> Iterable[dict]:
-        """Paginate through all records, making additional API calls as needed"""
+        """
+        Paginate through all records, making additional API calls as needed
 
-        if params is None:
-            params = {}
+        Once the first page reveals the total number of pages, the remaining pages are fetched concurrently.
+        Records are yielded in order as each page completes
+        """
 
-        has_more = True
-        params["page"] = 0
-        records = deque[dict]()
+        params = {"perPage": self.per_page, **(params or {})}
 
-        # paginate data until we run out
-        while True:
-            if not records and has_more:
-                params["page"] += 1
-                response = self.get(endpoint, headers, params)
-                pagination = Pagination.parse_response(response)
+        pagination = self._get_page(endpoint, 1, headers, params)
+        yield from pagination.items
 
-                if not pagination.next:
-                    has_more = False
+        # if the total number of pages isn't known, we paginate serially until we run out
+        if pagination.total_pages <= pagination.page:
+            while pagination.next:
+                pagination = self._get_page(endpoint, pagination.page + 1, headers, params)
+                yield from pagination.items
 
-                records.extend(pagination.items)
+            return
 
-            if not records:
-                break
+        remaining_pages = range(pagination.page + 1, pagination.total_pages + 1)
+        executor = ThreadPoolExecutor(max_workers=max(1, min(self.max_concurrent_pages, len(remaining_pages))))
+        try:
+            futures: list[Future[Pagination]] = [
+                executor.submit(self._get_page, endpoint, page, headers, params) for page in remaining_pages
+            ]
 
-            yield records.pop()
+            for future in futures:
+                yield from future.result().items
+
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
 
     def head(self, endpoint: str, headers: dict | None = None, params: dict | None = None) -> Response:
         return self._request("HEAD", endpoint, headers, params)
@@ -203,7 +219,12 @@ class MealieClient:
     """Mid-level client for interacting with the Mealie API"""
 
     def __init__(self, base_url: str, auth_token: str) -> None:
-        self.client = MealieBaseClient(base_url, auth_token)
+        self.client = MealieBaseClient(
+            base_url,
+            auth_token,
+            per_page=settings.mealie_pagination_per_page,
+            max_concurrent_pages=settings.mealie_pagination_max_concurrent_pages,
+        )
 
     @property
     def is_valid(self) -> bool:
@@ -265,6 +286,18 @@ class MealieClient:
         for list_item_data in list_items_data:
             yield MealieShoppingListItemOut.parse_obj(list_item_data)
 
+    def get_shopping_list_items_by_ids(
+        self, shopping_list_id: str, item_ids: list[str]
+    ) -> Iterable[MealieShoppingListItemOut]:
+        """Fetches specific shopping list items, including checked items. Items which don't exist are omitted"""
+
+        for i in range(0, len(item_ids), settings.mealie_query_filter_max_ids):
+            ids = ", ".join(f'"{item_id}"' for item_id in item_ids[i : i + settings.mealie_query_filter_max_ids])
+            params = {"queryFilter": f"shopping_list_id={shopping_list_id} AND id IN [{ids}]"}
+            list_items_data = self.client.get_all(Routes.GROUPS_SHOPPING_ITEMS, params=params)
+            for list_item_data in list_items_data:
+                yield MealieShoppingListItemOut.parse_obj(list_item_data)
+
     def create_shopping_list_items(
         self, items: list[MealieShoppingListItemCreate]
     ) -> MealieShoppingListItemsCollectionOut:
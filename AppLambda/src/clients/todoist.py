@@ -0,0 +1,40 @@
+import json
+
+from ..clients import http
+from ..models.todoist import TodoistSyncCommand, TodoistSyncResponse
+
+SYNC_API_URL = "https://api.todoist.com/sync/v9/sync"
+
+MAX_COMMANDS_PER_REQUEST = 100
+"""https://developer.todoist.com/sync/v9/#limits"""
+
+
+class TodoistSyncClient:
+    """Manages low-level Todoist Sync API interaction"""
+
+    def __init__(self, token: str) -> None:
+        self.token = token
+
+    def sync(
+        self,
+        sync_token: str = "*",
+        resource_types: list[str] | None = None,
+        commands: list[TodoistSyncCommand] | None = None,
+    ) -> TodoistSyncResponse:
+        """
+        Executes commands (if any) and then fetches all resources which changed since the sync token
+
+        Use a sync token of "*" to fetch all resources
+        """
+
+        if commands and len(commands) > MAX_COMMANDS_PER_REQUEST:
+            raise ValueError(f"cannot send more than {MAX_COMMANDS_PER_REQUEST} commands in a single request")
+
+        data = {"sync_token": sync_token, "resource_types": json.dumps(resource_types or [])}
+        if commands:
+            data["commands"] = json.dumps([command.dict() for command in commands])
+
+        headers = {"Authorization": f"Bearer {self.token}"}
+        r = http.sessions.get_session(SYNC_API_URL).post(SYNC_API_URL, headers=headers, data=data)
+        r.raise_for_status()
+        return TodoistSyncResponse.parse_obj(r.json())
@@ -1,8 +1,13 @@
 from abc import ABC, abstractmethod
+from typing import Any, Iterable
 
+from ..app import settings
 from ..models.aws import SQSMessage
-from ..models.core import BaseSyncEvent, ListSyncMap, User
+from ..models.core import BaseSyncEvent, ListSyncMap, Source, User
+from ..models.mealie import MealieShoppingListItemOut, MealieShoppingListItemUpdateBulk, MealieSyncEvent
+from ..services.item_links import ItemLinkStore
 from ..services.mealie import MealieListService
+from ..services.sync_fingerprints import SyncFingerprintService, build_fingerprint
 
 
 class CannotHandleListMapError(Exception):
@@ -11,10 +16,19 @@ class CannotHandleListMapError(Exception):
 
 
 class BaseSyncHandler(ABC):
+    source: Source
+    """the system this handler syncs with Mealie"""
+
+    extras_key: str
+    """the Mealie item extras key which mirrors the id of the linked item in this handler's system"""
+
     def __init__(self, user: User, mealie_service: MealieListService):
         self.user = user
         self.mealie_service = mealie_service
 
+        self._item_link_stores: dict[str, ItemLinkStore] = {}
+        """map of {mealie_list_id: item links}"""
+
     @property
     @abstractmethod
     def suppress_additional_messages(self) -> bool:
@@ -36,6 +50,162 @@ class BaseSyncHandler(ABC):
         """read a list map and return whether or not this handler can use it to sync"""
         pass
 
+    def parse_sync_event(self, message: SQSMessage) -> BaseSyncEvent:
+        """parse an SQS message into this handler's sync event"""
+
+        return message.parse_body(BaseSyncEvent)
+
+    def get_event_mealie_items(
+        self, sync_event: BaseSyncEvent, mealie_list_id: str
+    ) -> tuple[MealieShoppingListItemOut, ...] | None:
+        """
+        return the Mealie items (including checked items) changed by a Mealie sync event, so only those items need to
+        be synced, or None if the entire list should be synced
+        """
+
+        if not (isinstance(sync_event, MealieSyncEvent) and settings.mealie_targeted_sync):
+            return None
+
+        if sync_event.is_full_sync:
+            return None
+
+        return self.mealie_service.get_list_items_view_by_ids(mealie_list_id, sync_event.item_ids)
+
+    @property
+    def mirror_links_to_extras(self) -> bool:
+        """whether new links should also be written back to Mealie item extras"""
+
+        return settings.item_links_mirror_to_extras or not settings.item_links_enabled
+
+    def get_item_links(self, mealie_list_id: str) -> ItemLinkStore | None:
+        """get the links between a Mealie list's items and this handler's items, or None if links aren't stored"""
+
+        if not settings.item_links_enabled:
+            return None
+
+        if mealie_list_id not in self._item_link_stores:
+            self._item_link_stores[mealie_list_id] = ItemLinkStore(self.user.username, mealie_list_id, self.source)
+
+        return self._item_link_stores[mealie_list_id]
+
+    def load_item_links(
+        self,
+        mealie_list_id: str,
+        mealie_items: Iterable[MealieShoppingListItemOut] = (),
+        linked_ids: Iterable[str] = (),
+    ) -> None:
+        """fetch the links of many items at once, before looking them up one at a time"""
+
+        item_links = self.get_item_links(mealie_list_id)
+        if not item_links:
+            return
+
+        mealie_item_ids: list[str] = []
+        linked_ids = list(linked_ids)
+        for mealie_item in mealie_items:
+            mealie_item_ids.append(mealie_item.id)
+            if mealie_item.extras and (extras_linked_id := mealie_item.extras.dict().get(self.extras_key)):
+                linked_ids.append(extras_linked_id)
+
+        item_links.load(mealie_item_ids, linked_ids)
+
+    def get_linked_id(self, mealie_item: MealieShoppingListItemOut) -> str | None:
+        """get the id of the item linked to a Mealie item in this handler's system"""
+
+        item_links = self.get_item_links(mealie_item.shopping_list_id)
+        if item_links and (link := item_links.get_by_mealie_item_id(mealie_item.id)):
+            return link.linked_id
+
+        # items created from this handler's system, and items linked before links were stored, are linked by extras
+        linked_id: str | None = mealie_item.extras.dict().get(self.extras_key) if mealie_item.extras else None
+        if not linked_id:
+            return None
+
+        # extras aren't always kept up-to-date, so they're ignored if the linked item is stored with another Mealie item
+        if item_links and (link := item_links.get_by_linked_id(linked_id)) and link.mealie_item_id != mealie_item.id:
+            return None
+
+        return linked_id
+
+    def get_mealie_item_by_linked_id(self, mealie_list_id: str, linked_id: str) -> MealieShoppingListItemOut | None:
+        """
+        fetch a read-only Mealie item by the id of its linked item in this handler's system
+
+        use `MealieListService.checkout_item` before mutating it
+        """
+
+        item_links = self.get_item_links(mealie_list_id)
+        if item_links and (link := item_links.get_by_linked_id(linked_id)):
+            if mealie_item := self.mealie_service.get_item_view(mealie_list_id, link.mealie_item_id):
+                return mealie_item
+
+        mealie_item = self.mealie_service.get_item_view_by_extra(mealie_list_id, self.extras_key, linked_id)
+        if mealie_item and self.get_linked_id(mealie_item) != linked_id:
+            return None
+
+        return mealie_item
+
+    def link_mealie_item(
+        self, mealie_item: MealieShoppingListItemOut, linked_id: str, linked_version: str | None = None
+    ) -> None:
+        """link a Mealie item to an item in this handler's system; call `flush_item_links` to save the link"""
+
+        if item_links := self.get_item_links(mealie_item.shopping_list_id):
+            item_links.link(mealie_item.id, linked_id, linked_version)
+
+    def unlink_mealie_item(self, mealie_item: MealieShoppingListItemOut) -> None:
+        """remove the link of a Mealie item; call `flush_item_links` to save the change"""
+
+        if item_links := self.get_item_links(mealie_item.shopping_list_id):
+            item_links.unlink(mealie_item_id=mealie_item.id, linked_id=self.get_linked_id(mealie_item))
+
+    def build_sync_fingerprint(self, mealie_list_id: str, records: Iterable[Any]) -> str:
+        """
+        build a fingerprint of both sides of a list map, from the Mealie list and this handler's records
+
+        records should include everything this handler compares when syncing items
+        """
+
+        mealie_records = [
+            (
+                mealie_item.id,
+                mealie_item.display,
+                mealie_item.checked,
+                str(mealie_label) if (mealie_label := self.mealie_service.get_label_from_item(mealie_item)) else None,
+                sorted(ref.recipe_id for ref in mealie_item.recipe_references),
+            )
+            for mealie_item in self.mealie_service.get_all_list_items_view(mealie_list_id)
+        ]
+
+        # changing the user's configuration can change how items are synced
+        return build_fingerprint(
+            [("config", self.user.configuration.json())]
+            + mealie_records
+            + [(self.source.value, record) for record in records]
+        )
+
+    def get_sync_fingerprints(self, mealie_list_id: str, sync_source: Source) -> SyncFingerprintService | None:
+        """
+        get the fingerprints of syncs from one side of a list map (Mealie or this handler's system),
+        or None if syncs aren't fingerprinted
+        """
+
+        if not settings.sync_fingerprints_enabled:
+            return None
+
+        return SyncFingerprintService(
+            "|".join([self.user.username, mealie_list_id, self.source.value, f"from_{sync_source.value}"])
+        )
+
+    def flush_item_links(self) -> bool:
+        """save all link changes, and return whether they were saved"""
+
+        is_saved = True
+        for item_links in self._item_link_stores.values():
+            is_saved = item_links.flush() and is_saved
+
+        return is_saved
+
     @abstractmethod
     def get_sync_map_from_message(self, message: SQSMessage) -> ListSyncMap | None:
         """read an SQS message and return the appropriate list map, if there is one"""
@@ -47,6 +217,14 @@ class BaseSyncHandler(ABC):
         pass
 
     @abstractmethod
-    def receive_changes_from_mealie(self, sync_event: BaseSyncEvent, list_sync_map: ListSyncMap):
-        """receive changes from Mealie and make changes in this handler's system"""
+    def receive_changes_from_mealie(
+        self, sync_event: BaseSyncEvent, list_sync_map: ListSyncMap
+    ) -> list[MealieShoppingListItemUpdateBulk]:
+        """
+        receive changes from Mealie and make changes in this handler's system
+
+        handlers may run concurrently, so rather than writing to Mealie directly, this returns
+        the Mealie items that should be updated (e.g. with new linked ids), which are merged
+        with other handlers' updates and sent to Mealie in bulk
+        """
         pass
@@ -27,6 +27,9 @@ from ._base import BaseSyncHandler, CannotHandleListMapError
 
 
 class AlexaSyncHandler(BaseSyncHandler):
+    source = Source.alexa
+    extras_key = "alexa_item_id"
+
     def __init__(
         self,
         user: User,
@@ -35,8 +38,6 @@ class AlexaSyncHandler(BaseSyncHandler):
         super().__init__(user, mealie_service)
 
         self.alexa_service = AlexaListService(user)
-        self.extras_item_id_key = "alexa_item_id"
-        self.extras_version_key = "alexa_item_version"
 
     @property
     def suppress_additional_messages(self) -> bool:
@@ -64,7 +65,9 @@ class AlexaSyncHandler(BaseSyncHandler):
                 return list_sync_map
 
     def get_mealie_item_by_item_id(self, mealie_list_id: str, item_id: str) -> MealieShoppingListItemOut | None:
-        return self.mealie_service.get_item_by_extra(mealie_list_id, self.extras_item_id_key, item_id)
+        """Fetches a read-only Mealie item; use `MealieListService.checkout_item` before mutating it"""
+
+        return self.get_mealie_item_by_linked_id(mealie_list_id, item_id)
 
     def get_mealie_item_version_number(self, mealie_item: MealieShoppingListItemOut) -> int:
         """
@@ -73,13 +76,17 @@ class AlexaSyncHandler(BaseSyncHandler):
         returns 0 if there is no version information
         """
 
-        if not (mealie_item.extras and mealie_item.extras.alexa_item_version):
-            return 0
+        item_links = self.get_item_links(mealie_item.shopping_list_id)
+        if item_links and (link := item_links.get_by_mealie_item_id(mealie_item.id)):
+            version = link.linked_version
 
-        if not mealie_item.extras.alexa_item_version.isnumeric():
+        else:
+            version = mealie_item.extras.alexa_item_version if mealie_item.extras else None
+
+        if not (version and version.isnumeric()):
             return 0
 
-        return int(mealie_item.extras.alexa_item_version)
+        return int(version)
 
     def can_update_mealie_item(self, mealie_item: MealieShoppingListItemOut, alexa_item: AlexaListItemOut):
         """compare the alexa item versions and return if the item should be updated in Mealie"""
@@ -132,6 +139,7 @@ class AlexaSyncHandler(BaseSyncHandler):
         mealie_items_to_create: list[MealieShoppingListItemCreate] = []
         mealie_items_to_update: list[MealieShoppingListItemUpdateBulk] = []
         mealie_items_to_delete: list[MealieShoppingListItemOut] = []
+        self.load_item_links(mealie_list_id, linked_ids=alexa_item_ids)
         for alexa_item_id in alexa_item_ids:
             try:
                 mealie_item = self.get_mealie_item_by_item_id(mealie_list_id, alexa_item_id)
@@ -139,6 +147,8 @@ class AlexaSyncHandler(BaseSyncHandler):
                     if not mealie_item:
                         continue
 
+                    self.unlink_mealie_item(mealie_item)
+                    mealie_item = self.mealie_service.checkout_item(mealie_item)
                     mealie_item.checked = True
                     if mealie_item.extras:
                         mealie_item.extras.alexa_item_id = None
@@ -151,7 +161,7 @@ class AlexaSyncHandler(BaseSyncHandler):
                     if mealie_item:
                         continue
 
-                    alexa_item = self.alexa_service.get_list_item(alexa_list_id, alexa_item_id)
+                    alexa_item = self.alexa_service.get_list_item_view(alexa_list_id, alexa_item_id)
                     if not alexa_item or alexa_item.status == ListItemState.completed.value:
                         continue
 
@@ -170,8 +180,10 @@ class AlexaSyncHandler(BaseSyncHandler):
                     if not mealie_item:
                         continue
 
-                    alexa_item = self.alexa_service.get_list_item(alexa_list_id, alexa_item_id)
+                    alexa_item = self.alexa_service.get_list_item_view(alexa_list_id, alexa_item_id)
                     if not alexa_item or alexa_item.status == ListItemState.completed.value:
+                        self.unlink_mealie_item(mealie_item)
+                        mealie_item = self.mealie_service.checkout_item(mealie_item)
                         mealie_item.checked = True
                         if mealie_item.extras:
                             mealie_item.extras.alexa_item_id = None
@@ -187,6 +199,8 @@ class AlexaSyncHandler(BaseSyncHandler):
                         # the content does not match, and we don't have structured item data
                         # in Alexa, so we need to completely replace the item in Mealie
                         # TODO: we only have to do this if the mealie item is using foods
+                        # (the new item is linked by its extras)
+                        self.unlink_mealie_item(mealie_item)
                         mealie_items_to_delete.append(mealie_item)
                         mealie_items_to_create.append(
                             MealieShoppingListItemCreate(
@@ -206,6 +220,12 @@ class AlexaSyncHandler(BaseSyncHandler):
                     if (not mealie_item.checked) and alexa_item.version == mealie_item_version:
                         continue
 
+                    # if only the version changed, Mealie only needs to be updated if links are mirrored to extras
+                    self.link_mealie_item(mealie_item, alexa_item.id, str(alexa_item.version))
+                    if not (mealie_item.checked or self.mirror_links_to_extras):
+                        continue
+
+                    mealie_item = self.mealie_service.checkout_item(mealie_item)
                     mealie_item.checked = False
                     if not mealie_item.extras:
                         mealie_item.extras = MealieShoppingListItemExtras(
@@ -237,7 +257,11 @@ class AlexaSyncHandler(BaseSyncHandler):
             logging.error("Unhandled exception when trying to perform bulk CRUD op from Alexa to Mealie")
             logging.error(f"{type(e).__name__}: {e}")
 
-    def receive_changes_from_mealie(self, sync_event: BaseSyncEvent, list_sync_map: ListSyncMap):
+        self.flush_item_links()
+
+    def receive_changes_from_mealie(
+        self, sync_event: BaseSyncEvent, list_sync_map: ListSyncMap
+    ) -> list[MealieShoppingListItemUpdateBulk]:
         if not list_sync_map.alexa_list_id:
             raise CannotHandleListMapError()
 
@@ -246,10 +270,51 @@ class AlexaSyncHandler(BaseSyncHandler):
 
         alexa_items_to_create: list[AlexaListItemCreateIn] = []
         alexa_items_to_update: list[AlexaListItemUpdateBulkIn] = []
-        mealie_items_to_callback: list[MealieShoppingListItemOut] = []
+        # Mealie items to link to each updated and created Alexa item, in order; None if there's nothing to link
+        mealie_items_to_callback: list[MealieShoppingListItemOut | None] = []
         mealie_items_to_update: list[MealieShoppingListItemUpdateBulk] = []
-        for alexa_item in self.alexa_service.get_list(alexa_list_id).items or []:
-            mealie_item = self.get_mealie_item_by_item_id(mealie_list_id, alexa_item.id)
+
+        # if the event carries the changed Mealie items, only the Alexa items linked to those items need to be compared
+        event_mealie_items = self.get_event_mealie_items(sync_event, mealie_list_id)
+        mealie_items_by_alexa_id: dict[str, MealieShoppingListItemOut] | None = None
+        if event_mealie_items is not None:
+            self.load_item_links(mealie_list_id, event_mealie_items)
+            mealie_items_by_alexa_id = {}
+            for mealie_item in event_mealie_items:
+                if alexa_item_id := self.get_linked_id(mealie_item):
+                    mealie_items_by_alexa_id[alexa_item_id] = mealie_item
+
+        alexa_items = self.alexa_service.get_list_items_view(alexa_list_id)
+
+        # when syncing the entire list, skip the sync if neither side has changed since they were last in sync
+        fingerprints = self.get_sync_fingerprints(mealie_list_id, Source.mealie) if event_mealie_items is None else None
+        fingerprint = None
+        if fingerprints:
+            fingerprint = self.build_sync_fingerprint(
+                mealie_list_id,
+                [
+                    (alexa_item.id, alexa_item.value, alexa_item.status, alexa_item.version)
+                    for alexa_item in alexa_items
+                ],
+            )
+
+            if fingerprints.is_unchanged(fingerprint):
+                return []
+
+        if mealie_items_by_alexa_id is None:
+            self.load_item_links(mealie_list_id, linked_ids=[alexa_item.id for alexa_item in alexa_items])
+
+        # unlinked Alexa items may be checked off by a later sync, so the lists can't be considered in sync
+        has_unlinked_alexa_items = False
+        for alexa_item in alexa_items:
+            if mealie_items_by_alexa_id is not None:
+                if alexa_item.id not in mealie_items_by_alexa_id:
+                    continue
+
+                mealie_item = mealie_items_by_alexa_id[alexa_item.id]
+
+            else:
+                mealie_item = self.get_mealie_item_by_item_id(mealie_list_id, alexa_item.id)
 
             # if the Mealie item is checked or non-existent, check off Alexa item
             # TODO: make Mealie retain deleted items for a while, or capture
@@ -257,11 +322,12 @@ class AlexaSyncHandler(BaseSyncHandler):
             if (mealie_item and mealie_item.checked) or (
                 (not mealie_item) and self.can_check_off_alexa_item(sync_event, alexa_item)
             ):
-                alexa_item.status = ListItemState.completed
-                alexa_items_to_update.append(alexa_item.cast(AlexaListItemUpdateBulkIn))
+                alexa_items_to_update.append(alexa_item.cast(AlexaListItemUpdateBulkIn, status=ListItemState.completed))
+                mealie_items_to_callback.append(None)
                 continue
 
             if not mealie_item:
+                has_unlinked_alexa_items = True
                 continue
 
             # the item is linked, so check if the item content matches
@@ -271,27 +337,54 @@ class AlexaSyncHandler(BaseSyncHandler):
             if not self.can_update_alexa_item(mealie_item, alexa_item):
                 continue
 
-            alexa_item.value = mealie_item.display
-            alexa_items_to_update.append(alexa_item.cast(AlexaListItemUpdateBulkIn))
+            alexa_items_to_update.append(alexa_item.cast(AlexaListItemUpdateBulkIn, value=mealie_item.display))
             mealie_items_to_callback.append(mealie_item)
 
-        for mealie_item in self.mealie_service.get_all_list_items(mealie_list_id):
+        if event_mealie_items is None:
+            mealie_items = self.mealie_service.get_all_list_items_view(mealie_list_id)
+
+        else:
+            mealie_items = event_mealie_items
+
+        self.load_item_links(mealie_list_id, mealie_items)
+        for mealie_item in mealie_items:
             if mealie_item.checked:
                 continue
 
-            if mealie_item.extras and mealie_item.extras.alexa_item_id:
+            if self.get_linked_id(mealie_item):
                 continue
 
             alexa_items_to_create.append(AlexaListItemCreateIn(value=mealie_item.display))
             mealie_items_to_callback.append(mealie_item)
 
+        linked_items: list[tuple[MealieShoppingListItemOut, AlexaListItemOut]] = []
         try:
-            updated_alexa_items = self.alexa_service.update_list_items(alexa_list_id, alexa_items_to_update)
-            new_alexa_items = self.alexa_service.create_list_items(alexa_list_id, alexa_items_to_create)
+            updated_alexa_items, new_alexa_items = self.alexa_service.update_and_create_list_items(
+                alexa_list_id, alexa_items_to_update, alexa_items_to_create
+            )
 
-            alexa_items = updated_alexa_items.list_items + new_alexa_items.list_items
-            for mealie_item, alexa_item in zip(mealie_items_to_callback, alexa_items):
+            changed_alexa_items = updated_alexa_items.list_items + new_alexa_items.list_items
+            for mealie_item, alexa_item in zip(mealie_items_to_callback, changed_alexa_items):
+                if not mealie_item:
+                    continue
+
+                self.link_mealie_item(mealie_item, alexa_item.id, str(alexa_item.version))
+                linked_items.append((mealie_item, alexa_item))
+
+        except Exception as e:
+            if settings.debug:
+                raise
+
+            logging.error("Unhandled exception when trying to bulk create/update Mealie items in Alexa")
+            logging.error(f"{type(e).__name__}: {e}")
+            logging.error(f"create: {alexa_items_to_create}")
+            logging.error(f"update: {alexa_items_to_update}")
+
+        # if the links can't be saved, write them to Mealie instead so the items aren't created again
+        if not self.flush_item_links() or self.mirror_links_to_extras:
+            for mealie_item, alexa_item in linked_items:
                 try:
+                    mealie_item = self.mealie_service.checkout_item(mealie_item)
                     if not mealie_item.extras:
                         mealie_item.extras = MealieShoppingListItemExtras()
 
@@ -307,21 +400,11 @@ class AlexaSyncHandler(BaseSyncHandler):
                     logging.error(f"{type(e).__name__}: {e}")
                     logging.error(mealie_item)
 
-        except Exception as e:
-            if settings.debug:
-                raise
-
-            logging.error("Unhandled exception when trying to bulk create/update Mealie items in Alexa")
-            logging.error(f"{type(e).__name__}: {e}")
-            logging.error(f"create: {alexa_items_to_create}")
-            logging.error(f"update: {alexa_items_to_update}")
-
-        try:
-            self.mealie_service.update_items(mealie_items_to_update)
+        if (
+            fingerprints
+            and fingerprint
+            and not (alexa_items_to_create or alexa_items_to_update or has_unlinked_alexa_items)
+        ):
+            fingerprints.save(fingerprint)
 
-        except Exception as e:
-            if settings.debug:
-                raise
-
-            logging.error("Unhandled exception when trying to bulk update Mealie items with new Alexa ids")
-            logging.error(f"{type(e).__name__}: {e}")
+        return mealie_items_to_update
@@ -1,11 +1,14 @@
-from typing import Type
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Type
 
 from pydantic import ValidationError
 
+from ..app import settings
 from ..models.account_linking import NotLinkedError
 from ..models.aws import SQSMessage
 from ..models.core import BaseSyncEvent, ListSyncMap, Source, User
-from ..models.mealie import MealieSyncEvent
+from ..models.mealie import MealieShoppingListItemUpdateBulk, MealieSyncEvent
 from ..services.mealie import MealieListService
 from ._base import BaseSyncHandler
 from .alexa import AlexaSyncHandler
@@ -22,16 +25,97 @@ class SQSSyncMessageHandler:
         self.user = user
         self.mealie = MealieListService(user)
 
-    def sync_to_external_systems(self, sync_event: BaseSyncEvent, list_sync_map: ListSyncMap):
-        """Sync all mealie items to external systems"""
+    def merge_mealie_updates(
+        self, items: list[MealieShoppingListItemUpdateBulk]
+    ) -> list[MealieShoppingListItemUpdateBulk]:
+        """
+        Merge Mealie item updates from multiple handlers into one update per item
 
-        # handle items in each linked system
-        for registered_handler in self.registered_handlers:
-            if not registered_handler.can_sync_list_map(list_sync_map):
+        Only fields (and extras) which differ from the cached Mealie item are merged, so handlers
+        writing back their own linked ids to the same item don't overwrite each other's changes
+        """
+
+        merged_items: dict[str, dict[str, Any]] = {}
+        for item in items:
+            if item.id not in merged_items:
+                merged_items[item.id] = item.dict()
                 continue
 
-            handler = registered_handler(self.user, self.mealie)
-            handler.receive_changes_from_mealie(sync_event, list_sync_map)
+            original_item = self.mealie.get_item_view(item.shopping_list_id, item.id)
+            original_data = original_item.cast(MealieShoppingListItemUpdateBulk).dict() if original_item else {}
+            merged_data = merged_items[item.id]
+            for key, value in item.dict().items():
+                if key != "extras":
+                    if value != original_data.get(key):
+                        merged_data[key] = value
+
+                    continue
+
+                original_extras: dict[str, Any] = original_data.get("extras") or {}
+                merged_extras: dict[str, Any] = merged_data.get("extras") or {}
+                for extras_key, extras_value in (value or {}).items():
+                    if extras_value != original_extras.get(extras_key):
+                        merged_extras[extras_key] = extras_value
+
+                merged_data["extras"] = merged_extras
+
+        return [MealieShoppingListItemUpdateBulk.parse_obj(data) for data in merged_items.values()]
+
+    def sync_to_external_systems(self, sync_event: BaseSyncEvent, list_sync_map: ListSyncMap):
+        """
+        Sync all mealie items to external systems
+
+        Each linked system is handled concurrently, then all of their changes are written back to Mealie at once
+        """
+
+        handlers = [
+            registered_handler(self.user, self.mealie)
+            for registered_handler in self.registered_handlers
+            if registered_handler.can_sync_list_map(list_sync_map)
+        ]
+
+        if not handlers:
+            return
+
+        # populate the Mealie cache up-front so concurrent handlers don't each fetch it
+        if isinstance(sync_event, MealieSyncEvent) and settings.mealie_targeted_sync and not sync_event.is_full_sync:
+            self.mealie.get_list_items_view_by_ids(list_sync_map.mealie_shopping_list_id, sync_event.item_ids)
+
+        else:
+            self.mealie.get_all_list_items_view(list_sync_map.mealie_shopping_list_id)
+
+        mealie_items_to_update: list[MealieShoppingListItemUpdateBulk] = []
+        handler_exceptions: list[Exception] = []
+        if len(handlers) == 1:
+            mealie_items_to_update.extend(handlers[0].receive_changes_from_mealie(sync_event, list_sync_map))
+
+        else:
+            with ThreadPoolExecutor(max_workers=len(handlers)) as executor:
+                futures = [
+                    executor.submit(handler.receive_changes_from_mealie, sync_event, list_sync_map)
+                    for handler in handlers
+                ]
+
+                # if one system fails, we still write back the changes made in the other systems
+                for future in futures:
+                    try:
+                        mealie_items_to_update.extend(future.result())
+
+                    except Exception as e:
+                        handler_exceptions.append(e)
+
+        try:
+            self.mealie.update_items(self.merge_mealie_updates(mealie_items_to_update))
+
+        except Exception as e:
+            if settings.debug:
+                raise
+
+            logging.error("Unhandled exception when trying to bulk update Mealie items from external systems")
+            logging.error(f"{type(e).__name__}: {e}")
+
+        if handler_exceptions:
+            raise handler_exceptions[0]
 
     def handle_message(self, message: SQSMessage) -> Source | None:
         """
@@ -57,11 +141,12 @@ class SQSSyncMessageHandler:
             else:
                 return None
 
-            self.sync_to_external_systems(base_sync_event, list_sync_map)
+            self.sync_to_external_systems(mealie_sync_event, list_sync_map)
             return base_sync_event.source  # mealie always skips additional events if a sync is successful
 
         # sync the event's source system to Mealie
         response: Source | None = None
+        sync_event = base_sync_event
         for registered_handler in self.registered_handlers:
             if not registered_handler.can_handle_message(message):
                 continue
@@ -72,6 +157,7 @@ class SQSSyncMessageHandler:
                 continue
 
             handler.sync_changes_to_mealie(message, list_sync_map)
+            sync_event = handler.parse_sync_event(message)
             if handler.suppress_additional_messages:
                 response = base_sync_event.source
 
@@ -81,5 +167,5 @@ class SQSSyncMessageHandler:
             return None
 
         # propagate changes made to Mealie to all systems
-        self.sync_to_external_systems(base_sync_event, list_sync_map)
+        self.sync_to_external_systems(sync_event, list_sync_map)
         return response
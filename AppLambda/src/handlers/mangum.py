@@ -1,9 +1,7 @@
 import json
+import logging
+from json import JSONDecodeError
 
-from mangum.handlers.utils import (
-    handle_base64_response_body,
-    handle_multi_value_headers,
-)
 from mangum.types import LambdaConfig, LambdaContext, LambdaEvent, Response, Scope
 
 
@@ -13,6 +11,8 @@ class SQS:
 
     Hijacks all requests with a "Records" key in them and emulates a POST request to the provided path.
     Must pass to Mangum using the `with_path` class method
+
+    The route's response body is returned to Lambda as-is, so it should be an SQS partial batch response
     """
 
     path = ""
@@ -55,14 +55,20 @@ class SQS:
             "aws.context": self.context,
         }
 
+    @property
+    def all_records_failed_response(self) -> dict:
+        records: list[dict] = self.event.get("Records", [])  # type: ignore
+        return {"batchItemFailures": [{"itemIdentifier": record["messageId"]} for record in records]}
+
     def __call__(self, response: Response) -> dict:
-        finalized_headers, multi_value_headers = handle_multi_value_headers(response["headers"])
-        finalized_body, is_base64_encoded = handle_base64_response_body(response["body"], finalized_headers)
+        # if the route failed entirely, we don't know which records were processed, so we retry all of them
+        if response["status"] != 200:
+            logging.error(f"SQS route returned status code {response['status']}; retrying all records")
+            return self.all_records_failed_response
 
-        return {
-            "statusCode": response["status"],
-            "headers": finalized_headers,
-            "multiValueHeaders": multi_value_headers,
-            "body": finalized_body,
-            "isBase64Encoded": is_base64_encoded,
-        }
+        try:
+            return json.loads(response["body"])
+
+        except JSONDecodeError:
+            logging.error("SQS route returned an invalid partial batch response; retrying all records")
+            return self.all_records_failed_response
@@ -1,5 +1,8 @@
 import logging
+from datetime import datetime
+from threading import RLock
 
+from cachetools import TTLCache
 from pydantic import ValidationError
 from todoist_api_python.models import Task
 
@@ -15,11 +18,21 @@ from ..models.mealie import (
 )
 from ..models.todoist import TodoistSyncEvent
 from ..services.mealie import MealieListService
-from ..services.todoist import TodoistTaskService
+from ..services.todoist import TodoistSyncState, get_todoist_task_service
 from ._base import BaseSyncHandler, CannotHandleListMapError
 
+_reconciled_projects: TTLCache[tuple[str, str], datetime] = TTLCache(
+    maxsize=1000, ttl=max(settings.todoist_reconciliation_interval_seconds, 1)
+)
+"""map of {(username, project_id): time of the last full project sync} for projects synced in this container"""
+
+_reconciled_projects_lock = RLock()
+
 
 class TodoistSyncHandler(BaseSyncHandler):
+    source = Source.todoist
+    extras_key = "todoist_task_id"
+
     def __init__(
         self,
         user: User,
@@ -27,8 +40,7 @@ class TodoistSyncHandler(BaseSyncHandler):
     ):
         super().__init__(user, mealie_service)
 
-        self.todoist_service = TodoistTaskService(user)
-        self.extras_key = "todoist_task_id"
+        self.todoist_service = get_todoist_task_service(user)
 
     @property
     def suppress_additional_messages(self) -> bool:
@@ -47,8 +59,11 @@ class TodoistSyncHandler(BaseSyncHandler):
     def can_sync_list_map(cls, list_sync_map: ListSyncMap):
         return bool(list_sync_map.todoist_project_id)
 
+    def parse_sync_event(self, message: SQSMessage) -> TodoistSyncEvent:
+        return message.parse_body(TodoistSyncEvent)
+
     def get_sync_map_from_message(self, message: SQSMessage):
-        sync_event = message.parse_body(TodoistSyncEvent)
+        sync_event = self.parse_sync_event(message)
         project_id = sync_event.project_id
 
         for list_sync_map in self.user.list_sync_maps.values():
@@ -56,7 +71,9 @@ class TodoistSyncHandler(BaseSyncHandler):
                 return list_sync_map
 
     def get_mealie_item_by_task_id(self, mealie_list_id: str, task_id: str) -> MealieShoppingListItemOut | None:
-        return self.mealie_service.get_item_by_extra(mealie_list_id, self.extras_key, task_id)
+        """Fetches a read-only Mealie item; use `MealieListService.checkout_item` before mutating it"""
+
+        return self.get_mealie_item_by_linked_id(mealie_list_id, task_id)
 
     def get_mealie_label_by_task(self, task: Task) -> Label | None:
         if not task.section_id:
@@ -65,9 +82,46 @@ class TodoistSyncHandler(BaseSyncHandler):
         if self.todoist_service.is_default_section(task.section_id, task.project_id):
             return None
 
-        section = self.todoist_service.get_section_by_id(task.section_id)
+        section = self.todoist_service.get_section_by_id(task.section_id, task.project_id)
         return self.mealie_service.get_label(section.name)
 
+    def get_event_tasks(self, sync_event: BaseSyncEvent, project_id: str) -> list[Task] | None:
+        """
+        Returns the tasks carried by a Todoist sync event, so they can be synced without fetching the entire project
+
+        Tasks which were closed or deleted are marked as completed. Returns None if the entire project should
+        be synced instead, either because the event has no tasks or because the project is due to be reconciled
+        """
+
+        if not (isinstance(sync_event, TodoistSyncEvent) and sync_event.tasks and settings.todoist_targeted_sync):
+            return None
+
+        if settings.todoist_reconciliation_interval_seconds:
+            with _reconciled_projects_lock:
+                if (self.user.username, project_id) not in _reconciled_projects:
+                    return None
+
+        tasks: list[Task] = []
+        for item in sync_event.tasks:
+            if item.get("project_id") != project_id:
+                continue
+
+            task = TodoistSyncState.parse_item(item)
+            task.is_completed = bool(item.get("checked") or item.get("is_deleted"))
+            tasks.append(task)
+
+        return tasks
+
+    def record_reconciled_project(self, project_id: str) -> None:
+        with _reconciled_projects_lock:
+            _reconciled_projects[(self.user.username, project_id)] = datetime.utcnow()
+
+    @staticmethod
+    def build_task_record(task: Task) -> tuple:
+        """build a record of everything compared when syncing a task, for sync fingerprints"""
+
+        return (task.id, task.content, task.description, task.section_id, sorted(task.labels), task.is_completed)
+
     def build_task_description_from_mealie_item(self, mealie_item: MealieShoppingListItemOut) -> str:
         # TODO: implement a fetch-recipe-by-id method in Mealie so we don't need to fetch the entire recipe store
         recipe_ids = set(ref.recipe_id for ref in mealie_item.recipe_references)
@@ -88,6 +142,81 @@ class TodoistSyncHandler(BaseSyncHandler):
         )
         return f"From: {recipes_string}"
 
+    def sync_task_to_mealie(
+        self,
+        task: Task,
+        mealie_list_id: str,
+        mealie_items_to_create: list[MealieShoppingListItemCreate],
+        mealie_items_to_update: list[MealieShoppingListItemUpdateBulk],
+        mealie_items_to_delete: list[MealieShoppingListItemOut],
+    ) -> None:
+        """Compares a task to its linked Mealie item and queues any changes needed in Mealie"""
+
+        # if the item is linked, compare the item label and content
+        if mealie_item := self.get_mealie_item_by_task_id(mealie_list_id, task.id):
+            if mealie_item.checked:
+                return
+
+            if task.content == mealie_item.display:
+                # compare the Mealie label to the Todoist section
+                mealie_label = self.mealie_service.get_label_from_item(mealie_item)
+                if self.todoist_service.is_task_section(str(mealie_label) if mealie_label else None, task):
+                    return
+
+                new_label = self.get_mealie_label_by_task(task)
+                mealie_items_to_update.append(
+                    mealie_item.cast(
+                        MealieShoppingListItemUpdateBulk,
+                        label_id=new_label.id if new_label else None,
+                    )
+                )
+
+                return
+
+            else:
+                # the content does not match, and we don't have structured item data
+                # in Todoist, so we need to completely replace the item in Mealie
+                # (the new item is linked by its extras)
+                self.unlink_mealie_item(mealie_item)
+                mealie_items_to_delete.append(mealie_item)
+                mealie_item_to_create = MealieShoppingListItemCreate(
+                    shopping_list_id=mealie_list_id,
+                    note=task.content,
+                    quantity=0,
+                    extras=MealieShoppingListItemExtras(todoist_task_id=task.id),
+                )
+
+                label = self.get_mealie_label_by_task(task)
+                if label:
+                    mealie_item_to_create.label_id = label.id
+
+                mealie_items_to_create.append(mealie_item_to_create)
+
+        elif settings.todoist_mealie_label not in task.labels:
+            # the item is not linked, so create the item in Mealie
+            mealie_item_to_create = MealieShoppingListItemCreate(
+                shopping_list_id=mealie_list_id,
+                note=task.content,
+                quantity=0,
+                extras=MealieShoppingListItemExtras(todoist_task_id=task.id),
+            )
+
+            label = self.get_mealie_label_by_task(task)
+            if label:
+                mealie_item_to_create.label_id = label.id
+
+            mealie_items_to_create.append(mealie_item_to_create)
+
+    def check_off_mealie_item(
+        self, mealie_item: MealieShoppingListItemOut, mealie_items_to_update: list[MealieShoppingListItemUpdateBulk]
+    ) -> None:
+        self.unlink_mealie_item(mealie_item)
+        mealie_item = self.mealie_service.checkout_item(mealie_item)
+        mealie_item.checked = True
+        if mealie_item.extras:
+            mealie_item.extras.todoist_task_id = None
+        mealie_items_to_update.append(mealie_item.cast(MealieShoppingListItemUpdateBulk))
+
     def sync_changes_to_mealie(self, message: SQSMessage, list_sync_map: ListSyncMap):
         if not list_sync_map.todoist_project_id:
             raise CannotHandleListMapError()
@@ -95,63 +224,35 @@ class TodoistSyncHandler(BaseSyncHandler):
         mealie_list_id = list_sync_map.mealie_shopping_list_id
         project_id = list_sync_map.todoist_project_id
 
+        # if the event carries the changed tasks, only those tasks are synced
+        event_tasks = self.get_event_tasks(self.parse_sync_event(message), project_id)
+
         mealie_items_to_create: list[MealieShoppingListItemCreate] = []
         mealie_items_to_update: list[MealieShoppingListItemUpdateBulk] = []
         mealie_items_to_delete: list[MealieShoppingListItemOut] = []
-        for task in self.todoist_service.get_tasks(project_id):
+        tasks = self.todoist_service.get_tasks_view(project_id) if event_tasks is None else event_tasks
+
+        # when syncing the entire project, skip the sync if neither side has changed since they were last in sync
+        fingerprints = self.get_sync_fingerprints(mealie_list_id, Source.todoist) if event_tasks is None else None
+        fingerprint = None
+        if fingerprints:
+            fingerprint = self.build_sync_fingerprint(mealie_list_id, [self.build_task_record(task) for task in tasks])
+            if fingerprints.is_unchanged(fingerprint):
+                return
+
+        self.load_item_links(mealie_list_id, linked_ids=[task.id for task in tasks])
+        for task in tasks:
             try:
-                # if the item is linked, compare the item label and content
-                if mealie_item := self.get_mealie_item_by_task_id(mealie_list_id, task.id):
-                    if mealie_item.checked:
-                        continue
-
-                    if task.content == mealie_item.display:
-                        # compare the Mealie label to the Todoist section
-                        mealie_label = self.mealie_service.get_label_from_item(mealie_item)
-                        if self.todoist_service.is_task_section(str(mealie_label) if mealie_label else None, task):
-                            continue
-
-                        new_label = self.get_mealie_label_by_task(task)
-                        mealie_items_to_update.append(
-                            mealie_item.cast(
-                                MealieShoppingListItemUpdateBulk,
-                                label_id=new_label.id if new_label else None,
-                            )
-                        )
-
-                        continue
-
-                    else:
-                        # the content does not match, and we don't have structured item data
-                        # in Todoist, so we need to completely replace the item in Mealie
-                        mealie_items_to_delete.append(mealie_item)
-                        mealie_item_to_create = MealieShoppingListItemCreate(
-                            shopping_list_id=mealie_list_id,
-                            note=task.content,
-                            quantity=0,
-                            extras=MealieShoppingListItemExtras(todoist_task_id=task.id),
-                        )
-
-                        label = self.get_mealie_label_by_task(task)
-                        if label:
-                            mealie_item_to_create.label_id = label.id
-
-                        mealie_items_to_create.append(mealie_item_to_create)
-
-                elif settings.todoist_mealie_label not in task.labels:
-                    # the item is not linked, so create the item in Mealie
-                    mealie_item_to_create = MealieShoppingListItemCreate(
-                        shopping_list_id=mealie_list_id,
-                        note=task.content,
-                        quantity=0,
-                        extras=MealieShoppingListItemExtras(todoist_task_id=task.id),
+                if not task.is_completed:
+                    self.sync_task_to_mealie(
+                        task, mealie_list_id, mealie_items_to_create, mealie_items_to_update, mealie_items_to_delete
                     )
 
-                    label = self.get_mealie_label_by_task(task)
-                    if label:
-                        mealie_item_to_create.label_id = label.id
-
-                    mealie_items_to_create.append(mealie_item_to_create)
+                # check off the Mealie item linked to a closed task
+                elif (
+                    mealie_item := self.get_mealie_item_by_task_id(mealie_list_id, task.id)
+                ) and not mealie_item.checked:
+                    self.check_off_mealie_item(mealie_item, mealie_items_to_update)
 
             except Exception as e:
                 if settings.debug:
@@ -161,19 +262,21 @@ class TodoistSyncHandler(BaseSyncHandler):
                 logging.error(f"{type(e).__name__}: {e}")
                 logging.error(task)
 
-        for mealie_item in self.mealie_service.get_all_list_items(mealie_list_id):
+        # when syncing the entire project, check off Mealie items whose tasks no longer exist
+        mealie_items = self.mealie_service.get_all_list_items_view(mealie_list_id) if event_tasks is None else ()
+        self.load_item_links(mealie_list_id, mealie_items)
+        for mealie_item in mealie_items:
             try:
                 if mealie_item.checked:
                     continue
 
-                if not (mealie_item.extras and mealie_item.extras.todoist_task_id):
+                task_id = self.get_linked_id(mealie_item)
+                if not task_id:
                     continue
 
                 # check off Mealie item
-                if not self.todoist_service.get_task(mealie_item.extras.todoist_task_id, project_id):
-                    mealie_item.checked = True
-                    mealie_item.extras.todoist_task_id = None
-                    mealie_items_to_update.append(mealie_item.cast(MealieShoppingListItemUpdateBulk))
+                if not self.todoist_service.get_task_view(task_id, project_id):
+                    self.check_off_mealie_item(mealie_item, mealie_items_to_update)
 
             except Exception as e:
                 if settings.debug:
@@ -194,17 +297,70 @@ class TodoistSyncHandler(BaseSyncHandler):
 
             logging.error("Unhandled exception when trying to perform bulk CRUD op from Todoist to Mealie")
 
-    def receive_changes_from_mealie(self, sync_event: BaseSyncEvent, list_sync_map: ListSyncMap):
+        self.flush_item_links()
+        if (
+            fingerprints
+            and fingerprint
+            and not (mealie_items_to_create or mealie_items_to_update or mealie_items_to_delete)
+        ):
+            fingerprints.save(fingerprint)
+
+    def receive_changes_from_mealie(
+        self, sync_event: BaseSyncEvent, list_sync_map: ListSyncMap
+    ) -> list[MealieShoppingListItemUpdateBulk]:
         if not list_sync_map.todoist_project_id:
             raise CannotHandleListMapError()
 
         mealie_list_id = list_sync_map.mealie_shopping_list_id
         project_id = list_sync_map.todoist_project_id
-        mealie_items_to_update: list[MealieShoppingListItemUpdateBulk] = []
-        for task in self.todoist_service.get_tasks(project_id):
+
+        # if the event carries the changed Mealie items, only the tasks linked to those items need to be compared
+        event_mealie_items = self.get_event_mealie_items(sync_event, mealie_list_id)
+        mealie_items_by_task_id: dict[str, MealieShoppingListItemOut] | None = None
+        if event_mealie_items is not None:
+            self.load_item_links(mealie_list_id, event_mealie_items)
+            mealie_items_by_task_id = {}
+            for mealie_item in event_mealie_items:
+                if task_id := self.get_linked_id(mealie_item):
+                    mealie_items_by_task_id[task_id] = mealie_item
+
+        # if the event carries the changed tasks, only those tasks need to be compared with Mealie
+        event_tasks = self.get_event_tasks(sync_event, project_id)
+        if mealie_items_by_task_id is not None:
+            tasks = self.todoist_service.get_tasks_view_by_ids(list(mealie_items_by_task_id), project_id)
+
+        elif event_tasks is None:
+            tasks = self.todoist_service.get_tasks_view(project_id)
+
+        else:
+            tasks = tuple(task for task in event_tasks if not task.is_completed)
+            self.todoist_service.add_known_tasks(list(tasks))
+
+        # when syncing the entire list, skip the sync if neither side has changed since they were last in sync
+        fingerprints = fingerprint = None
+        if event_mealie_items is None and event_tasks is None:
+            fingerprints = self.get_sync_fingerprints(mealie_list_id, Source.mealie)
+
+        if fingerprints:
+            fingerprint = self.build_sync_fingerprint(mealie_list_id, [self.build_task_record(task) for task in tasks])
+            if fingerprints.is_unchanged(fingerprint):
+                return []
+
+        if mealie_items_by_task_id is None:
+            self.load_item_links(mealie_list_id, linked_ids=[task.id for task in tasks])
+
+        # Mealie items whose linked task ids changed; the ids may be temporary until Todoist changes are flushed
+        mealie_items_to_link: list[tuple[MealieShoppingListItemOut, str]] = []
+        has_changes = False
+        for task in tasks:
             try:
                 # if the item is linked, update the task content
-                mealie_item = self.get_mealie_item_by_task_id(mealie_list_id, task.id)
+                if mealie_items_by_task_id is not None:
+                    mealie_item = mealie_items_by_task_id.get(task.id)
+
+                else:
+                    mealie_item = self.get_mealie_item_by_task_id(mealie_list_id, task.id)
+
                 if mealie_item and not mealie_item.checked:
                     # if the items match, do nothing
                     mealie_label = self.mealie_service.get_label_from_item(mealie_item)
@@ -216,6 +372,7 @@ class TodoistSyncHandler(BaseSyncHandler):
                         continue
 
                     # if the items don't match, update Todoist to match Mealie
+                    has_changes = True
                     updated_task = self.todoist_service.update_task(
                         task_id=task.id,
                         project_id=project_id,
@@ -225,17 +382,16 @@ class TodoistSyncHandler(BaseSyncHandler):
                         description=self.build_task_description_from_mealie_item(mealie_item),
                     )
 
-                    # if the updated task has a new id, write it back to Mealie
+                    # if the updated task has a new id, link it instead
                     if updated_task.id != task.id:
-                        if not mealie_item.extras:
-                            mealie_item.extras = MealieShoppingListItemExtras()
-
-                        mealie_item.extras.todoist_task_id = updated_task.id
-                        mealie_items_to_update.append(mealie_item.cast(MealieShoppingListItemUpdateBulk))
+                        mealie_items_to_link.append((mealie_item, updated_task.id))
 
                 # close Todoist task if it used to be linked to a Mealie item
                 elif settings.todoist_mealie_label in task.labels:
+                    has_changes = True
                     self.todoist_service.close_task(task)
+                    if mealie_item:
+                        self.unlink_mealie_item(mealie_item)
 
             except Exception as e:
                 if settings.debug:
@@ -245,15 +401,23 @@ class TodoistSyncHandler(BaseSyncHandler):
                 logging.error(f"{type(e).__name__}: {e}")
                 logging.error(task)
 
-        for mealie_item in self.mealie_service.get_all_list_items(mealie_list_id):
+        if event_mealie_items is None:
+            mealie_items = self.mealie_service.get_all_list_items_view(mealie_list_id)
+
+        else:
+            mealie_items = event_mealie_items
+
+        self.load_item_links(mealie_list_id, mealie_items)
+        for mealie_item in mealie_items:
             try:
                 if mealie_item.checked:
                     continue
 
-                if mealie_item.extras and mealie_item.extras.todoist_task_id:
+                if self.get_linked_id(mealie_item):
                     continue
 
                 # create new Todoist task
+                has_changes = True
                 mealie_label = self.mealie_service.get_label_from_item(mealie_item)
                 new_task = self.todoist_service.add_task(
                     content=mealie_item.display,
@@ -263,12 +427,7 @@ class TodoistSyncHandler(BaseSyncHandler):
                     description=self.build_task_description_from_mealie_item(mealie_item),
                 )
 
-                # write new id back to Mealie
-                if not mealie_item.extras:
-                    mealie_item.extras = MealieShoppingListItemExtras()
-
-                mealie_item.extras.todoist_task_id = new_task.id
-                mealie_items_to_update.append(mealie_item.cast(MealieShoppingListItemUpdateBulk))
+                mealie_items_to_link.append((mealie_item, new_task.id))
 
             except Exception as e:
                 if settings.debug:
@@ -278,11 +437,39 @@ class TodoistSyncHandler(BaseSyncHandler):
                 logging.error(f"{type(e).__name__}: {e}")
                 logging.error(mealie_item)
 
-        try:
-            self.mealie_service.update_items(mealie_items_to_update)
+        # send any queued changes to Todoist, then link the final ids of the tasks Todoist accepted
+        task_errors = self.todoist_service.flush()
+        if event_tasks is None and isinstance(sync_event, TodoistSyncEvent) and not task_errors:
+            self.record_reconciled_project(project_id)
 
-        except Exception:
-            if settings.debug:
-                raise
+        linked_tasks: list[tuple[MealieShoppingListItemOut, str]] = []
+        for mealie_item, task_id in mealie_items_to_link:
+            if task_id in task_errors:
+                continue
+
+            task_id = self.todoist_service.resolve_task_id(task_id)
+            self.link_mealie_item(mealie_item, task_id)
+            linked_tasks.append((mealie_item, task_id))
+
+        # if the links can't be saved, write them to Mealie instead so the tasks aren't created again
+        mealie_items_to_update: list[MealieShoppingListItemUpdateBulk] = []
+        if not self.flush_item_links() or self.mirror_links_to_extras:
+            for mealie_item, task_id in linked_tasks:
+                mealie_item = self.mealie_service.checkout_item(mealie_item)
+                if not mealie_item.extras:
+                    mealie_item.extras = MealieShoppingListItemExtras()
+
+                mealie_item.extras.todoist_task_id = task_id
+                mealie_items_to_update.append(mealie_item.cast(MealieShoppingListItemUpdateBulk))
+
+        # the accepted changes are saved before retrying, so the tasks Todoist created aren't created again
+        if task_errors:
+            if mealie_items_to_update:
+                self.mealie_service.update_items(mealie_items_to_update)
+
+            raise Exception(f"Unable to update {len(task_errors)} task(s); rejected by Todoist")
+
+        if fingerprints and fingerprint and not has_changes:
+            fingerprints.save(fingerprint)
 
-            logging.error("Unhandled exception when trying to bulk update Mealie items with new Todoist task ids")
+        return mealie_items_to_update
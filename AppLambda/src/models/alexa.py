@@ -1,3 +1,4 @@
+import time
 from datetime import datetime
 from enum import Enum
 from typing import Any
@@ -172,6 +173,38 @@ class AlexaListCollectionOut(APIBase):
     lists: list[AlexaListOut]
 
 
+class AlexaListShadow(APIBase):
+    """A copy of an Alexa list, kept up-to-date using Alexa list events and our own writes"""
+
+    list_id: str
+    user_id: str | None
+    list_data: str | None
+    """JSON representation of the shadowed list (`AlexaListOut`)"""
+
+    event_version: int = 0
+    """Incremented every time Alexa notifies us of a change to the list"""
+
+    snapshot_version: int = -1
+    """The event version when the shadowed list was last fetched from Alexa"""
+
+    shadow_version: int = 0
+    """Incremented every time the shadowed list is written"""
+
+    snapshot_at: float = 0
+    """Epoch time when the shadowed list was last fetched from Alexa"""
+
+    def is_fresh(self, max_age: float) -> bool:
+        """Whether the shadowed list reflects every change Alexa has notified us of"""
+
+        if not self.list_data or self.event_version > self.snapshot_version:
+            return False
+
+        return time.time() - self.snapshot_at < max_age
+
+    def get_list(self) -> AlexaListOut | None:
+        return AlexaListOut.parse_raw(self.list_data) if self.list_data else None
+
+
 ### Sync ###
 class AlexaListEvent(APIBase):
     request_id: str
@@ -191,3 +224,29 @@ class AlexaListEvent(APIBase):
 class AlexaSyncEvent(BaseSyncEvent):
     source: Source = Source.alexa
     list_event: AlexaListEvent
+
+    @property
+    def coalesce_key(self) -> tuple[str, ...]:
+        # item ids are only handled by the event's operation, so events with different operations can't be merged
+        return super().coalesce_key + (
+            self.list_event.list_id,
+            ObjectType(self.list_event.object_type).value,
+            Operation(self.list_event.operation).value,
+        )
+
+    @property
+    def is_full_sync(self) -> bool:
+        return False
+
+    def coalesce(self, other: BaseSyncEvent) -> None:
+        if not isinstance(other, AlexaSyncEvent):
+            return
+
+        list_item_ids = self.list_event.list_item_ids or []
+        existing_list_item_ids = set(list_item_ids)
+        for list_item_id in other.list_event.list_item_ids or []:
+            if list_item_id not in existing_list_item_ids:
+                list_item_ids.append(list_item_id)
+                existing_list_item_ids.add(list_item_id)
+
+        self.list_event.list_item_ids = list_item_ids
@@ -28,6 +28,25 @@ class SQSEvent(BaseModel):
     records: list[SQSMessage] = Field(..., alias="Records")
 
 
+class SQSBatchItemFailure(BaseModel):
+    item_identifier: str
+    """the message id of the failed SQS message"""
+
+    class Config:
+        alias_generator = camelize
+        allow_population_by_field_name = True
+
+
+class SQSBatchResponse(BaseModel):
+    """Partial batch response; only failed messages are redelivered by SQS"""
+
+    batch_item_failures: list[SQSBatchItemFailure] = []
+
+    class Config:
+        alias_generator = camelize
+        allow_population_by_field_name = True
+
+
 class DynamoDBAtomicOp(Enum):
     increment = "+"
     decrement = "-"
@@ -1,3 +1,4 @@
+import hashlib
 import time
 from datetime import datetime
 from enum import Enum
@@ -39,6 +40,22 @@ class ListSyncMap(APIBase):
     todoist_project_id: str | None
 
 
+class ItemLink(APIBase):
+    """A link between a Mealie item and its counterpart in another system (e.g. an Alexa item or a Todoist task)"""
+
+    link_key: str
+    """Each link is stored twice, keyed once by the Mealie item id and once by the linked id"""
+
+    username: str
+    mealie_list_id: str
+    system: str
+    """The `Source` of the linked item"""
+
+    mealie_item_id: str
+    linked_id: str
+    linked_version: str | None = None
+
+
 class UserConfiguration(APIBase):
     alexa: UserAlexaConfiguration | None
     mealie: UserMealieConfiguration | None
@@ -102,6 +119,10 @@ class Source(Enum):
     todoist = "Todoist"
 
 
+def get_sync_event_queue_name(use_dev_route=False) -> str:
+    return settings.sync_event_dev_sqs_queue_name if use_dev_route else settings.sync_event_sqs_queue_name
+
+
 class BaseSyncEvent(APIBase):
     username: str
     source: Source
@@ -112,17 +133,99 @@ class BaseSyncEvent(APIBase):
     event_id: str = Field(default_factory=lambda: str(uuid4()))
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
+    not_before: datetime | None = None
+    """if set, the event isn't processed until this time; used to debounce events"""
+
+    list_sync_map_id: str | None = None
+    """the id (i.e. the Mealie shopping list id) of the list map this event syncs, if it's known"""
+
     class Config:
         use_enum_values = True  # TODO: disable this and replace .dict() with .json()
 
     @property
     def group_id(self):
-        return self.username  # preserves order of events per-user
+        """
+        The SQS FIFO message group of this event; events in the same group are processed in order
+
+        Events are grouped per list map, so each list is synced in order while other lists sync in parallel.
+        If the event's list map isn't known, events are grouped per user instead
+        """
+
+        if self.list_sync_map_id:
+            return "|".join([self.username, self.list_sync_map_id])
+
+        return self.username
+
+    @property
+    def coalesce_key(self) -> tuple[str, ...]:
+        """Events with the same coalesce key trigger identical syncs, so they can be handled by a single sync pass"""
+
+        return (self.username, Source(self.source).value)
+
+    @property
+    def is_full_sync(self) -> bool:
+        """Whether handling this event syncs the entire list, rather than only the items referenced by the event"""
+
+        return True
+
+    def coalesce(self, other: "BaseSyncEvent") -> None:
+        """Merge a later event with the same coalesce key into this one"""
+
+        pass
+
+    def expand_to_full_sync(self) -> None:
+        """Make this event sync the entire list, rather than only the items referenced by the event"""
+
+        pass
+
+    def debounce(self, window_seconds: int) -> None:
+        """
+        Schedule this event to sync the entire list once the current debounce window closes
+
+        Every event with the same coalesce key in the same window gets the same event id, which SQS FIFO uses
+        to deduplicate messages, so only the first event is queued and the rest are absorbed by it. Since the
+        absorbed events can't contribute their items, the queued event syncs the entire list
+        """
+
+        window = int(time.time() // window_seconds)
+        self.expand_to_full_sync()
+        self.not_before = datetime.utcfromtimestamp((window + 1) * window_seconds)
+        self.event_id = hashlib.sha256("|".join(self.coalesce_key + (str(window),)).encode()).hexdigest()
 
     def send_to_queue(self, use_dev_route=False) -> None:
         """Queue this event to be processed asynchronously"""
 
-        sqs = aws.SQSFIFO(
-            settings.sync_event_dev_sqs_queue_name if use_dev_route else settings.sync_event_sqs_queue_name
-        )
+        sqs = aws.SQSFIFO(get_sync_event_queue_name(use_dev_route))
         sqs.send_message(self.json(), self.event_id, self.group_id)
+
+
+class SyncEventBatch:
+    """Collects sync events which are queued together, in as few requests as possible, when `flush` is called"""
+
+    def __init__(self) -> None:
+        self._sync_events_by_queue: dict[str, list[BaseSyncEvent]] = {}
+        """map of {queue_name: sync events}"""
+
+    def add(self, sync_event: BaseSyncEvent, use_dev_route=False) -> None:
+        self._sync_events_by_queue.setdefault(get_sync_event_queue_name(use_dev_route), []).append(sync_event)
+
+    def flush(self) -> list[BaseSyncEvent]:
+        """Queue all collected events and return them"""
+
+        sync_events_by_queue = self._sync_events_by_queue
+        self._sync_events_by_queue = {}
+
+        queued_events: list[BaseSyncEvent] = []
+        for queue_name, sync_events in sync_events_by_queue.items():
+            sqs = aws.SQSFIFO(queue_name)
+            if len(sync_events) == 1:
+                sqs.send_message(sync_events[0].json(), sync_events[0].event_id, sync_events[0].group_id)
+
+            else:
+                sqs.send_message_batch(
+                    [(sync_event.json(), sync_event.event_id, sync_event.group_id) for sync_event in sync_events]
+                )
+
+            queued_events.extend(sync_events)
+
+        return queued_events
@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+
+
+class HTTPHostStats(BaseModel):
+    """Connection pool statistics for a single host"""
+
+    host: str
+    connections_opened: int = 0
+    requests_sent: int = 0
+
+    @property
+    def connections_reused(self) -> int:
+        """Number of requests that were sent over an existing keep-alive connection"""
+
+        return max(0, self.requests_sent - self.connections_opened)
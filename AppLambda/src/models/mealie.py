@@ -316,6 +316,26 @@ class MealieShoppingListItemOut(MealieShoppingListItemBase):
         return " ".join(components).strip()
 
 
+class MealieShoppingListItemView(MealieShoppingListItemOut):
+    """
+    A read-only shopping list item, shared with the local list item cache
+
+    Assigning to its fields raises a TypeError; use `MealieListService.checkout_item` to get a copy that can be mutated
+    """
+
+    class Config:
+        allow_mutation = False
+
+    @classmethod
+    def from_item(cls, item: MealieShoppingListItemOut) -> "MealieShoppingListItemView":
+        """Wraps the fields of an item without copying or re-validating them"""
+
+        if isinstance(item, cls):
+            return item
+
+        return cls.construct(_fields_set=item.__fields_set__, **item.__dict__)
+
+
 class MealieShoppingListItemsCollectionOut(MealieBase):
     """Container for bulk shopping list item changes"""
 
@@ -338,6 +358,14 @@ class MealieShoppingListOut(MealieBase):
 class MealieEventNotifierOptions(MealieBase):
     shopping_list_updated: bool = True
 
+    recipe_created: bool = False
+    recipe_updated: bool = False
+    recipe_deleted: bool = False
+
+    label_created: bool = False
+    label_updated: bool = False
+    label_deleted: bool = False
+
 
 class MealieEventNotifierCreate(MealieBase):
     name: str
@@ -366,18 +394,47 @@ class MealieEventType(Enum):
     shopping_list_updated = "shopping_list_updated"
     shopping_list_deleted = "shopping_list_deleted"
 
+    recipe_created = "recipe_created"
+    recipe_updated = "recipe_updated"
+    recipe_deleted = "recipe_deleted"
+
+    label_created = "label_created"
+    label_updated = "label_updated"
+    label_deleted = "label_deleted"
+
     @classmethod
     def _missing_(cls, value):
         return cls.invalid
 
+    @property
+    def is_catalog_event(self) -> bool:
+        """Whether this event changes a Mealie catalog (recipes, labels) rather than a shopping list"""
+
+        return self in CATALOG_EVENT_TYPES
+
+
+CATALOG_EVENT_TYPES = {
+    MealieEventType.recipe_created,
+    MealieEventType.recipe_updated,
+    MealieEventType.recipe_deleted,
+    MealieEventType.label_created,
+    MealieEventType.label_updated,
+    MealieEventType.label_deleted,
+}
+
 
 class MealieEventOperation(Enum):
+    invalid = "invalid"
     info = "info"
 
     create = "create"
     update = "update"
     delete = "delete"
 
+    @classmethod
+    def _missing_(cls, value):
+        return cls.invalid
+
 
 class MealieEventNotification(BaseModel):
     event_id: str
@@ -391,20 +448,70 @@ class MealieEventNotification(BaseModel):
     document_data: str
     """JSON-encoded string"""
 
-    def get_shopping_list_id_from_document_data(self) -> str | None:
+    def _parse_document_data(self) -> dict[str, Any]:
         try:
             # sometimes the JSON string gets URL encoded with +, so we filter those out
-            parsed_data: dict[str, Any] = json.loads(self.document_data.replace("+", " "))
-            shopping_list_id = parsed_data.get("shoppingListId")
-            if shopping_list_id is None:
-                return None
-            else:
-                return str(shopping_list_id)
+            parsed_data = json.loads(self.document_data.replace("+", " "))
+            return parsed_data if isinstance(parsed_data, dict) else {}
 
         except JSONDecodeError:
+            return {}
+
+    def get_shopping_list_id_from_document_data(self) -> str | None:
+        shopping_list_id = self._parse_document_data().get("shoppingListId")
+        if shopping_list_id is None:
             return None
+        else:
+            return str(shopping_list_id)
+
+    def get_shopping_list_item_ids_from_document_data(self) -> list[str]:
+        """Returns the ids of the shopping list items changed by this event, if Mealie sent them"""
+
+        parsed_data = self._parse_document_data()
+        item_ids: list[Any] = parsed_data.get("shoppingListItemIds") or []
+        if parsed_data.get("shoppingListItemId"):
+            item_ids.append(parsed_data["shoppingListItemId"])
+
+        return [str(item_id) for item_id in item_ids]
+
+    def get_operation_from_document_data(self) -> MealieEventOperation | None:
+        operation = self._parse_document_data().get("operation")
+        return MealieEventOperation(operation) if operation else None
 
 
 class MealieSyncEvent(BaseSyncEvent):
     source: Source = Source.mealie
     shopping_list_id: str
+
+    item_ids: list[str] = []
+    """if empty, the entire shopping list is synced"""
+
+    operation: MealieEventOperation | None = None
+    """the operation applied to `item_ids`; null if events with different operations were coalesced"""
+
+    @property
+    def coalesce_key(self) -> tuple[str, ...]:
+        return super().coalesce_key + (self.shopping_list_id,)
+
+    @property
+    def is_full_sync(self) -> bool:
+        # deleted items can't be fetched, so we can't find their linked items without syncing the entire list
+        return not self.item_ids or self.operation == MealieEventOperation.delete.value
+
+    def coalesce(self, other: BaseSyncEvent) -> None:
+        if not isinstance(other, MealieSyncEvent):
+            return
+
+        # if either event syncs the entire list, so does the merged event
+        if self.is_full_sync or other.is_full_sync:
+            self.item_ids = []
+            self.operation = None
+            return
+
+        self.item_ids = list(dict.fromkeys(self.item_ids + other.item_ids))
+        if self.operation != other.operation:
+            self.operation = None
+
+    def expand_to_full_sync(self) -> None:
+        self.item_ids = []
+        self.operation = None
@@ -1,7 +1,8 @@
 from enum import Enum
 from typing import Any
+from uuid import uuid4
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from todoist_api_python.models import Task
 
 from ..models._base import APIBase
@@ -57,6 +58,36 @@ class TodoistTask(APIBase):
         return TodoistTask(user_id=task.creator_id, **task.to_dict())
 
 
+class TodoistSyncCommand(BaseModel):
+    """https://developer.todoist.com/sync/v9/#write-resources"""
+
+    type: str
+    uuid: str = Field(default_factory=lambda: str(uuid4()))
+    temp_id: str | None = None
+    args: dict[str, Any]
+
+
+class TodoistSyncResponse(BaseModel):
+    """https://developer.todoist.com/sync/v9/#read-resources"""
+
+    sync_token: str
+    full_sync: bool = False
+
+    items: list[dict[str, Any]] = []
+    sections: list[dict[str, Any]] = []
+
+    sync_status: dict[str, Any] = {}
+    """map of {command uuid: "ok" or error details}"""
+
+    temp_id_mapping: dict[str, str] = {}
+    """map of {temp id: real id}"""
+
+    def get_command_errors(self) -> dict[str, Any]:
+        """Returns a map of {command uuid: error details} for all commands which failed"""
+
+        return {uuid: status for uuid, status in self.sync_status.items() if status != "ok"}
+
+
 ### Sync ###
 class TodoistEventType(Enum):
     invalid = "invalid"
@@ -83,3 +114,37 @@ class TodoistWebhook(BaseModel):
 class TodoistSyncEvent(BaseSyncEvent):
     source: Source = Source.todoist
     project_id: str
+
+    tasks: list[dict[str, Any]] = []
+    """
+    the changed tasks, as Sync API items, taken from webhook payloads
+
+    if empty, the entire project is synced
+    """
+
+    @property
+    def coalesce_key(self) -> tuple[str, ...]:
+        return super().coalesce_key + (self.project_id,)
+
+    @property
+    def is_full_sync(self) -> bool:
+        return not self.tasks
+
+    def coalesce(self, other: BaseSyncEvent) -> None:
+        if not isinstance(other, TodoistSyncEvent):
+            return
+
+        # if either event syncs the entire project, so does the merged event
+        if not (self.tasks and other.tasks):
+            self.tasks = []
+            return
+
+        # later payloads are more recent, so they replace earlier payloads for the same task
+        tasks_by_id = {task["id"]: task for task in self.tasks}
+        for task in other.tasks:
+            tasks_by_id[task["id"]] = task
+
+        self.tasks = list(tasks_by_id.values())
+
+    def expand_to_full_sync(self) -> None:
+        self.tasks = []
@@ -7,8 +7,10 @@ from typing import cast
 from fastapi import APIRouter, Depends, Form, HTTPException, Request, Response, status
 from fastapi.responses import HTMLResponse, RedirectResponse
 from todoist_api_python.api import TodoistAPI
+from todoist_api_python.endpoints import BASE_URL
 
 from ..app import app, services, settings, templates
+from ..clients import http
 from ..clients.mealie import MealieClient
 from ..models.account_linking import (
     SyncMapRender,
@@ -34,7 +36,7 @@ api_router = APIRouter(prefix="/api/account-linking", tags=["Account Linking"])
 
 
 def _get_todoist_client(token: str) -> TodoistAPI:
-    return TodoistAPI(token)
+    return TodoistAPI(token, session=http.sessions.get_session(BASE_URL))
 
 
 ### Frontend ###
@@ -259,13 +261,21 @@ async def link_mealie_account(
 
     new_mealie_notifier = client.create_notifier(f"{app.title} | {user.username}", notifier_url)
 
-    # update the notifier to only send us shopping list updates
+    # update the notifier to only send us shopping list updates and catalog changes (to invalidate our cache)
     updated_notifier = MealieEventNotifierUpdate(
         id=new_mealie_notifier.id,
         group_id=new_mealie_notifier.group_id,
         name=new_mealie_notifier.name,
         apprise_url=notifier_url,
-        options=MealieEventNotifierOptions(shopping_list_updated=True),
+        options=MealieEventNotifierOptions(
+            shopping_list_updated=True,
+            recipe_created=True,
+            recipe_updated=True,
+            recipe_deleted=True,
+            label_created=True,
+            label_updated=True,
+            label_deleted=True,
+        ),
     )
 
     client.update_notifier(updated_notifier)
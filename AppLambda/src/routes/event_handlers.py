@@ -2,35 +2,247 @@ import base64
 import hashlib
 import hmac
 import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import RLock
+from typing import Any, Callable, Type
 from uuid import uuid4
 
+from cachetools import TTLCache
 from fastapi import APIRouter, Depends, Request
+from pydantic import ValidationError
+from requests import HTTPError
 
 from ..app import secrets, services, settings
+from ..clients import aws
+from ..handlers._base import CannotHandleListMapError
 from ..handlers.core import SQSSyncMessageHandler
 from ..models.account_linking import NotLinkedError
-from ..models.alexa import AlexaListEvent, AlexaSyncEvent
-from ..models.aws import SQSEvent
-from ..models.core import BaseSyncEvent, RateLimitCategory, User
+from ..models.alexa import AlexaListEvent, AlexaSyncEvent, ObjectType, Operation
+from ..models.aws import SQSBatchItemFailure, SQSBatchResponse, SQSEvent, SQSMessage
+from ..models.core import (
+    BaseSyncEvent,
+    ListSyncMap,
+    RateLimitCategory,
+    Source,
+    SyncEventBatch,
+    User,
+    get_sync_event_queue_name,
+)
 from ..models.mealie import MealieEventNotification, MealieEventType, MealieSyncEvent
 from ..models.todoist import TodoistEventType, TodoistSyncEvent, TodoistWebhook
+from ..services.alexa import AlexaListService
+from ..services.expected_changes import ExpectedChangeLedger
+from ..services.mealie import MealieListService
+from ..services.todoist import TodoistSyncState, TodoistTaskService
 from .auth import get_current_user
 
 router = APIRouter(prefix="/api/handlers", tags=["Handlers"])
 
+SYNC_EVENT_MODELS: dict[str, Type[BaseSyncEvent]] = {
+    Source.alexa.value: AlexaSyncEvent,
+    Source.mealie.value: MealieSyncEvent,
+    Source.todoist.value: TodoistSyncEvent,
+}
 
-@router.post("/sqs/sync-events")
-async def sqs_sync_event_handler(event: SQSEvent) -> None:
-    """Process all sync events from SQS"""
+_completed_syncs: TTLCache[tuple[str, ...], datetime] = TTLCache(
+    maxsize=1000, ttl=settings.sync_event_coalesce_ttl_seconds
+)
+"""map of {coalesce_key: start time of the most recent completed sync} for full list syncs in this container"""
+
+_completed_syncs_lock = RLock()
+
+_debounced_events: TTLCache[str, bool] = TTLCache(maxsize=1000, ttl=60 * 5)
+"""
+event ids of debounced sync events queued by this container, kept for the SQS FIFO deduplication interval
+
+SQS already drops duplicates of these events, so this only saves the rate limit check and the request to SQS
+"""
+
+_debounced_events_lock = RLock()
+
+
+def _parse_sync_event(message: SQSMessage) -> BaseSyncEvent:
+    """Parse a message into its source's sync event model"""
+
+    base_sync_event = message.parse_body(BaseSyncEvent)
+    sync_event_model = SYNC_EVENT_MODELS.get(str(base_sync_event.source))
+    return message.parse_body(sync_event_model) if sync_event_model else base_sync_event
+
+
+def _coalesce_sync_events(messages: list[SQSMessage]) -> list[tuple[SQSMessage, list[SQSMessage]]]:
+    """
+    Merge all messages with the same coalesce key (e.g. same user and list) into a single message
+
+    The merged message takes the position (and timestamp) of the first message, so no sync runs later than it
+    would have otherwise. Returns a list of (message to process, original messages) in order
+    """
+
+    coalesced: list[tuple[SQSMessage, list[SQSMessage]]] = []
+    coalesced_events: dict[tuple[str, ...], tuple[int, BaseSyncEvent]] = {}
+    for message in messages:
+        try:
+            sync_event = _parse_sync_event(message)
+
+        except ValidationError:
+            # invalid messages are handled (and logged) by the group processor
+            coalesced.append((message, [message]))
+            continue
+
+        if sync_event.coalesce_key not in coalesced_events:
+            coalesced_events[sync_event.coalesce_key] = (len(coalesced), sync_event)
+            coalesced.append((message, [message]))
+            continue
+
+        i, coalesced_event = coalesced_events[sync_event.coalesce_key]
+        coalesced_event.coalesce(sync_event)
+
+        coalesced_message, original_messages = coalesced[i]
+        original_messages.append(message)
+        coalesced[i] = (coalesced_message.copy(update={"body": coalesced_event.json()}), original_messages)
+
+    merged_event_count = len(messages) - len(coalesced)
+    if merged_event_count:
+        services.metrics.increment("SyncEventsCoalesced", merged_event_count)
+
+    return coalesced
+
+
+def _is_sync_event_covered(sync_event: BaseSyncEvent) -> bool:
+    """Returns whether a sync that started after this event was created has already completed"""
+
+    if not sync_event.is_full_sync:
+        return False
+
+    with _completed_syncs_lock:
+        last_sync_started = _completed_syncs.get(sync_event.coalesce_key)
+
+    if not last_sync_started:
+        return False
+
+    # debounced events include every change made until they're scheduled to run
+    margin = timedelta(seconds=settings.sync_event_coalesce_margin_seconds)
+    event_time = sync_event.not_before or sync_event.timestamp
+    return event_time.replace(tzinfo=None) + margin <= last_sync_started
+
+
+def _record_completed_sync(sync_event: BaseSyncEvent, sync_started: datetime) -> None:
+    if not sync_event.is_full_sync:
+        return
+
+    with _completed_syncs_lock:
+        last_sync_started = _completed_syncs.get(sync_event.coalesce_key)
+        if not last_sync_started or sync_started > last_sync_started:
+            _completed_syncs[sync_event.coalesce_key] = sync_started
+
+
+def _is_expected_todoist_change(username: str, tasks: list[dict[str, Any]]) -> bool:
+    """Returns whether a webhook's tasks only contain changes this app made"""
+
+    changes: dict[str, str | None] = {}
+    for item in tasks:
+        task = TodoistSyncState.parse_item(item)
+        task.is_completed = bool(item.get("checked") or item.get("is_deleted"))
+        changes[task.id] = TodoistTaskService.build_change_version(task)
+
+    return ExpectedChangeLedger(username, Source.todoist).is_expected(changes)
+
+
+def _is_expected_alexa_change(username: str, event: AlexaListEvent) -> bool:
+    """Returns whether a list event only contains changes this app made"""
+
+    # we never delete Alexa items, so only item creates and updates can be ours
+    operation = Operation(event.operation)
+    if ObjectType(event.object_type) != ObjectType.list_item or operation not in [Operation.create, Operation.update]:
+        return False
+
+    # list events don't include item versions, so each expected change is matched (and forgotten) by its first event
+    changes: dict[str, str | None] = {
+        AlexaListService.build_change_id(operation, item_id): None for item_id in event.list_item_ids or []
+    }
+    return ExpectedChangeLedger(username, Source.alexa).is_expected(changes, consume=True)
+
+
+def _is_retryable_exception(e: Exception) -> bool:
+    """Returns whether a failed sync event may succeed if it's retried"""
+
+    if isinstance(e, (NotLinkedError, CannotHandleListMapError, ValidationError)):
+        return False
+
+    if isinstance(e, HTTPError) and e.response is not None:
+        status_code = e.response.status_code
+        return not (400 <= status_code < 500) or status_code in [408, 429]
+
+    return True
+
+
+def _defer_messages(messages: list[SQSMessage], delay: float) -> None:
+    """
+    Hides messages from the queue until `delay` seconds from now, rather than waiting for them here
+
+    If the messages can't be hidden, they're retried once their visibility timeout expires
+    """
+
+    try:
+        sqs = aws.SQSFIFO(get_sync_event_queue_name())
+        sqs.change_message_visibility_batch(
+            [message.receipt_handle for message in messages], visibility_timeout=math.ceil(delay)
+        )
+
+    except Exception as e:
+        if settings.debug:
+            raise
+
+        logging.error(f"Unable to defer {len(messages)} debounced message(s); they will be retried later")
+        logging.error(f"{type(e).__name__}: {e}")
+
+
+def _process_sync_event_group(messages: list[SQSMessage], deadline: float | None) -> list[SQSMessage]:
+    """
+    Process a group of sync events (i.e. all events for a single list map, or user) in order
+
+    Returns the messages which should be retried. Since message groups are FIFO, once a message
+    fails, it and all messages after it in the group are returned. Debounced events whose window
+    hasn't closed are returned the same way, after hiding them in the queue until it does
+    """
+
+    coalesced_messages = _coalesce_sync_events(messages)
+
+    def get_remaining_messages(i: int) -> list[SQSMessage]:
+        return [message for _, original_messages in coalesced_messages[i:] for message in original_messages]
 
     processed_event_sources: set[str] = set()
-    for message in event.records:
+    for i, (message, _) in enumerate(coalesced_messages):
+        if deadline and time.time() + settings.sync_event_deadline_buffer_seconds >= deadline:
+            remaining_messages = get_remaining_messages(i)
+            logging.error(
+                f"Not enough time remaining in this invocation to process {len(remaining_messages)} message(s), "
+                "retrying"
+            )
+            return remaining_messages
+
         try:
             # make sure we can process this sync event
-            sync_event = message.parse_body(BaseSyncEvent)
+            sync_event = _parse_sync_event(message)
             if str(sync_event.source) in processed_event_sources:
                 continue
 
+            # debounced events are put back in the queue until their debounce window closes,
+            # so they include every change made during it
+            if sync_event.not_before:
+                delay = (sync_event.not_before.replace(tzinfo=None) - datetime.utcnow()).total_seconds()
+                if delay > 0:
+                    remaining_messages = get_remaining_messages(i)
+                    _defer_messages(remaining_messages, delay)
+                    return remaining_messages
+
+            # a sync for this list has already completed since this event was created
+            if _is_sync_event_covered(sync_event):
+                services.metrics.increment("SyncEventsCoalesced")
+                continue
+
             if sync_event.client_id != secrets.app_client_id or sync_event.client_secret != secrets.app_client_secret:
                 logging.error("Received sync event with invalid client id & secret pair, aborting")
                 continue
@@ -44,19 +256,129 @@ async def sqs_sync_event_handler(event: SQSEvent) -> None:
             if not user.is_linked_to_mealie:
                 raise NotLinkedError(user.username, "mealie")
 
+            sync_started = datetime.utcnow()
             message_handler = SQSSyncMessageHandler(user)
             processed_event_source = message_handler.handle_message(message)
             if processed_event_source:
                 processed_event_sources.add(str(processed_event_source))
 
+            _record_completed_sync(sync_event, sync_started)
+
         except Exception as e:
             if settings.debug:
                 raise
 
-            # TODO: handle this in a DLQ and add support for partial-retries
-            logging.error("Unhandled exception when trying to process a message from SQS")
+            if not _is_retryable_exception(e):
+                logging.error(
+                    "Unhandled exception when trying to process a message from SQS; message cannot be retried"
+                )
+                logging.error(f"{type(e).__name__}: {e}")
+                logging.error(message)
+                continue
+
+            logging.error("Unhandled exception when trying to process a message from SQS; message will be retried")
             logging.error(f"{type(e).__name__}: {e}")
             logging.error(message)
+            return get_remaining_messages(i)
+
+    return []
+
+
+def _find_list_sync_map_id(user: User, is_match: Callable[[ListSyncMap], bool]) -> str | None:
+    """Returns the id of the user's only list map which matches, or None if there isn't exactly one match"""
+
+    list_sync_map_ids = [
+        list_sync_map_id for list_sync_map_id, list_sync_map in user.list_sync_maps.items() if is_match(list_sync_map)
+    ]
+
+    return list_sync_map_ids[0] if len(list_sync_map_ids) == 1 else None
+
+
+def _record_queued_sync_events(sync_events: list[BaseSyncEvent]) -> None:
+    with _debounced_events_lock:
+        for sync_event in sync_events:
+            if sync_event.not_before:
+                _debounced_events[sync_event.event_id] = True
+
+
+def _queue_sync_event(
+    sync_event: BaseSyncEvent, user: User, debounce_seconds: int = 0, batch: SyncEventBatch | None = None
+) -> None:
+    """
+    Queue a sync event, once the user's rate limit is verified
+
+    If `debounce_seconds` is set, the event is debounced, and isn't queued (or rate limited) if an event for the same
+    list has already been queued during the current debounce window
+
+    If a batch is provided, the event is added to it instead, and is queued when the batch is flushed
+    using `_flush_sync_events`
+    """
+
+    if debounce_seconds > 0:
+        sync_event.debounce(debounce_seconds)
+        with _debounced_events_lock:
+            if sync_event.event_id in _debounced_events:
+                services.metrics.increment("SyncEventsDebounced")
+                return
+
+    # verify user rate limit; raises 429 error if the rate limit is violated
+    services.rate_limit.verify_rate_limit(user, RateLimitCategory.sync)
+    if batch:
+        batch.add(sync_event, use_dev_route=user.use_developer_routes)
+        return
+
+    sync_event.send_to_queue(use_dev_route=user.use_developer_routes)
+    _record_queued_sync_events([sync_event])
+
+
+def _flush_sync_events(batch: SyncEventBatch) -> None:
+    _record_queued_sync_events(batch.flush())
+
+
+@router.post("/sqs/sync-events")
+async def sqs_sync_event_handler(event: SQSEvent, request: Request) -> SQSBatchResponse:
+    """
+    Process all sync events from SQS
+
+    Events are grouped by their FIFO message group (i.e. per list map, or per user if the list map isn't known).
+    Groups are processed concurrently, while events within a group are processed in order. Failed messages are
+    reported back to SQS to be retried
+    """
+
+    deadline = aws.get_lambda_deadline(request.scope.get("aws.context"))
+    messages_by_group_id: dict[str, list[SQSMessage]] = {}
+    for message in event.records:
+        try:
+            group_id = message.parse_body(BaseSyncEvent).group_id
+
+        except ValidationError:
+            # invalid messages are put in their own group and handled (and logged) by the group processor
+            group_id = message.message_id
+
+        messages_by_group_id.setdefault(group_id, []).append(message)
+
+    failed_messages: list[SQSMessage] = []
+    message_groups = list(messages_by_group_id.values())
+    try:
+        if len(message_groups) == 1:
+            failed_messages.extend(_process_sync_event_group(message_groups[0], deadline))
+
+        else:
+            max_workers = max(1, min(settings.sync_event_max_concurrent_groups, len(message_groups)))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(_process_sync_event_group, messages, deadline) for messages in message_groups
+                ]
+                for future in futures:
+                    failed_messages.extend(future.result())
+
+    finally:
+        services.metrics.increment("SyncEventsReceived", len(event.records))
+        services.metrics.flush()
+
+    return SQSBatchResponse(
+        batch_item_failures=[SQSBatchItemFailure(item_identifier=message.message_id) for message in failed_messages]
+    )
 
 
 @router.post("/mealie")
@@ -70,7 +392,7 @@ async def mealie_event_notification_handler(
         return
 
     shopping_list_id = notification.get_shopping_list_id_from_document_data()
-    if not shopping_list_id:
+    if not (shopping_list_id or notification.event_type.is_catalog_event):
         return
 
     _user_in_db = services.user.get_user(username)
@@ -85,22 +407,32 @@ async def mealie_event_notification_handler(
     if security_hash != user.configuration.mealie.security_hash:
         return
 
+    # catalog changes don't require a sync, but any catalogs we've cached are now stale
+    if notification.event_type.is_catalog_event:
+        MealieListService.invalidate_catalog_cache(
+            user.configuration.mealie.base_url, user.configuration.mealie.auth_token
+        )
+        return
+
+    if not shopping_list_id:
+        return
+
     # check if the user configured this shopping list
     if shopping_list_id not in user.list_sync_maps:
         return
 
-    # verify user rate limit; raises 429 error if the rate limit is violated
-    services.rate_limit.verify_rate_limit(user, RateLimitCategory.sync)
-
     # initiate a sync event
     sync_event = MealieSyncEvent(
         event_id=notification.event_id,
         username=user.username,
         shopping_list_id=shopping_list_id,
+        list_sync_map_id=shopping_list_id,
+        item_ids=notification.get_shopping_list_item_ids_from_document_data(),
+        operation=notification.get_operation_from_document_data(),
         # timestamp=notification.timestamp, default to now instead; TODO: figure out why this is unreliable
     )
 
-    sync_event.send_to_queue(use_dev_route=user.use_developer_routes)
+    _queue_sync_event(sync_event, user, debounce_seconds=settings.mealie_sync_debounce_seconds)
 
 
 @router.post("/todoist")
@@ -160,26 +492,57 @@ async def todoist_event_notification_handler(request: Request, webhook: TodoistW
     if not users:
         return
 
+    # item events carry the changed item, so only that item needs to be synced
+    tasks: list[dict[str, Any]] = []
+    if webhook.event_data.get("id") and webhook.event_data.get("content") is not None:
+        task = dict(webhook.event_data)
+        if webhook.event_name == TodoistEventType.item_deleted:
+            task["is_deleted"] = True
+        elif webhook.event_name == TodoistEventType.item_completed:
+            task["checked"] = True
+
+        tasks.append(task)
+
     # initiate a sync event for each linked user (there should only be one)
     event_id_base = request.headers.get("X-Todoist-Delivery-ID") or str(uuid4())
+    batch = SyncEventBatch()
     for user in users:
-        # verify user rate limit; raises 429 error if the rate limit is violated
-        services.rate_limit.verify_rate_limit(user, RateLimitCategory.sync)
+        # changes we made don't need to be synced back
+        if tasks and _is_expected_todoist_change(user.username, tasks):
+            continue
 
         sync_event = TodoistSyncEvent(
             event_id="|".join([user.username, event_id_base]),
             username=user.username,
             project_id=project_id,
+            list_sync_map_id=_find_list_sync_map_id(
+                user, lambda list_sync_map: list_sync_map.todoist_project_id == project_id
+            ),
+            tasks=tasks,
         )
 
-        sync_event.send_to_queue(use_dev_route=user.use_developer_routes)
+        _queue_sync_event(sync_event, user, debounce_seconds=settings.todoist_sync_debounce_seconds, batch=batch)
+
+    _flush_sync_events(batch)
 
 
 @router.post("/alexa")
 @services.rate_limit.limit(RateLimitCategory.sync)
 async def alexa_event_notification_handler(event: AlexaListEvent, user: User = Depends(get_current_user)) -> None:
+    # changes we made don't need to be synced back, and are already applied to the list shadow
+    if _is_expected_alexa_change(user.username, event):
+        return
+
+    AlexaListService.record_list_event(event.list_id)
+
     sync_event = AlexaSyncEvent(
-        event_id=event.request_id, username=user.username, list_event=event, timestamp=event.timestamp
+        event_id=event.request_id,
+        username=user.username,
+        list_sync_map_id=_find_list_sync_map_id(
+            user, lambda list_sync_map: list_sync_map.alexa_list_id == event.list_id
+        ),
+        list_event=event,
+        timestamp=event.timestamp,
     )
 
     sync_event.send_to_queue(use_dev_route=user.use_developer_routes)
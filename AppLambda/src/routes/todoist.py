@@ -2,13 +2,13 @@ from json import JSONDecodeError
 from typing import cast
 from uuid import uuid4
 
-import requests
 from fastapi import APIRouter, Depends, Request, Response
 from fastapi.responses import HTMLResponse, RedirectResponse
 from pydantic import ValidationError
 from requests import HTTPError, PreparedRequest
 
 from ..app import secrets, settings, templates
+from ..clients import http
 from ..models.account_linking import UserTodoistConfigurationCreate, UserTodoistConfigurationUpdate
 from ..models.core import User
 from ..models.todoist import TodoistAuthRequest, TodoistRedirect, TodoistTokenExchangeRequest, TodoistTokenResponse
@@ -159,7 +159,9 @@ async def authorize_todoist(request: Request, auth: TodoistRedirect = Depends())
             client_id=secrets.todoist_client_id, client_secret=secrets.todoist_client_secret, code=auth.code
         )
 
-        r = requests.post(settings.todoist_token_exchange_url, params=params.dict())
+        r = http.sessions.get_session(settings.todoist_token_exchange_url).post(
+            settings.todoist_token_exchange_url, params=params.dict()
+        )
         r.raise_for_status()
         token_response = TodoistTokenResponse.parse_obj(r.json())
 
@@ -1,4 +1,5 @@
 import logging
+import time
 from copy import deepcopy
 from functools import cache
 from typing import Any, cast
@@ -6,6 +7,7 @@ from typing import Any, cast
 from pydantic import ValidationError
 
 from ..app import settings
+from ..clients import aws
 from ..clients.alexa import NO_RESPONSE_DATA_EXCEPTION, NO_RESPONSE_EXCEPTION, ListManagerClient
 from ..models.account_linking import NotLinkedError, UserAlexaConfiguration
 from ..models.alexa import (
@@ -17,6 +19,7 @@ from ..models.alexa import (
     AlexaListItemUpdate,
     AlexaListItemUpdateBulkIn,
     AlexaListOut,
+    AlexaListShadow,
     AlexaReadList,
     ListState,
     MessageIn,
@@ -24,9 +27,12 @@ from ..models.alexa import (
     ObjectType,
     Operation,
 )
-from ..models.core import User
+from ..models.core import Source, User
+from .expected_changes import ExpectedChangeLedger
+from .metrics import metrics
 
 client = ListManagerClient()
+shadow_db = aws.DynamoDB(settings.alexa_list_shadow_tablename, settings.alexa_list_shadow_pk)
 
 
 class AlexaListService:
@@ -40,6 +46,9 @@ class AlexaListService:
         self._list_cache: dict[str, AlexaListOut] = {}
         """map of {list_id: list}"""
 
+        self._expected_changes = ExpectedChangeLedger(user.username, Source.alexa)
+        """changes written to Alexa, whose list events can be ignored"""
+
     def _clear_cache(self) -> None:
         self._list_cache.clear()
         self.get_all_lists.cache_clear()
@@ -74,11 +83,67 @@ class AlexaListService:
         except ValidationError:
             raise Exception("Response from Alexa is not a valid list collection")
 
+    @classmethod
+    def record_list_event(cls, list_id: str) -> None:
+        """Marks the shadow copy of a list as stale after Alexa notifies us of a change to it"""
+
+        if not settings.alexa_list_shadow_enabled:
+            return
+
+        try:
+            shadow_db.update(list_id, set_attributes={}, add_attributes={"event_version": 1})
+
+        except Exception as e:
+            if settings.debug:
+                raise
+
+            logging.error(f"Unable to record list event for Alexa list shadow {list_id}")
+            logging.error(f"{type(e).__name__}: {e}")
+
+    def _get_list_shadow(self, list_id: str) -> AlexaListShadow | None:
+        try:
+            data = shadow_db.get(list_id, consistent_read=True)
+            return AlexaListShadow.parse_obj(data) if data else None
+
+        except Exception as e:
+            if settings.debug:
+                raise
+
+            logging.error(f"Unable to read Alexa list shadow {list_id}")
+            logging.error(f"{type(e).__name__}: {e}")
+            return None
+
+    def _save_list_shadow(self, alexa_list: AlexaListOut, snapshot_version: int | None = None) -> None:
+        """
+        Writes a list to its shadow copy
+
+        The snapshot version should only be provided when the list was fetched directly from Alexa, otherwise
+        the shadow's freshness is left unchanged
+        """
+
+        if not settings.alexa_list_shadow_enabled:
+            return
+
+        set_attributes: dict[str, Any] = {"user_id": self.user_id, "list_data": alexa_list.json()}
+        if snapshot_version is not None:
+            set_attributes["snapshot_version"] = snapshot_version
+            set_attributes["snapshot_at"] = time.time()
+
+        try:
+            shadow_db.update(alexa_list.list_id, set_attributes, add_attributes={"shadow_version": 1})
+
+        except Exception as e:
+            if settings.debug:
+                raise
+
+            logging.error(f"Unable to write Alexa list shadow {alexa_list.list_id}")
+            logging.error(f"{type(e).__name__}: {e}")
+
     def _get_list(
         self, list_id: str, state: ListState = ListState.active, source: str = settings.alexa_internal_source_id
     ) -> AlexaListOut:
         """
-        Fetch a single list from Alexa or from local cache
+        Fetch a single list from Alexa, from its shadow copy, or from local cache
 
         Mutations to the list or to any items in the list will
         modify the local cache
@@ -89,6 +154,24 @@ class AlexaListService:
         if list_id in self._list_cache:
             return self._list_cache[list_id]
 
+        # only active lists are shadowed
+        use_shadow = settings.alexa_list_shadow_enabled and ListState(state) == ListState.active
+        shadow: AlexaListShadow | None = None
+        if use_shadow:
+            shadow = self._get_list_shadow(list_id)
+            if (
+                shadow
+                and shadow.user_id == self.user_id
+                and shadow.is_fresh(settings.alexa_list_shadow_max_age_seconds)
+            ):
+                shadow_list = shadow.get_list()
+                if shadow_list and shadow_list.state == ListState.active.value:
+                    metrics.increment("AlexaListShadowHits")
+                    self._list_cache[list_id] = shadow_list
+                    return shadow_list
+
+            metrics.increment("AlexaListShadowMisses")
+
         request = MessageRequest(
             operation=Operation.read,
             object_type=ObjectType.list,
@@ -105,6 +188,10 @@ class AlexaListService:
             alexa_list = AlexaListOut.parse_obj(response[0])
 
             self._list_cache[alexa_list.list_id] = alexa_list
+            if use_shadow:
+                # any events received while we were fetching the list are newer than the snapshot
+                self._save_list_shadow(alexa_list, snapshot_version=shadow.event_version if shadow else 0)
+
             return alexa_list
 
         except IndexError:
@@ -122,28 +209,69 @@ class AlexaListService:
         """Fetch a single list from Alexa or from local cache that can be safely mutated"""
         return deepcopy(self._get_list(list_id, state, source))
 
-    def get_list_item(
+    def get_list_items_view(
+        self, list_id: str, state: ListState = ListState.active, source: str = settings.alexa_internal_source_id
+    ) -> tuple[AlexaListItemOut, ...]:
+        """
+        Fetch a read-only snapshot of a list's items from Alexa or from local cache
+
+        Items in the snapshot are shared with the local cache and must not be mutated;
+        use `checkout_list_item` to get a copy of an item that can be safely mutated
+        """
+
+        return tuple(self._get_list(list_id, state, source).items or [])
+
+    def get_list_item_view(
         self, list_id: str, item_id: str, source: str = settings.alexa_internal_source_id
     ) -> AlexaListItemOut | None:
-        """Fetch a single list item from Alexa that can be safely mutated"""
+        """Fetch a single read-only list item from Alexa; use `checkout_list_item` before mutating it"""
 
         alexa_list = self._get_list(list_id, source=source)
         for list_item in alexa_list.items or []:
             if list_item.id == item_id:
-                return deepcopy(list_item)
+                return list_item
 
         return None
 
-    def create_list_items(
-        self, list_id: str, items: list[AlexaListItemCreateIn], source: str = settings.alexa_internal_source_id
-    ) -> AlexaListItemCollectionOut:
-        """Create one or more items in Alexa. Items order is preserved"""
+    def get_list_item(
+        self, list_id: str, item_id: str, source: str = settings.alexa_internal_source_id
+    ) -> AlexaListItemOut | None:
+        """Fetch a single list item from Alexa that can be safely mutated"""
 
-        if not items:
-            return AlexaListItemCollectionOut(list_id=list_id, list_items=[])
+        list_item = self.get_list_item_view(list_id, item_id, source)
+        return self.checkout_list_item(list_item) if list_item else None
 
-        alexa_list = self._get_list(list_id, source=source)
-        requests = [
+    @staticmethod
+    def build_change_id(operation: Operation, item_id: str) -> str:
+        """
+        Builds the id of an expected change to an item
+
+        Changes are keyed by operation so an expected create can never match a later update to the same item
+        """
+
+        return ":".join([operation.value, item_id])
+
+    def _expect_changes(self, operation: Operation, items: list[AlexaListItemOut]) -> None:
+        """Records the items we're changing, so the list events they trigger can be ignored"""
+
+        for item in items:
+            self._expected_changes.expect(self.build_change_id(operation, item.id))
+
+        self._expected_changes.flush()
+
+    def _forget_changes(self, operation: Operation, items: list[AlexaListItemOut]) -> None:
+        """Clears the changes recorded for a write which failed, so they can't hide changes made by the user"""
+
+        self._expected_changes.forget([self.build_change_id(operation, item.id) for item in items])
+
+    @staticmethod
+    def checkout_list_item(item: AlexaListItemOut) -> AlexaListItemOut:
+        """Copies a read-only list item so it can be safely mutated without modifying the local cache"""
+
+        return deepcopy(item)
+
+    def _build_create_requests(self, list_id: str, items: list[AlexaListItemCreateIn]) -> list[MessageRequest]:
+        return [
             MessageRequest(
                 operation=Operation.create,
                 object_type=ObjectType.list_item,
@@ -153,8 +281,9 @@ class AlexaListService:
             for i, item in enumerate(items)
         ]
 
-        message = MessageIn(source=source, requests=requests, send_callback_response=True)
-        response = client.call_api(self.user_id, message)
+    def _apply_create_response(
+        self, alexa_list: AlexaListOut, response: list[dict[str, Any]] | None
+    ) -> AlexaListItemCollectionOut:
         if not response:
             raise Exception(NO_RESPONSE_EXCEPTION)
 
@@ -178,24 +307,24 @@ class AlexaListService:
         else:
             alexa_list.items.extend(new_items)
 
-        return AlexaListItemCollectionOut(list_id=list_id, list_items=deepcopy(new_items))
-
-    def update_list_items(
-        self, list_id: str, items: list[AlexaListItemUpdateBulkIn], source: str = settings.alexa_internal_source_id
-    ) -> AlexaListItemCollectionOut:
-        """Update one or more items in Alexa"""
+        return AlexaListItemCollectionOut(list_id=alexa_list.list_id, list_items=deepcopy(new_items))
 
-        alexa_list = self._get_list(list_id, source=source)
+    def _build_update_requests(
+        self, alexa_list: AlexaListOut, items: list[AlexaListItemUpdateBulkIn]
+    ) -> tuple[list[MessageRequest], list[AlexaListItemOut]]:
+        """Merges the updates into the cached list and returns the requests to send, and the updated items"""
 
         requests: list[MessageRequest] = []
         updated_items: list[AlexaListItemOut] = []
         for item in items:
-            for current_item in alexa_list.items or []:
+            for i, current_item in enumerate(alexa_list.items or []):
                 if item.id != current_item.id:
                     continue
 
-                # update the item in place
+                # replace the cached item with an updated copy so existing views aren't modified
+                current_item = self.checkout_list_item(current_item)
                 current_item.merge(item)
+                cast(list[AlexaListItemOut], alexa_list.items)[i] = current_item
                 updated_items.append(current_item)
 
                 requests.append(
@@ -203,22 +332,120 @@ class AlexaListService:
                         operation=Operation.update,
                         object_type=ObjectType.list_item,
                         object_data=current_item.cast(
-                            AlexaListItemUpdate, list_id=list_id, item_id=current_item.id
+                            AlexaListItemUpdate, list_id=alexa_list.list_id, item_id=current_item.id
                         ).dict(),
                     )
                 )
 
                 break
 
-        if not requests:
-            return AlexaListItemCollectionOut(list_id=list_id, list_items=[])
-
-        message = MessageIn(source=source, requests=requests, send_callback_response=True)
-        client.call_api(self.user_id, message)
+        return requests, updated_items
 
+    @classmethod
+    def _apply_update_response(cls, list_id: str, updated_items: list[AlexaListItemOut]) -> AlexaListItemCollectionOut:
         # we need to increment the cached version number before returning the updated items
         # the Alexa API does this for us server-side
         for updated_item in updated_items:
             updated_item.version += 1
 
         return AlexaListItemCollectionOut(list_id=list_id, list_items=deepcopy(updated_items))
+
+    def create_list_items(
+        self, list_id: str, items: list[AlexaListItemCreateIn], source: str = settings.alexa_internal_source_id
+    ) -> AlexaListItemCollectionOut:
+        """Create one or more items in Alexa. Items order is preserved"""
+
+        if not items:
+            return AlexaListItemCollectionOut(list_id=list_id, list_items=[])
+
+        alexa_list = self._get_list(list_id, source=source)
+        requests = self._build_create_requests(list_id, items)
+
+        message = MessageIn(source=source, requests=requests, send_callback_response=True)
+        response = client.call_api(self.user_id, message)
+        created_items = self._apply_create_response(alexa_list, response)
+
+        # new item ids aren't known until Alexa responds, so record them as soon as it does
+        self._expect_changes(Operation.create, created_items.list_items)
+        self._save_list_shadow(alexa_list)
+        return created_items
+
+    def update_list_items(
+        self, list_id: str, items: list[AlexaListItemUpdateBulkIn], source: str = settings.alexa_internal_source_id
+    ) -> AlexaListItemCollectionOut:
+        """Update one or more items in Alexa"""
+
+        alexa_list = self._get_list(list_id, source=source)
+        requests, updated_items = self._build_update_requests(alexa_list, items)
+        if not requests:
+            return AlexaListItemCollectionOut(list_id=list_id, list_items=[])
+
+        # record the changes before sending them, since their list events may arrive before Alexa responds
+        self._expect_changes(Operation.update, updated_items)
+        message = MessageIn(source=source, requests=requests, send_callback_response=True)
+        try:
+            client.call_api(self.user_id, message)
+
+        except Exception:
+            self._forget_changes(Operation.update, updated_items)
+            raise
+
+        updated_collection = self._apply_update_response(list_id, updated_items)
+        self._save_list_shadow(alexa_list)
+        return updated_collection
+
+    def update_and_create_list_items(
+        self,
+        list_id: str,
+        items_to_update: list[AlexaListItemUpdateBulkIn],
+        items_to_create: list[AlexaListItemCreateIn],
+        source: str = settings.alexa_internal_source_id,
+    ) -> tuple[AlexaListItemCollectionOut, AlexaListItemCollectionOut]:
+        """
+        Update and create items in Alexa, returning the (updated items, created items)
+
+        Both messages are sent before waiting for either response, so their round-trips overlap
+        """
+
+        alexa_list = self._get_list(list_id, source=source)
+        update_requests, updated_items = self._build_update_requests(alexa_list, items_to_update)
+        create_requests = self._build_create_requests(list_id, items_to_create)
+
+        # record the updates before sending them, since their list events may arrive before Alexa responds
+        self._expect_changes(Operation.update, updated_items)
+        try:
+            update_event_id: str | None = None
+            if update_requests:
+                message = MessageIn(source=source, requests=update_requests, send_callback_response=True)
+                update_event_id = client.send_api_message(self.user_id, message)
+
+            create_event_id: str | None = None
+            if create_requests:
+                message = MessageIn(source=source, requests=create_requests, send_callback_response=True)
+                create_event_id = client.send_api_message(self.user_id, message)
+
+            responses = client.wait_for_responses(
+                [event_id for event_id in [update_event_id, create_event_id] if event_id]
+            )
+
+        except Exception:
+            self._forget_changes(Operation.update, updated_items)
+            raise
+
+        updated_collection = (
+            self._apply_update_response(list_id, updated_items)
+            if update_event_id
+            else AlexaListItemCollectionOut(list_id=list_id, list_items=[])
+        )
+
+        created_collection = (
+            self._apply_create_response(alexa_list, responses[create_event_id])
+            if create_event_id
+            else AlexaListItemCollectionOut(list_id=list_id, list_items=[])
+        )
+
+        if update_event_id or create_event_id:
+            self._expect_changes(Operation.create, created_collection.list_items)
+            self._save_list_shadow(alexa_list)
+
+        return updated_collection, created_collection
@@ -0,0 +1,141 @@
+import logging
+import time
+from typing import Callable, Iterable
+
+from ..app import settings
+from ..clients import aws
+from ..models.core import Source
+from .metrics import metrics
+
+changes_db = aws.DynamoDB(settings.expected_changes_tablename, settings.expected_changes_pk)
+
+
+class ExpectedChangeLedger:
+    """
+    Remembers the changes this app writes to another system for a short time, so the notifications
+    those changes trigger (which would only start a sync with nothing to do) can be ignored
+
+    Changes are keyed by item id and may include a version, which incoming changes must match.
+    Writes are queued until `flush` is called
+    """
+
+    def __init__(self, username: str, system: Source) -> None:
+        self.username = username
+        self.system = system
+
+        self._pending_changes: dict[str, str | None] = {}
+        """map of {item_id: version}"""
+
+    def _build_change_key(self, item_id: str) -> str:
+        return "|".join([self.username, self.system.value, item_id])
+
+    def expect(self, item_id: str, version: str | None = None) -> None:
+        """Queues a change this app made, replacing any change previously expected for the same item"""
+
+        if not settings.expected_changes_enabled:
+            return
+
+        self._pending_changes[item_id] = version
+
+    def clear(self) -> None:
+        """Forgets all queued changes without writing them, e.g. if it's unknown whether they were made"""
+
+        self._pending_changes.clear()
+
+    def flush(self, resolve_id: Callable[[str], str] | None = None, exclude_ids: Iterable[str] = ()) -> None:
+        """
+        Writes all queued changes in batches
+
+        `resolve_id` maps any temporary item ids to the ids assigned by the other system. Changes to any items
+        in `exclude_ids` (such as changes the other system rejected) are forgotten rather than written
+        """
+
+        excluded_ids = set(exclude_ids)
+        changes: dict[str, str | None] = {}
+        for item_id, version in self._pending_changes.items():
+            item_id = resolve_id(item_id) if resolve_id else item_id
+            if item_id not in excluded_ids:
+                changes[item_id] = version
+
+        self._pending_changes.clear()
+        if not changes:
+            return
+
+        expires = round(time.time()) + settings.expected_changes_ttl_seconds
+        try:
+            changes_db.batch_write(
+                put_items=[
+                    {
+                        settings.expected_changes_pk: self._build_change_key(item_id),
+                        "version": version,
+                        "expires": expires,
+                    }
+                    for item_id, version in changes.items()
+                ]
+            )
+
+        except Exception as e:
+            if settings.debug:
+                raise
+
+            logging.error(f"Unable to write expected {self.system.value} changes for user {self.username}")
+            logging.error(f"{type(e).__name__}: {e}")
+
+    def forget(self, item_ids: list[str]) -> None:
+        """Removes previously written changes, e.g. if the write they describe failed"""
+
+        if not (settings.expected_changes_enabled and item_ids):
+            return
+
+        try:
+            changes_db.batch_write(delete_primary_key_values=[self._build_change_key(item_id) for item_id in item_ids])
+
+        except Exception as e:
+            if settings.debug:
+                raise
+
+            logging.error(f"Unable to clear expected {self.system.value} changes for user {self.username}")
+            logging.error(f"{type(e).__name__}: {e}")
+
+    def is_expected(self, changes: dict[str, str | None], consume: bool = False) -> bool:
+        """
+        Whether every change is one this app made; each change is a map of {item_id: version}
+
+        Changes without a version match any expected version of their item. If `consume` is True,
+        matched changes are forgotten, for systems which send exactly one notification per change
+        """
+
+        if not (settings.expected_changes_enabled and changes):
+            return False
+
+        change_keys = {self._build_change_key(item_id): version for item_id, version in changes.items()}
+        try:
+            expected_changes = {
+                data[settings.expected_changes_pk]: data
+                for data in changes_db.batch_get(list(change_keys), consistent_read=True)
+            }
+
+        except Exception as e:
+            if settings.debug:
+                raise
+
+            logging.error(f"Unable to read expected {self.system.value} changes for user {self.username}")
+            logging.error(f"{type(e).__name__}: {e}")
+            return False
+
+        now = time.time()
+        for change_key, version in change_keys.items():
+            expected_change = expected_changes.get(change_key)
+            if (
+                not expected_change
+                or expected_change.get("expires", 0) < now
+                or (version is not None and expected_change.get("version") != version)
+            ):
+                metrics.increment("ExpectedChangeMisses")
+                return False
+
+        metrics.increment("ExpectedChangeHits")
+        if consume:
+            self.forget(list(changes))
+
+        return True
@@ -1,4 +1,5 @@
 from .auth_token import AuthTokenService
+from .metrics import MetricsService, metrics
 from .rate_limit import RateLimitService
 from .smtp import SMTPService
 from .user import UserService
@@ -11,6 +12,11 @@ class ServiceFactory:
         self._token: AuthTokenService | None = None
         self._user: UserService | None = None
 
+    @property
+    def metrics(self) -> MetricsService:
+        # metrics are shared with clients, so they aren't reset with the other services
+        return metrics
+
     @property
     def rate_limit(self):
         if not self._rate_limit:
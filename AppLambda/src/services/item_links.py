@@ -0,0 +1,153 @@
+import logging
+from typing import Iterable
+
+from ..app import settings
+from ..clients import aws
+from ..models.core import ItemLink, Source
+
+links_db = aws.DynamoDB(settings.item_links_tablename, settings.item_links_pk)
+
+
+class ItemLinkStore:
+    """
+    Stores the links between a user's Mealie list items and their counterparts in one other system
+
+    Each link is stored under two keys, one per side of the link, so it can be found by either id with a single read.
+    Reads are batched and cached, and writes are queued until `flush` is called
+    """
+
+    def __init__(self, username: str, mealie_list_id: str, system: Source) -> None:
+        self.username = username
+        self.mealie_list_id = mealie_list_id
+        self.system = system
+
+        self._links: dict[str, ItemLink | None] = {}
+        """map of {link_key: link}; None if the link doesn't exist"""
+
+        self._links_to_put: dict[str, ItemLink] = {}
+        self._link_keys_to_delete: set[str] = set()
+
+    def _build_link_key(self, side: str, item_id: str) -> str:
+        return "|".join([self.username, self.mealie_list_id, self.system.value, side, item_id])
+
+    def _build_mealie_link_key(self, mealie_item_id: str) -> str:
+        return self._build_link_key(Source.mealie.value, mealie_item_id)
+
+    def _build_linked_link_key(self, linked_id: str) -> str:
+        return self._build_link_key(self.system.value, linked_id)
+
+    def load(self, mealie_item_ids: Iterable[str] = (), linked_ids: Iterable[str] = ()) -> None:
+        """Fetches the links of many items at once, so looking them up doesn't require a read per item"""
+
+        link_keys = [self._build_mealie_link_key(item_id) for item_id in mealie_item_ids]
+        link_keys.extend(self._build_linked_link_key(linked_id) for linked_id in linked_ids)
+        link_keys = [link_key for link_key in dict.fromkeys(link_keys) if link_key not in self._links]
+        if not link_keys:
+            return
+
+        # if the read fails, the links are treated as missing rather than retried for every lookup
+        self._links.update(dict.fromkeys(link_keys))
+        try:
+            links_data = links_db.batch_get(link_keys)
+
+        except Exception as e:
+            if settings.debug:
+                raise
+
+            logging.error(f"Unable to read item links for Mealie list {self.mealie_list_id}")
+            logging.error(f"{type(e).__name__}: {e}")
+            return
+
+        for link_data in links_data:
+            link = ItemLink.parse_obj(link_data)
+            self._links[link.link_key] = link
+
+    def get_by_mealie_item_id(self, mealie_item_id: str) -> ItemLink | None:
+        self.load(mealie_item_ids=[mealie_item_id])
+        return self._links.get(self._build_mealie_link_key(mealie_item_id))
+
+    def get_by_linked_id(self, linked_id: str) -> ItemLink | None:
+        self.load(linked_ids=[linked_id])
+        return self._links.get(self._build_linked_link_key(linked_id))
+
+    def link(self, mealie_item_id: str, linked_id: str, linked_version: str | None = None) -> None:
+        """Links a Mealie item to an item in the other system, replacing any existing links of either item"""
+
+        self.load(mealie_item_ids=[mealie_item_id], linked_ids=[linked_id])
+        mealie_link = self.get_by_mealie_item_id(mealie_item_id)
+        linked_link = self.get_by_linked_id(linked_id)
+        if (
+            mealie_link
+            and linked_link
+            and mealie_link.linked_id == linked_id
+            and linked_link.mealie_item_id == mealie_item_id
+            and mealie_link.linked_version == linked_version
+        ):
+            return
+
+        self.unlink(mealie_item_id=mealie_item_id, linked_id=linked_id)
+        for link_key in [self._build_mealie_link_key(mealie_item_id), self._build_linked_link_key(linked_id)]:
+            link = ItemLink(
+                link_key=link_key,
+                username=self.username,
+                mealie_list_id=self.mealie_list_id,
+                system=self.system.value,
+                mealie_item_id=mealie_item_id,
+                linked_id=linked_id,
+                linked_version=linked_version,
+            )
+
+            self._links[link_key] = link
+            self._links_to_put[link_key] = link
+            self._link_keys_to_delete.discard(link_key)
+
+    def unlink(self, mealie_item_id: str | None = None, linked_id: str | None = None) -> None:
+        """Removes the links of a Mealie item and/or an item in the other system, including both sides of each link"""
+
+        self.load(
+            mealie_item_ids=[mealie_item_id] if mealie_item_id else [], linked_ids=[linked_id] if linked_id else []
+        )
+        links = [
+            self.get_by_mealie_item_id(mealie_item_id) if mealie_item_id else None,
+            self.get_by_linked_id(linked_id) if linked_id else None,
+        ]
+
+        for link in links:
+            if not link:
+                continue
+
+            for link_key in [
+                self._build_mealie_link_key(link.mealie_item_id),
+                self._build_linked_link_key(link.linked_id),
+            ]:
+                self._links[link_key] = None
+                self._links_to_put.pop(link_key, None)
+                self._link_keys_to_delete.add(link_key)
+
+    def flush(self) -> bool:
+        """
+        Writes all queued link changes in batches, and returns whether they were written
+
+        Changes which can't be written stay queued
+        """
+
+        if not (self._links_to_put or self._link_keys_to_delete):
+            return True
+
+        try:
+            links_db.batch_write(
+                put_items=[link.dict() for link in self._links_to_put.values()],
+                delete_primary_key_values=list(self._link_keys_to_delete),
+            )
+
+        except Exception as e:
+            if settings.debug:
+                raise
+
+            logging.error(f"Unable to write item links for Mealie list {self.mealie_list_id}")
+            logging.error(f"{type(e).__name__}: {e}")
+            return False
+
+        self._links_to_put.clear()
+        self._link_keys_to_delete.clear()
+        return True
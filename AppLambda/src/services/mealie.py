@@ -1,10 +1,13 @@
-from collections import defaultdict
+from collections import Counter, defaultdict
 from copy import deepcopy
 from functools import cache, cached_property
-from typing import Iterable, TypeVar, cast
+from threading import RLock
+from typing import Any, Callable, Iterable, TypeVar, cast
 
-from fuzzywuzzy import process
+from cachetools import TTLCache
+from fuzzywuzzy import process, utils
 
+from ..app import settings
 from ..clients.mealie import MealieClient
 from ..models.account_linking import NotLinkedError, UserMealieConfiguration
 from ..models.core import User
@@ -17,15 +20,128 @@ from ..models.mealie import (
     MealieShoppingListItemOut,
     MealieShoppingListItemsCollectionOut,
     MealieShoppingListItemUpdateBulk,
+    MealieShoppingListItemView,
     MealieShoppingListOut,
 )
 
 SHOPPING_LIST_ITEM = TypeVar("SHOPPING_LIST_ITEM", bound=MealieShoppingListItemCreate)
+T = TypeVar("T")
+
+_catalog_cache: TTLCache[tuple[str, str], dict[str, Any]] = TTLCache(
+    maxsize=settings.mealie_catalog_cache_max_size, ttl=settings.mealie_catalog_cache_ttl_seconds
+)
+"""
+Mealie catalogs shared across service instances (and Lambda invocations) in a warm container
+
+map of {(base_url, auth_token): {catalog_name: catalog}}
+"""
+
+_catalog_cache_lock = RLock()
+
+
+class FoodMatcher:
+    """
+    Fuzzy matches text to foods using a trigram index built once per food catalog
+
+    Rather than scoring every food in the catalog, candidates are shortlisted by the share of trigrams they have
+    in common with the input, then scored the same way `process.extractOne` does. If the best candidate is close
+    to the confidence threshold, the whole catalog is scored instead
+    """
+
+    def __init__(self, food_store: dict[str, Food], shortlist_size: int, full_scan_margin: int = 0) -> None:
+        self.food_store = food_store
+        self.shortlist_size = shortlist_size
+        self.full_scan_margin = full_scan_margin
+
+        self._keys = list(food_store.keys())
+        self._trigram_counts: list[int] = []
+        self._index: defaultdict[str, list[int]] = defaultdict(list)
+        """map of {trigram: [index of each food store key containing the trigram]}"""
+
+        for i, key in enumerate(self._keys):
+            trigrams = self._get_trigrams(key)
+            self._trigram_counts.append(len(trigrams))
+            for trigram in trigrams:
+                self._index[trigram].append(i)
+
+    @classmethod
+    def _get_trigrams(cls, value: str) -> set[str]:
+        processed_value = utils.full_process(value)
+        if not processed_value:
+            return set()
+
+        padded_value = f"  {processed_value} "
+        return {padded_value[i : i + 3] for i in range(len(padded_value) - 2)}
+
+    def _get_candidates(self, value: str) -> list[str]:
+        """
+        Shortlist the food store keys most likely to match, preserving their catalog order
+
+        Keys are ranked both by how similar they are to the whole input (Jaccard similarity) and by how much of
+        the key is found in the input, since a short key contained in a longer input (e.g. "milk" in "2 cups milk")
+        scores highly. Ties are broken by catalog order, so the shortlist doesn't depend on set ordering
+        """
+
+        if len(self._keys) <= self.shortlist_size:
+            return self._keys
+
+        trigrams = self._get_trigrams(value)
+        overlap = Counter[int]()
+        for trigram in trigrams:
+            overlap.update(self._index.get(trigram, []))
+
+        by_similarity = sorted(
+            overlap, key=lambda i: (-overlap[i] / (self._trigram_counts[i] + len(trigrams) - overlap[i]), i)
+        )
+        by_containment = sorted(overlap, key=lambda i: (-overlap[i] / self._trigram_counts[i], i))
+
+        shortlist = set(by_similarity[: self.shortlist_size]) | set(by_containment[: self.shortlist_size])
+        return [self._keys[i] for i in sorted(shortlist)]
+
+    def match(self, value: str, confidence_threshold: float) -> Food | None:
+        """Finds the closest food within the confidence threshold (0 - 1)"""
+
+        if not self.food_store:
+            return None
+
+        user_food = value.lower()  # food store keys are all lowercase
+        if user_food in self.food_store:
+            return self.food_store[user_food]
+
+        # if we're only checking for exact matches, stop here
+        if confidence_threshold >= 1:
+            return None
+
+        candidates = self._get_candidates(user_food)
+        if not candidates:
+            # nothing shares a trigram with the input, so nothing can meet a real threshold
+            if confidence_threshold > 0:
+                return None
+
+            candidates = self._keys
+
+        nearest_match: str
+        threshold: int  # score from 0 - 100
+        nearest_match, threshold = process.extractOne(user_food, candidates)
+
+        # a food outside the shortlist may score higher, which matters if the best candidate is a borderline match
+        if candidates is not self._keys and threshold < confidence_threshold * 100 + self.full_scan_margin:
+            nearest_match, threshold = process.extractOne(user_food, self._keys)
+
+        return self.food_store[nearest_match] if threshold >= confidence_threshold * 100 else None
+
+    def match_many(self, values: Iterable[str], confidence_threshold: float) -> dict[str, Food | None]:
+        """Finds the closest food for each value; duplicate values are only matched once"""
+
+        return {value: self.match(value, confidence_threshold) for value in set(values)}
 
 
 class MealieListService:
     """Manages Mealie list and list item interactions"""
 
+    INDEXED_EXTRAS = ["alexa_item_id", "todoist_task_id"]
+    """extras that can be used to look up list items in constant time; see `get_item_by_extra`"""
+
     def __init__(self, user: User) -> None:
         if not user.is_linked_to_mealie:
             raise NotLinkedError(user.username, "mealie")
@@ -33,34 +149,86 @@ class MealieListService:
         self.config = cast(UserMealieConfiguration, user.configuration.mealie)
         self._client = MealieClient(self.config.base_url, self.config.auth_token)
 
-        self._list_items_cache: dict[str, list[MealieShoppingListItemOut]] = {}
+        self._food_matches_cache: dict[str, Food | None] = {}
+        """map of {text: matched food}"""
+
+        self._list_items_cache: dict[str, list[MealieShoppingListItemView]] = {}
         """
         map of {shopping_list_id: list[shopping_list_items]}
 
         guaranteed to contain *all* unchecked items, but sometimes contains *some* checked items
 
+        items are read-only and replaced, rather than mutated, when they change
+
         should not be accessed directly; see `get_all_list_items`
         """
 
+        self._list_items_index: dict[str, dict[str, dict[str, list[MealieShoppingListItemView]]]] = {}
+        """
+        map of {shopping_list_id: {index_key: {value: list[shopping_list_items]}}}
+
+        secondary indexes over `_list_items_cache` by item id and by each of `INDEXED_EXTRAS`
+        """
+
+        self._partial_list_items_cache: dict[str, dict[str, MealieShoppingListItemView]] = {}
+        """
+        map of {shopping_list_id: {item_id: shopping_list_item}}
+
+        items fetched by id from lists which aren't in `_list_items_cache`
+        """
+
+        self._partial_list_items_fetched: dict[str, set[str]] = {}
+        """map of {shopping_list_id: item ids already fetched by id}; see `get_list_items_view_by_ids`"""
+
     def _clear_cache(self) -> None:
-        for cached_prop in ["recipe_store", "food_store", "label_store"]:
+        for cached_prop in ["recipe_store", "food_store", "food_matcher", "label_store"]:
             self.__dict__.pop(cached_prop, None)
 
+        self.invalidate_catalog_cache(self.config.base_url, self.config.auth_token)
         self._list_items_cache.clear()
-        self.get_food.cache_clear()
+        self._list_items_index.clear()
+        self._partial_list_items_cache.clear()
+        self._partial_list_items_fetched.clear()
+        self._food_matches_cache.clear()
         self.get_label.cache_clear()
         self.get_all_lists.cache_clear()
 
-    @cached_property
-    def recipe_store(self) -> dict[str, MealieRecipe]:
-        """Dictionary of { recipe.id: MealieRecipe }"""
+    @classmethod
+    def invalidate_catalog_cache(cls, base_url: str, auth_token: str) -> None:
+        """Removes a Mealie instance's catalogs from the shared catalog cache"""
 
-        return {recipe.id: recipe for recipe in self._client.get_all_recipes()}
+        with _catalog_cache_lock:
+            _catalog_cache.pop((base_url, auth_token), None)
 
-    @cached_property
-    def food_store(self) -> dict[str, Food]:
-        """Dictionary of { food.name.lower(): Food }"""
+    def _get_catalog(self, catalog_name: str, loader: Callable[[], T]) -> T:
+        """
+        Fetches a catalog from the shared catalog cache, or loads it from Mealie if it's missing or expired
+
+        Catalogs are shared with other services using the same Mealie instance and token, so they must not be mutated
+        """
+
+        cache_key = (self.config.base_url, self.config.auth_token)
+        with _catalog_cache_lock:
+            catalogs = _catalog_cache.get(cache_key)
+            if catalogs and catalog_name in catalogs:
+                return catalogs[catalog_name]
+
+        # we don't hold the lock while fetching data from Mealie so other users aren't blocked
+        catalog = loader()
+        with _catalog_cache_lock:
+            catalogs = _catalog_cache.get(cache_key)
+            if catalogs is None:
+                catalogs = {}
+                _catalog_cache[cache_key] = catalogs
+
+            catalogs[catalog_name] = catalog
+
+        return catalog
 
+    def _load_recipe_store(self) -> dict[str, MealieRecipe]:
+        return {recipe.id: recipe for recipe in self._client.get_all_recipes()}
+
+    def _load_food_store(self) -> dict[str, Food]:
         store: dict[str, Food] = {}
         all_foods = self._client.get_all_foods()
         for food in all_foods:
@@ -70,11 +238,39 @@ class MealieListService:
 
         return store
 
+    def _load_label_store(self) -> dict[str, Label]:
+        return {label.name.lower(): label for label in self._client.get_all_labels()}
+
+    @cached_property
+    def recipe_store(self) -> dict[str, MealieRecipe]:
+        """Dictionary of { recipe.id: MealieRecipe }"""
+
+        return self._get_catalog("recipes", self._load_recipe_store)
+
+    @cached_property
+    def food_store(self) -> dict[str, Food]:
+        """Dictionary of { food.name.lower(): Food }"""
+
+        return self._get_catalog("foods", self._load_food_store)
+
+    @cached_property
+    def food_matcher(self) -> FoodMatcher:
+        """Fuzzy food matcher indexed on the food store"""
+
+        return self._get_catalog(
+            "food_matcher",
+            lambda: FoodMatcher(
+                self.food_store,
+                settings.mealie_food_match_shortlist_size,
+                full_scan_margin=settings.mealie_food_match_full_scan_margin,
+            ),
+        )
+
     @cached_property
     def label_store(self) -> dict[str, Label]:
         """Dictionary of { label.name.lower(): Label }"""
 
-        return {label.name.lower(): label for label in self._client.get_all_labels()}
+        return self._get_catalog("labels", self._load_label_store)
 
     def get_recipe_url(self, recipe_id: str) -> str | None:
         """Constructs a recipe's frontend URL using its id"""
@@ -85,26 +281,22 @@ class MealieListService:
 
         return f"{self.config.base_url}recipe/{recipe.slug}"
 
-    @cache
     def get_food(self, food: str) -> Food | None:
         """Compares food to the Mealie food store and finds the closest match within threshold"""
 
-        if not self.food_store:
-            return None
+        return self.get_foods([food])[food]
 
-        user_food = food.lower()  # food store keys are all lowercase
-        if user_food in self.food_store:
-            return self.food_store[user_food]
+    def get_foods(self, foods: Iterable[str]) -> dict[str, Food | None]:
+        """Compares each food to the Mealie food store and finds the closest match within threshold"""
 
-        # if we're only checking for exact matches, stop here
-        if self.config.confidence_threshold >= 1:
-            return None
+        foods = set(foods)
+        unmatched_foods = [food for food in foods if food not in self._food_matches_cache]
+        if unmatched_foods:
+            self._food_matches_cache.update(
+                self.food_matcher.match_many(unmatched_foods, self.config.confidence_threshold)
+            )
 
-        nearest_match: str
-        threshold: int  # score from 0 - 100
-        nearest_match, threshold = process.extractOne(user_food, self.food_store.keys())
-
-        return self.food_store[nearest_match] if threshold >= self.config.confidence_threshold * 100 else None
+        return {food: self._food_matches_cache[food] for food in foods}
 
     @cache
     def get_label(self, label: str) -> Label | None:
@@ -118,8 +310,7 @@ class MealieListService:
 
         # Mealie doesn't always add the food's label to the item, so we check the food
         elif item.food and item.food.label:
-            item.label = item.food.label
-            return item.label
+            return item.food.label
 
         return None
 
@@ -157,12 +348,47 @@ class MealieListService:
     def get_all_lists(self) -> Iterable[MealieShoppingListOut]:
         return self._client.get_all_shopping_lists()
 
-    def _get_all_list_items(self, list_id: str, include_all_checked: bool = False) -> list[MealieShoppingListItemOut]:
+    @classmethod
+    def _get_index_values(cls, item: MealieShoppingListItemOut) -> list[tuple[str, str]]:
+        """Returns all (index_key, value) pairs an item should be indexed by"""
+
+        index_values = [("id", item.id)]
+        if item.extras:
+            for extras_key in cls.INDEXED_EXTRAS:
+                extras_value = getattr(item.extras, extras_key)
+                if extras_value:
+                    index_values.append((extras_key, extras_value))
+
+        return index_values
+
+    def _index_item(self, list_id: str, item: MealieShoppingListItemOut) -> None:
+        list_index = self._list_items_index.setdefault(list_id, {})
+        for index_key, value in self._get_index_values(item):
+            list_index.setdefault(index_key, {}).setdefault(value, []).append(item)
+
+    def _unindex_item(self, list_id: str, item: MealieShoppingListItemOut) -> None:
+        list_index = self._list_items_index.get(list_id, {})
+        for index_key, value in self._get_index_values(item):
+            indexed_items = list_index.get(index_key, {}).get(value)
+            if not indexed_items:
+                continue
+
+            indexed_items[:] = [indexed_item for indexed_item in indexed_items if indexed_item.id != item.id]
+            if not indexed_items:
+                list_index[index_key].pop(value)
+
+    def _get_indexed_item(self, list_id: str, index_key: str, value: str) -> MealieShoppingListItemView | None:
+        """Fetches the first indexed item, if any, from Mealie or local cache"""
+
+        self._get_all_list_items(list_id)
+        indexed_items = self._list_items_index.get(list_id, {}).get(index_key, {}).get(value)
+        return indexed_items[0] if indexed_items else None
+
+    def _get_all_list_items(self, list_id: str, include_all_checked: bool = False) -> list[MealieShoppingListItemView]:
         """
         Fetch all list items from Mealie or local cache
 
-        Mutations to the list or to any items in the list will
-        modify the local cache
+        Mutations to the list will modify the local cache
 
         For a safe list of items, see `get_all_list_items`
         """
@@ -171,79 +397,189 @@ class MealieListService:
         if list_id in self._list_items_cache and not include_all_checked:
             return self._list_items_cache[list_id]
 
-        list_items = list(self._client.get_all_shopping_list_items(list_id, include_all_checked))
+        list_items = [
+            MealieShoppingListItemView.from_item(item)
+            for item in self._client.get_all_shopping_list_items(list_id, include_all_checked)
+        ]
         self._list_items_cache[list_id] = list_items
+
+        self._list_items_index[list_id] = {}
+        for item in list_items:
+            self._index_item(list_id, item)
+
         return list_items
 
+    def get_all_list_items_view(
+        self, list_id: str, include_all_checked: bool = False
+    ) -> tuple[MealieShoppingListItemView, ...]:
+        """
+        Fetch a read-only snapshot of all list items from Mealie or local cache.
+        May include some checked items
+
+        Items in the snapshot are shared with the local cache and can't be mutated;
+        use `checkout_item` to get a copy of an item that can be safely mutated
+
+        Optionally include all checked items queried directly from Mealie
+        """
+
+        return tuple(self._get_all_list_items(list_id, include_all_checked))
+
     def get_all_list_items(self, list_id: str, include_all_checked: bool = False) -> list[MealieShoppingListItemOut]:
         """
         Fetch all list items from Mealie or local cache that can be safely mutated.
         May include some checked items
 
         Optionally include all checked items queried directly from Mealie
+
+        For a read-only snapshot that doesn't copy every item, see `get_all_list_items_view`
+        """
+
+        return [self.checkout_item(item) for item in self._get_all_list_items(list_id, include_all_checked)]
+
+    def get_list_items_view_by_ids(self, list_id: str, item_ids: list[str]) -> tuple[MealieShoppingListItemView, ...]:
+        """
+        Fetch a read-only snapshot of specific list items from Mealie, including checked items,
+        without fetching the rest of the list. Items which no longer exist are omitted
+
+        Each item is only fetched once; if the list is cached, the cache is patched with the fetched items
         """
 
-        return deepcopy(self._get_all_list_items(list_id, include_all_checked))
+        fetched_item_ids = self._partial_list_items_fetched.setdefault(list_id, set())
+        item_ids_to_fetch = [item_id for item_id in dict.fromkeys(item_ids) if item_id not in fetched_item_ids]
+        if item_ids_to_fetch:
+            fetched_items = list(self._client.get_shopping_list_items_by_ids(list_id, item_ids_to_fetch))
+            fetched_item_ids.update(item_ids_to_fetch)
+            if list_id in self._list_items_cache:
+                self._handle_list_item_changes(MealieShoppingListItemsCollectionOut(updated_items=fetched_items))
+
+            else:
+                self._partial_list_items_cache.setdefault(list_id, {}).update(
+                    {item.id: MealieShoppingListItemView.from_item(item) for item in fetched_items}
+                )
+
+        if list_id in self._list_items_cache:
+            items = [self._get_indexed_item(list_id, "id", item_id) for item_id in item_ids]
+
+        else:
+            partial_list_items = self._partial_list_items_cache.get(list_id, {})
+            items = [partial_list_items.get(item_id) for item_id in item_ids]
+
+        return tuple(item for item in items if item)
+
+    def get_item_view(self, list_id: str, item_id: str) -> MealieShoppingListItemView | None:
+        """Fetches a read-only item; use `checkout_item` before mutating it"""
+
+        if list_id not in self._list_items_cache and item_id in self._partial_list_items_cache.get(list_id, {}):
+            return self._partial_list_items_cache[list_id][item_id]
+
+        return self._get_indexed_item(list_id, "id", item_id)
 
     def get_item(self, list_id: str, item_id: str) -> MealieShoppingListItemOut | None:
         """Fetches an item that can be safely mutated"""
 
-        for item in self._get_all_list_items(list_id):
-            if item.id == item_id:
-                return deepcopy(item)
-
-        return None
+        item = self.get_item_view(list_id, item_id)
+        return self.checkout_item(item) if item else None
 
-    def get_item_by_extra(self, list_id: str, extras_key: str, extras_value: str) -> MealieShoppingListItemOut | None:
+    def get_item_view_by_extra(
+        self, list_id: str, extras_key: str, extras_value: str
+    ) -> MealieShoppingListItemView | None:
         """
-        Fetches an item by unique extra that can be safely mutated
+        Fetches a read-only item by unique extra; use `checkout_item` before mutating it
 
         If more than one item shares the same extra, only the first is returned
         """
 
+        if extras_key in self.INDEXED_EXTRAS:
+            return self._get_indexed_item(list_id, extras_key, extras_value)
+
         for item in self._get_all_list_items(list_id):
             if not item.extras:
                 continue
 
             extras = item.extras.dict()
             if extras.get(extras_key) == extras_value:
-                return deepcopy(item)
+                return item
 
         return None
 
+    def get_item_by_extra(self, list_id: str, extras_key: str, extras_value: str) -> MealieShoppingListItemOut | None:
+        """
+        Fetches an item by unique extra that can be safely mutated
+
+        If more than one item shares the same extra, only the first is returned
+        """
+
+        item = self.get_item_view_by_extra(list_id, extras_key, extras_value)
+        return self.checkout_item(item) if item else None
+
+    @staticmethod
+    def checkout_item(item: MealieShoppingListItemOut) -> MealieShoppingListItemOut:
+        """Copies a read-only item so it can be safely mutated without modifying the local cache"""
+
+        return MealieShoppingListItemOut.construct(_fields_set=item.__fields_set__, **deepcopy(item.__dict__))
+
     def _handle_list_item_changes(self, items_collection: MealieShoppingListItemsCollectionOut) -> None:
-        """Updates internal list states after a bulk operation"""
+        """
+        Updates internal list states and indexes after a bulk operation
+
+        Lists that aren't cached yet are skipped, since they will include these changes when they're fetched
+        """
 
         # created items
-        for new_item in items_collection.created_items:
-            list_items = self._get_all_list_items(new_item.shopping_list_id)
-            list_items.append(new_item)
+        for created_item in items_collection.created_items:
+            list_id = created_item.shopping_list_id
+            if list_id not in self._list_items_cache:
+                continue
+
+            new_item = MealieShoppingListItemView.from_item(created_item)
+            self._list_items_cache[list_id].append(new_item)
+            self._index_item(list_id, new_item)
 
         # updated items
-        updated_items_by_list_id: dict[str, list[MealieShoppingListItemOut]] = {}
-        for updated_item in items_collection.updated_items:
+        updated_items_by_list_id: dict[str, list[MealieShoppingListItemView]] = {}
+        for updated_item in map(MealieShoppingListItemView.from_item, items_collection.updated_items):
             updated_items_by_list_id.setdefault(updated_item.shopping_list_id, []).append(updated_item)
+            partial_list_items = self._partial_list_items_cache.get(updated_item.shopping_list_id, {})
+            if updated_item.id in partial_list_items:
+                partial_list_items[updated_item.id] = updated_item
 
         for list_id, updated_items in updated_items_by_list_id.items():
-            list_items = self._get_all_list_items(list_id)
+            if list_id not in self._list_items_cache:
+                continue
+
+            list_items = self._list_items_cache[list_id]
             item_id_by_index = {existing_item.id: i for i, existing_item in enumerate(list_items)}
             for updated_item in updated_items:
                 # this should never happen since we track all list modifications
                 if updated_item.id not in item_id_by_index:
                     list_items.append(updated_item)
+                    self._index_item(list_id, updated_item)
                     continue
 
                 index = item_id_by_index[updated_item.id]
+                self._unindex_item(list_id, list_items[index])
                 list_items[index] = updated_item
+                self._index_item(list_id, updated_item)
 
         # deleted items
         deleted_items_by_list_id: dict[str, list[MealieShoppingListItemOut]] = {}
         for deleted_item in items_collection.deleted_items:
             deleted_items_by_list_id.setdefault(deleted_item.shopping_list_id, []).append(deleted_item)
+            self._partial_list_items_cache.get(deleted_item.shopping_list_id, {}).pop(deleted_item.id, None)
 
         for list_id, deleted_items in deleted_items_by_list_id.items():
-            deleted_item_ids = [deleted_item.id for deleted_item in deleted_items]
-            list_items = self._get_all_list_items(list_id)
+            if list_id not in self._list_items_cache:
+                continue
+
+            deleted_item_ids = set()
+            for deleted_item in deleted_items:
+                existing_item = self._get_indexed_item(list_id, "id", deleted_item.id)
+                if existing_item:
+                    self._unindex_item(list_id, existing_item)
+
+                deleted_item_ids.add(deleted_item.id)
+
+            list_items = self._list_items_cache[list_id]
             list_items[:] = [existing_item for existing_item in list_items if existing_item.id not in deleted_item_ids]
 
     def create_items(self, items: list[MealieShoppingListItemCreate]) -> None:
@@ -261,7 +597,7 @@ class MealieListService:
                 try:
                     new_max = max(
                         existing_item.position
-                        for existing_item in self.get_all_list_items(item.shopping_list_id)
+                        for existing_item in self.get_all_list_items_view(item.shopping_list_id)
                         if not existing_item.checked
                     )
                 except (TypeError, ValueError):
@@ -274,6 +610,8 @@ class MealieListService:
             item.position = new_max
 
         if self.config.use_foods:
+            # match all notes at once so each food is only looked up once
+            self.get_foods(item.note for item in items if item.note and not item.food_id)
             for item in items:
                 item = self.add_food_to_item(item)
 
@@ -0,0 +1,83 @@
+import json
+import time
+from collections import defaultdict
+from threading import RLock
+from typing import Any
+
+from ..app import settings
+
+
+class MetricsService:
+    """
+    Collects counters and timings in-memory and flushes them as a CloudWatch embedded metric format (EMF) log line
+
+    https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/CloudWatch_Embedded_Metric_Format_Specification.html
+    """
+
+    max_values_per_metric = 100
+    """EMF supports at most 100 values per metric per log line"""
+
+    def __init__(self, namespace: str = settings.metrics_namespace, service: str = settings.internal_app_name) -> None:
+        self.namespace = namespace
+        self.service = service
+
+        self._counters: defaultdict[str, float] = defaultdict(float)
+        self._timings: defaultdict[str, list[float]] = defaultdict(list)
+        self._lock = RLock()
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def record_timing(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._timings[name].append(seconds)
+
+    def get_counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def get_timings(self, name: str) -> list[float]:
+        with self._lock:
+            return list(self._timings.get(name, []))
+
+    def build_emf(self) -> dict[str, Any] | None:
+        """Builds an EMF document from all collected metrics, or None if there are no metrics"""
+
+        with self._lock:
+            if not (self._counters or self._timings):
+                return None
+
+            metric_definitions: list[dict[str, str]] = []
+            document: dict[str, Any] = {"service": self.service}
+            for name, value in self._counters.items():
+                metric_definitions.append({"Name": name, "Unit": "Count"})
+                document[name] = value
+
+            for name, values in self._timings.items():
+                metric_definitions.append({"Name": name, "Unit": "Seconds"})
+                document[name] = values[-self.max_values_per_metric :]
+
+        document["_aws"] = {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {"Namespace": self.namespace, "Dimensions": [["service"]], "Metrics": metric_definitions}
+            ],
+        }
+
+        return document
+
+    def flush(self) -> None:
+        """Writes all collected metrics to stdout, where CloudWatch picks them up, and resets them"""
+
+        with self._lock:
+            document = self.build_emf()
+            self._counters.clear()
+            self._timings.clear()
+
+        if document and settings.metrics_enabled:
+            print(json.dumps(document))
+
+
+metrics = MetricsService()
+"""metrics shared by all services and clients in this container"""
@@ -0,0 +1,69 @@
+import hashlib
+import logging
+from typing import Any, Iterable
+
+from ..app import settings
+from ..clients import aws
+from .metrics import metrics
+
+fingerprints_db = aws.DynamoDB(settings.sync_fingerprints_tablename, settings.sync_fingerprints_pk)
+
+
+def build_fingerprint(records: Iterable[Any]) -> str:
+    """Hashes a collection of records; the order of the records doesn't change the fingerprint"""
+
+    digest = hashlib.sha256()
+    for record in sorted(repr(record) for record in records):
+        digest.update(record.encode())
+        digest.update(b"\n")
+
+    return digest.hexdigest()
+
+
+class SyncFingerprintService:
+    """
+    Remembers the fingerprint of both sides of a list map after a sync which left them in sync,
+    so later syncs can be skipped if neither side has changed
+    """
+
+    def __init__(self, fingerprint_key: str) -> None:
+        self.fingerprint_key = fingerprint_key
+
+    def is_unchanged(self, fingerprint: str) -> bool:
+        """Whether the fingerprint matches the last sync, in which case the sync can be skipped"""
+
+        try:
+            data = fingerprints_db.get(self.fingerprint_key)
+
+        except Exception as e:
+            if settings.debug:
+                raise
+
+            logging.error(f"Unable to read sync fingerprint {self.fingerprint_key}")
+            logging.error(f"{type(e).__name__}: {e}")
+            data = None
+
+        if data and data.get("fingerprint") == fingerprint:
+            metrics.increment("SyncFingerprintHits")
+            return True
+
+        metrics.increment("SyncFingerprintMisses")
+        return False
+
+    def save(self, fingerprint: str) -> None:
+        """
+        Saves the fingerprint of a sync which didn't need to change either side
+
+        Syncs which make changes don't need to clear the last fingerprint: if both sides ever match it again,
+        they're back in a state which was already in sync
+        """
+
+        try:
+            fingerprints_db.put({settings.sync_fingerprints_pk: self.fingerprint_key, "fingerprint": fingerprint})
+
+        except Exception as e:
+            if settings.debug:
+                raise
+
+            logging.error(f"Unable to write sync fingerprint {self.fingerprint_key}")
+            logging.error(f"{type(e).__name__}: {e}")
@@ -1,13 +1,61 @@
+import logging
 from copy import deepcopy
 from functools import cache
-from typing import cast
+from threading import RLock
+from typing import Any, cast
+from uuid import uuid4
 
+from cachetools import TTLCache
 from requests import HTTPError
 from todoist_api_python.api import TodoistAPI
+from todoist_api_python.endpoints import BASE_URL
 from todoist_api_python.models import Section, Task
 
+from ..app import settings
+from ..clients import http
+from ..clients.todoist import MAX_COMMANDS_PER_REQUEST, TodoistSyncClient
 from ..models.account_linking import NotLinkedError, UserTodoistConfiguration
-from ..models.core import User
+from ..models.core import Source, User
+from ..models.todoist import TodoistSyncCommand, TodoistSyncResponse
+from .expected_changes import ExpectedChangeLedger
+from .metrics import metrics
+from .sync_fingerprints import build_fingerprint
+
+
+class TodoistSectionCatalog:
+    """A project's sections, indexed by id and by name"""
+
+    def __init__(self, project_id: str, sections: list[Section]) -> None:
+        self.project_id = project_id
+        self.by_id: dict[str, Section] = {}
+        self.by_name: dict[str, Section] = {}
+        """map of {normalized section name: section}"""
+
+        for section in sections:
+            self.add(section)
+
+    @classmethod
+    def normalize_name(cls, name: str) -> str:
+        return name.strip().lower()
+
+    def add(self, section: Section) -> None:
+        self.by_id[section.id] = section
+        self.by_name.setdefault(self.normalize_name(section.name), section)
+
+    def get_by_name(self, name: str) -> Section | None:
+        return self.by_name.get(self.normalize_name(name))
+
+
+_section_catalog_cache: TTLCache[tuple[str, str], TodoistSectionCatalog] = TTLCache(
+    maxsize=settings.todoist_section_catalog_cache_max_size, ttl=settings.todoist_section_catalog_cache_ttl_seconds
+)
+"""
+Todoist section catalogs shared across service instances (and Lambda invocations) in a warm container
+
+map of {(access_token, project_id): section catalog}
+"""
+
+_section_catalog_cache_lock = RLock()
 
 
 class TodoistTaskService:
@@ -21,16 +69,82 @@ class TodoistTaskService:
         self._project_tasks_cache: dict[str, list[Task]] = {}
         """map of {project_id: tasks}"""
 
+        self._known_tasks: dict[str, Task] = {}
+        """map of {task_id: task} for tasks known without fetching their project (e.g. from webhook payloads)"""
+
+        self._expected_changes = ExpectedChangeLedger(user.username, Source.todoist)
+        """changes written to Todoist, whose webhooks can be ignored"""
+
     @classmethod
     def _get_client(cls, token: str) -> TodoistAPI:
-        return TodoistAPI(token)
+        return TodoistAPI(token, session=http.sessions.get_session(BASE_URL))
+
+    @classmethod
+    def _get_sync_client(cls, token: str) -> TodoistSyncClient:
+        return TodoistSyncClient(token)
 
     def _clear_cache(self) -> None:
         self._project_tasks_cache.clear()
+        self._known_tasks.clear()
         self.get_section.cache_clear()
 
-    def get_section_by_id(self, section_id: str) -> Section:
-        return self._client.get_section(section_id)
+        with _section_catalog_cache_lock:
+            for cache_key in [key for key in _section_catalog_cache if key[0] == self.config.access_token]:
+                _section_catalog_cache.pop(cache_key, None)
+
+    def _get_section_catalog(self, project_id: str, refresh: bool = False) -> TodoistSectionCatalog:
+        """
+        Fetches a project's sections from the shared section catalog cache, or loads them from Todoist
+        if they're missing, expired, or `refresh` is True
+        """
+
+        cache_key = (self.config.access_token, project_id)
+        if not refresh:
+            with _section_catalog_cache_lock:
+                catalog = _section_catalog_cache.get(cache_key)
+                if catalog:
+                    return catalog
+
+        # we don't hold the lock while fetching data from Todoist so other users aren't blocked
+        catalog = TodoistSectionCatalog(project_id, self._client.get_sections(project_id=project_id))
+        with _section_catalog_cache_lock:
+            _section_catalog_cache[cache_key] = catalog
+
+        return catalog
+
+    def _find_cached_section(self, section_id: str) -> Section | None:
+        with _section_catalog_cache_lock:
+            for (access_token, _), catalog in _section_catalog_cache.items():
+                if access_token == self.config.access_token and section_id in catalog.by_id:
+                    return catalog.by_id[section_id]
+
+        return None
+
+    def get_section_by_id(self, section_id: str, project_id: str | None = None) -> Section:
+        """
+        Gets a section by id from the section catalog, falling back to Todoist if it's not cached
+
+        Pass the section's project id, if known, so its project's catalog can be loaded
+        """
+
+        if project_id:
+            catalog = self._get_section_catalog(project_id)
+            if section_id in catalog.by_id:
+                return catalog.by_id[section_id]
+
+        else:
+            cached_section = self._find_cached_section(section_id)
+            if cached_section:
+                return cached_section
+
+        section = self._client.get_section(section_id)
+
+        # load the catalog before taking the lock, since loading it may call Todoist
+        catalog = self._get_section_catalog(section.project_id)
+        with _section_catalog_cache_lock:
+            catalog.add(section)
+
+        return section
 
     @cache
     def get_section(self, section: str, project_id: str) -> Section | None:
@@ -41,15 +155,25 @@ class TodoistTaskService:
         section, return None
         """
 
-        user_section = section.strip().lower()
-        api_sections = self._client.get_sections(project_id=project_id)
-        for api_section in api_sections:
-            if api_section.name.strip().lower() == user_section:
-                return api_section
+        catalog = self._get_section_catalog(project_id)
+        api_section = catalog.get_by_name(section)
+        if api_section:
+            return api_section
+
+        # the section may have been created since the catalog was loaded
+        catalog = self._get_section_catalog(project_id, refresh=True)
+        api_section = catalog.get_by_name(section)
+        if api_section:
+            return api_section
 
         try:
             # TODO: add the section in the correct order based on Mealie settings
-            return self._client.add_section(section, project_id)
+            new_section = self._client.add_section(section, project_id)
+            with _section_catalog_cache_lock:
+                catalog.add(new_section)
+
+            return new_section
+
         except HTTPError as e:
             if e.response.status_code != 403:
                 raise
@@ -57,12 +181,8 @@ class TodoistTaskService:
             # when a user has too many sections, a 403 error is thrown,
             # so we try to set the section as default
             # TODO: document this limitation
-            for api_section in api_sections:
-                if api_section.name.strip().lower() == self.config.default_section_name:
-                    return api_section
-
             # if the default section doesn't exist, we can't create it
-            return None
+            return catalog.get_by_name(self.config.default_section_name)
 
     def is_default_section(self, section_id: str, project_id: str) -> bool:
         default_section = self.get_section(self.config.default_section_name, project_id)
@@ -110,20 +230,113 @@ class TodoistTaskService:
         self._project_tasks_cache[project_id] = tasks
         return tasks
 
+    def get_tasks_view(self, project_id: str) -> tuple[Task, ...]:
+        """
+        Fetches a read-only snapshot of tasks from Todoist or from local cache
+
+        Tasks in the snapshot are shared with the local cache and must not be mutated;
+        use `checkout_task` to get a copy of a task that can be safely mutated
+        """
+
+        return tuple(self._get_tasks(project_id))
+
     def get_tasks(self, project_id: str) -> list[Task]:
         """Fetches a list of tasks that can be safely mutated"""
 
         return deepcopy(self._get_tasks(project_id))
 
-    def get_task(self, task_id: str, project_id: str) -> Task | None:
-        """Fetches a task that can be safely mutated"""
+    def get_task_view(self, task_id: str, project_id: str) -> Task | None:
+        """Fetches a read-only task; use `checkout_task` before mutating it"""
 
         for task in self._get_tasks(project_id):
             if task.id == task_id:
-                return deepcopy(task)
+                return task
 
         return None
 
+    def get_task(self, task_id: str, project_id: str) -> Task | None:
+        """Fetches a task that can be safely mutated"""
+
+        task = self.get_task_view(task_id, project_id)
+        return self.checkout_task(task) if task else None
+
+    def add_known_tasks(self, tasks: list[Task]) -> None:
+        """
+        Caches tasks which are known to be current (e.g. from a webhook payload)
+
+        Known tasks can be updated and closed without fetching the rest of their project
+        """
+
+        for task in tasks:
+            self._known_tasks[task.id] = self.checkout_task(task)
+
+    def _find_task(self, task_id: str, project_id: str) -> Task | None:
+        """Finds a read-only task, without fetching its project if the task is already known"""
+
+        if project_id not in self._project_tasks_cache:
+            known_task = self._known_tasks.get(task_id)
+            if known_task and known_task.project_id == project_id:
+                return known_task
+
+        return self.get_task_view(task_id, project_id)
+
+    def get_tasks_view_by_ids(self, task_ids: list[str], project_id: str) -> tuple[Task, ...]:
+        """
+        Fetches a read-only snapshot of specific open tasks, without fetching the rest of their project
+        if it isn't already cached. Tasks which are closed, deleted, or in another project are omitted
+
+        Fetched tasks are added to the known tasks, so they can be updated and closed without fetching their project
+        """
+
+        if project_id in self._project_tasks_cache:
+            return tuple(task for task in self._get_tasks(project_id) if task.id in task_ids)
+
+        tasks: list[Task] = []
+        for task_id in dict.fromkeys(task_ids):
+            task = self._known_tasks.get(task_id)
+            if not task:
+                try:
+                    task = self._client.get_task(task_id)
+
+                except HTTPError as e:
+                    if e.response.status_code != 404:
+                        raise
+
+                    continue
+
+            if task.project_id == project_id and not task.is_completed:
+                tasks.append(task)
+
+        self.add_known_tasks(tasks)
+        return tuple(self._known_tasks[task.id] for task in tasks)
+
+    def _replace_cached_task(self, task: Task) -> None:
+        if task.id in self._known_tasks:
+            self._known_tasks[task.id] = task
+
+        project_tasks = self._project_tasks_cache.get(task.project_id, [])
+        for i, local_task in enumerate(project_tasks):
+            if local_task.id == task.id:
+                project_tasks[i] = task
+                break
+
+    @staticmethod
+    def build_change_version(task: Task) -> str:
+        """Builds a version of a task from the fields we write, to match webhooks against the changes we made"""
+
+        return build_fingerprint([(task.content, task.section_id, sorted(task.labels), task.is_completed)])
+
+    def _expect_change(self, task: Task, is_completed: bool = False) -> None:
+        task = self.checkout_task(task)
+        task.is_completed = is_completed
+        self._expected_changes.expect(task.id, self.build_change_version(task))
+
+    @staticmethod
+    def checkout_task(task: Task) -> Task:
+        """Copies a read-only task so it can be safely mutated without modifying the local cache"""
+
+        return deepcopy(task)
+
     def add_task(
         self,
         content: str,
@@ -149,6 +362,7 @@ class TodoistTaskService:
         existing_tasks = self._get_tasks(project_id)
         new_task = self._client.add_task(content=content, project_id=project_id, **kwargs)
         existing_tasks.append(new_task)
+        self._expect_change(new_task)
         return deepcopy(new_task)
 
     def update_task(
@@ -160,20 +374,10 @@ class TodoistTaskService:
         description: str | None = None,
         **kwargs,
     ) -> Task:
-        """
-        Updates an existing task
-
-        May also delete the existing task and create a new one with a new task id
-        """
+        """Updates an existing task, moving it to a new section if necessary"""
 
-        task: Task | None = None
-        task_index_to_update: int | None = None
-        for i, local_task in enumerate(self._get_tasks(project_id)):
-            if local_task.id == task_id:
-                task = local_task
-                task_index_to_update = i
-
-        if not task or task_index_to_update is None:
+        task = self._find_task(task_id, project_id)
+        if not task:
             raise Exception("Task does not exist")
 
         if not labels:
@@ -187,37 +391,412 @@ class TodoistTaskService:
 
         if self.config.map_labels_to_sections:
             if task.section_id and not section:
-                section = self.get_section_by_id(task.section_id).name
+                section = self.get_section_by_id(task.section_id, task.project_id).name
 
             section_name = section or self.config.default_section_name
             api_section = self.get_section(section_name, project_id)
             new_section_id = api_section.id if api_section else ""
 
-            if new_section_id != task.section_id:
-                # the Todoist API doesn't support changing sections, so we delete and re-create the task instead
-                # this changes the task's id, so systems syncing with this service may need to update the id
-                self.close_task(task)
-                return self.add_task(
-                    content=kwargs.pop("content", None) or task.content,
-                    project_id=project_id,
-                    section=section_name,
-                    **kwargs,
-                )
-
-        is_success = self._client.update_task(task_id=task.id, project_id=project_id, **kwargs)
+            if new_section_id != (task.section_id or ""):
+                task = self._move_task(task, new_section_id)
+
+        updated_task = self._update_task(task, **kwargs)
+        self._replace_cached_task(updated_task)
+        self._expect_change(updated_task)
+        return deepcopy(updated_task)
+
+    def _update_task(self, task: Task, **kwargs) -> Task:
+        """
+        Sends a task update to Todoist and returns the updated task
+
+        The REST API doesn't return the updated task, so the update is applied to the local task
+        instead of fetching it again, unless `settings.todoist_verify_task_updates` is enabled
+        """
+
+        is_success = self._client.update_task(task_id=task.id, project_id=task.project_id, **kwargs)
         if not is_success:
             raise Exception("Unable to update task; rejected by Todoist")
 
-        updated_task = self._client.get_task(task_id)
-        self._get_tasks(project_id)[task_index_to_update] = updated_task
-        return deepcopy(updated_task)
+        if settings.todoist_verify_task_updates:
+            metrics.increment("TodoistTaskVerificationReads")
+            return self._client.get_task(task.id)
+
+        metrics.increment("TodoistTaskReadsAvoided")
+        return self._apply_task_update(task, **kwargs)
+
+    def _apply_task_update(self, task: Task, **kwargs) -> Task:
+        """Returns a copy of a task with an update applied to it"""
+
+        updated_task = self.checkout_task(task)
+        for k, v in kwargs.items():
+            if hasattr(updated_task, k):
+                setattr(updated_task, k, v)
+
+        return updated_task
+
+    def _move_task(self, task: Task, section_id: str) -> Task:
+        """
+        Moves a task to another section (or to the top of its project, if there is no section)
+
+        The REST API can't move tasks, so the move is sent using the Sync API, which keeps the task id
+        """
+
+        args = {"id": task.id} | ({"section_id": section_id} if section_id else {"project_id": task.project_id})
+        command = TodoistSyncCommand(type="item_move", args=args)
+        response = self._get_sync_client(self.config.access_token).sync(commands=[command])
+        if response.get_command_errors():
+            logging.error(response.get_command_errors())
+            raise Exception("Unable to move task; rejected by Todoist")
+
+        moved_task = self.checkout_task(task)
+        moved_task.section_id = section_id or None
+        return moved_task
 
     def close_task(self, task: Task) -> None:
         # TODO: when the last task in a section is closed, delete the section
 
+        self._close_task(task)
+        self._expect_change(task, is_completed=True)
+        self._known_tasks.pop(task.id, None)
+        if task.project_id in self._project_tasks_cache:
+            tasks = self._project_tasks_cache[task.project_id]
+            tasks[:] = [local_task for local_task in tasks if local_task.id != task.id]
+
+    def _close_task(self, task: Task) -> None:
         is_success = self._client.close_task(task.id)
         if not is_success:
             raise Exception("Unable to close task; rejected by Todoist")
 
-        tasks = self._get_tasks(task.project_id)
-        self._get_tasks(task.project_id)[:] = [local_task for local_task in tasks if local_task.id != task.id]
+    def flush(self) -> dict[str, Any]:
+        """
+        Sends any pending changes to Todoist. Changes are sent immediately, so this only records
+        the changes we made, so their webhooks can be ignored
+
+        Returns a map of {task id: error details} for tasks whose changes weren't applied; since failed
+        changes raise immediately, this is always empty
+        """
+
+        self._expected_changes.flush()
+        return {}
+
+    def resolve_task_id(self, task_id: str) -> str:
+        """Returns the id Todoist assigned to a task, which may differ from the id returned when it was added"""
+
+        return task_id
+
+
+class TodoistSyncState:
+    """Resources fetched from the Todoist Sync API, kept up-to-date using a sync token"""
+
+    resource_types = ["items", "sections"]
+
+    def __init__(self) -> None:
+        self.sync_token = "*"
+        self.tasks: dict[str, Task] = {}
+        """map of {task_id: task}"""
+
+        self.sections: dict[str, Section] = {}
+        """map of {section_id: section}"""
+
+        self.lock = RLock()
+
+    @classmethod
+    def parse_item(cls, item: dict[str, Any]) -> Task:
+        """Converts a Sync API item into a REST API task"""
+
+        return Task.from_dict(
+            {
+                "assignee_id": item.get("responsible_uid"),
+                "assigner_id": item.get("assigned_by_uid"),
+                "comment_count": item.get("comment_count", 0),
+                "is_completed": item.get("checked", False),
+                "content": item["content"],
+                "created_at": item.get("added_at", ""),
+                "creator_id": item.get("added_by_uid") or item.get("user_id", ""),
+                "description": item.get("description", ""),
+                "due": item.get("due"),
+                "id": item["id"],
+                "labels": item.get("labels", []),
+                "order": item.get("child_order", 0),
+                "parent_id": item.get("parent_id") or None,
+                "priority": item.get("priority", 1),
+                "project_id": item["project_id"],
+                "section_id": item.get("section_id") or None,
+                "url": item.get("url", ""),
+            }
+        )
+
+    @classmethod
+    def parse_section(cls, section: dict[str, Any]) -> Section:
+        """Converts a Sync API section into a REST API section"""
+
+        return Section(
+            id=section["id"],
+            name=section["name"],
+            order=section.get("section_order", 0),
+            project_id=section["project_id"],
+        )
+
+    def reset(self) -> None:
+        """Clears all resources, so the next sync is a full sync"""
+
+        self.sync_token = "*"
+        self.tasks.clear()
+        self.sections.clear()
+
+    def apply(self, response: TodoistSyncResponse) -> None:
+        """Applies resources from a sync response and advances the sync token"""
+
+        if response.full_sync:
+            self.tasks.clear()
+            self.sections.clear()
+
+        for item in response.items:
+            if item.get("is_deleted") or item.get("checked"):
+                self.tasks.pop(item["id"], None)
+            else:
+                self.tasks[item["id"]] = self.parse_item(item)
+
+        for section in response.sections:
+            if section.get("is_deleted") or section.get("is_archived"):
+                self.sections.pop(section["id"], None)
+            else:
+                self.sections[section["id"]] = self.parse_section(section)
+
+        self.sync_token = response.sync_token
+
+
+_sync_states: TTLCache[str, TodoistSyncState] = TTLCache(
+    maxsize=settings.todoist_sync_state_cache_max_size, ttl=settings.todoist_sync_state_cache_ttl_seconds
+)
+"""map of {access_token: sync state} so warm containers only fetch changes"""
+
+_sync_states_lock = RLock()
+
+
+def _get_sync_state(token: str) -> TodoistSyncState:
+    with _sync_states_lock:
+        if token not in _sync_states:
+            _sync_states[token] = TodoistSyncState()
+
+        return _sync_states[token]
+
+
+class TodoistSyncTaskService(TodoistTaskService):
+    """
+    Manages Todoist tasks using the Todoist Sync API
+
+    Reads only fetch resources which changed since the last sync, and writes are queued
+    and sent in batches when `flush` is called. Tasks added before a flush have a temporary
+    id; use `resolve_task_id` after flushing to get the id assigned by Todoist
+    """
+
+    def __init__(self, user: User) -> None:
+        super().__init__(user)
+
+        self._sync_client = self._get_sync_client(self.config.access_token)
+        self._state = _get_sync_state(self.config.access_token)
+        self._is_synced = False
+
+        self._pending_commands: list[TodoistSyncCommand] = []
+        self._temp_id_mapping: dict[str, str] = {}
+        """map of {temp_id: task_id}"""
+
+    def _clear_cache(self) -> None:
+        super()._clear_cache()
+        self._is_synced = False
+
+    def _sync(self, commands: list[TodoistSyncCommand] | None = None) -> TodoistSyncResponse:
+        with self._state.lock:
+            response = self._sync_client.sync(self._state.sync_token, self._state.resource_types, commands)
+            self._state.apply(response)
+
+        self._is_synced = True
+        return response
+
+    def _ensure_synced(self) -> None:
+        if not self._is_synced:
+            self._sync()
+
+    def _queue_command(self, command_type: str, args: dict[str, Any], temp_id: str | None = None) -> None:
+        self._pending_commands.append(TodoistSyncCommand(type=command_type, args=args, temp_id=temp_id))
+
+    def get_section_by_id(self, section_id: str, project_id: str | None = None) -> Section:
+        self._ensure_synced()
+        with self._state.lock:
+            if section_id in self._state.sections:
+                return self._state.sections[section_id]
+
+        return super().get_section_by_id(section_id, project_id)
+
+    @cache
+    def get_section(self, section: str, project_id: str) -> Section | None:
+        self._ensure_synced()
+
+        user_section = section.strip().lower()
+        with self._state.lock:
+            project_sections = [
+                api_section for api_section in self._state.sections.values() if api_section.project_id == project_id
+            ]
+
+        for api_section in project_sections:
+            if api_section.name.strip().lower() == user_section:
+                return api_section
+
+        # sections are created immediately, so we can fall back to the default section if creation fails
+        # TODO: add the section in the correct order based on Mealie settings
+        command = TodoistSyncCommand(
+            type="section_add", args={"name": section, "project_id": project_id}, temp_id=str(uuid4())
+        )
+        response = self._sync([command])
+        if not response.get_command_errors():
+            section_id = response.temp_id_mapping.get(cast(str, command.temp_id))
+            with self._state.lock:
+                if section_id and section_id in self._state.sections:
+                    return self._state.sections[section_id]
+
+        for api_section in project_sections:
+            if api_section.name.strip().lower() == self.config.default_section_name:
+                return api_section
+
+        return None
+
+    def _get_tasks(self, project_id: str) -> list[Task]:
+        if project_id in self._project_tasks_cache:
+            return self._project_tasks_cache[project_id]
+
+        self._ensure_synced()
+        with self._state.lock:
+            tasks = [deepcopy(task) for task in self._state.tasks.values() if task.project_id == project_id]
+
+        tasks.sort(key=lambda task: task.order)
+
+        self._project_tasks_cache[project_id] = tasks
+        return tasks
+
+    def get_tasks_view_by_ids(self, task_ids: list[str], project_id: str) -> tuple[Task, ...]:
+        # the sync state already holds every task, so there's nothing to gain by fetching tasks individually
+        return tuple(task for task in self._get_tasks(project_id) if task.id in task_ids)
+
+    def add_task(
+        self,
+        content: str,
+        project_id: str,
+        section: str | None = None,
+        labels: list[str] | None = None,
+        description: str | None = None,
+        **kwargs,
+    ) -> Task:
+        if self.config.map_labels_to_sections:
+            section_name = section or self.config.default_section_name
+
+            api_section = self.get_section(section_name, project_id)
+            if api_section:
+                kwargs["section_id"] = api_section.id
+
+        if labels:
+            kwargs["labels"] = labels
+
+        if description and self.config.add_recipes_to_task_description:
+            kwargs["description"] = description
+
+        existing_tasks = self._get_tasks(project_id)
+        temp_id = str(uuid4())
+        args = {"content": content, "project_id": project_id} | kwargs
+        self._queue_command("item_add", args, temp_id=temp_id)
+
+        # the task is added locally with its temp id until the queue is flushed
+        new_task = TodoistSyncState.parse_item(args | {"id": temp_id, "child_order": len(existing_tasks)})
+        existing_tasks.append(new_task)
+        self._expect_change(new_task)
+        return deepcopy(new_task)
+
+    def _update_task(self, task: Task, **kwargs) -> Task:
+        self._queue_command("item_update", {"id": task.id} | kwargs)
+        return self._apply_task_update(task, **kwargs)
+
+    def _move_task(self, task: Task, section_id: str) -> Task:
+        args = {"id": task.id} | ({"section_id": section_id} if section_id else {"project_id": task.project_id})
+        self._queue_command("item_move", args)
+
+        moved_task = self.checkout_task(task)
+        moved_task.section_id = section_id or None
+        return moved_task
+
+    def _close_task(self, task: Task) -> None:
+        self._queue_command("item_close", {"id": task.id})
+
+    def _resolve_command_ids(self, command: TodoistSyncCommand) -> TodoistSyncCommand:
+        """Replaces temp ids from previously flushed commands with the ids assigned by Todoist"""
+
+        for key in ["id", "parent_id", "section_id"]:
+            if key in command.args and command.args[key] in self._temp_id_mapping:
+                command.args[key] = self._temp_id_mapping[command.args[key]]
+
+        return command
+
+    def flush(self) -> dict[str, Any]:
+        """
+        Sends all pending changes to Todoist, in as few requests as possible
+
+        Returns a map of {task id: error details} for the tasks whose changes weren't applied, by the (possibly
+        temporary) ids returned when the changes were made. Changes which were applied are kept, and their
+        temporary ids can be resolved using `resolve_task_id`
+        """
+
+        if not self._pending_commands:
+            return {}
+
+        commands = self._pending_commands
+        self._pending_commands = []
+
+        # commands are matched to the ids of their tasks before any temp ids are replaced
+        command_task_ids = {command.uuid: command.temp_id or command.args.get("id") for command in commands}
+        command_errors: dict[str, Any] = {}
+        try:
+            for i in range(0, len(commands), MAX_COMMANDS_PER_REQUEST):
+                batch = commands[i : i + MAX_COMMANDS_PER_REQUEST]
+                try:
+                    response = self._sync([self._resolve_command_ids(command) for command in batch])
+
+                except Exception as e:
+                    # we don't know which of these commands were applied, so the next sync needs to start
+                    # from scratch; earlier batches were applied, so they're kept
+                    with self._state.lock:
+                        self._state.reset()
+
+                    logging.error(f"Unable to send {len(commands) - i} command(s) to Todoist")
+                    logging.error(f"{type(e).__name__}: {e}")
+                    command_errors.update(dict.fromkeys([command.uuid for command in commands[i:]], str(e)))
+                    break
+
+                self._temp_id_mapping.update(response.temp_id_mapping)
+                command_errors.update(response.get_command_errors())
+
+        finally:
+            # the local task cache may contain temp ids, so we rebuild it from the sync state
+            self._project_tasks_cache.clear()
+
+        task_errors = {
+            task_id: error for uuid, error in command_errors.items() if (task_id := command_task_ids.get(uuid))
+        }
+
+        # failed commands won't trigger webhooks, so only the changes Todoist applied are expected
+        self._expected_changes.flush(
+            self.resolve_task_id, exclude_ids={self.resolve_task_id(task_id) for task_id in task_errors}
+        )
+
+        if command_errors:
+            logging.error(f"Todoist didn't apply {len(command_errors)} of {len(commands)} command(s)")
+            logging.error(command_errors)
+
+        return task_errors
+
+    def resolve_task_id(self, task_id: str) -> str:
+        return self._temp_id_mapping.get(task_id, task_id)
+
+
+def get_todoist_task_service(user: User) -> TodoistTaskService:
+    """Returns the configured Todoist task service"""
+
+    return TodoistSyncTaskService(user) if settings.todoist_use_sync_api else TodoistTaskService(user)
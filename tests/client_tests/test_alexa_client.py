@@ -1,9 +1,14 @@
 import random
+import time
 from typing import Any
 
+import pytest
+
+from AppLambda.src.app import settings
+from AppLambda.src.clients import aws
 from AppLambda.src.clients.alexa import ListManagerClient
 from AppLambda.src.models.alexa import AlexaListOut, AlexaReadList, Message, MessageRequest, ObjectType, Operation
-from tests.utils.generators import random_string
+from tests.utils.generators import random_int, random_string
 
 
 def create_message(
@@ -37,3 +42,83 @@ def test_alexa_list_manager_client_call_api(
     list_data = response[0]
     parsed_list = AlexaListOut.parse_obj(list_data)
     assert parsed_list == alexa_list
+
+
+def test_alexa_list_manager_client_wait_for_responses(
+    alexa_client: ListManagerClient, alexa_lists_with_items: list[AlexaListOut]
+):
+    user_id = random_string()
+    alexa_lists = random.sample(alexa_lists_with_items, random_int(2, 4))
+
+    # send all messages before waiting for any of them
+    event_ids: list[str] = []
+    for alexa_list in alexa_lists:
+        message = create_message(
+            Operation.read,
+            object_type=ObjectType.list,
+            object_data=AlexaReadList(list_id=alexa_list.list_id, state=alexa_list.state).dict(),
+        )
+        event_id = alexa_client.send_api_message(user_id, message)
+        assert event_id == message.event_id
+        event_ids.append(event_id)
+
+    responses = alexa_client.wait_for_responses(event_ids)
+    assert len(responses) == len(alexa_lists)
+    for event_id, alexa_list in zip(event_ids, alexa_lists, strict=True):
+        response = responses[event_id]
+        assert response
+        assert AlexaListOut.parse_obj(response[0]) == alexa_list
+
+    # messages without callbacks have nothing to wait for
+    message = create_message(Operation.read_all, object_type=ObjectType.list, send_callback=False)
+    assert alexa_client.send_api_message(user_id, message) is None
+
+
+def test_alexa_list_manager_client_poll_backoff(alexa_client: ListManagerClient, monkeypatch: pytest.MonkeyPatch):
+    event_id = random_string()
+    event = {"event_id": event_id}
+    polls_before_response = random_int(5, 8)
+    poll_responses: list[dict[str, Any] | None] = [None] * polls_before_response + [event]
+
+    consistent_reads: list[bool] = []
+
+    def mock_get(primary_key_value: str, consistent_read: bool = False):
+        assert primary_key_value == event_id
+        consistent_reads.append(consistent_read)
+        return poll_responses.pop(0)
+
+    sleeps: list[float] = []
+    monkeypatch.setattr(alexa_client.event_callback_db, "get", mock_get)
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+    monkeypatch.setattr(settings, "alexa_callback_poll_backoff_multiplier", 2)
+
+    initial_interval = 0.1
+    max_interval = 0.5
+    assert alexa_client._poll_for_event_response(event_id, initial_interval, max_interval, timeout=60) == event
+    assert all(consistent_reads)
+    assert len(sleeps) == polls_before_response
+
+    # the interval backs off exponentially (with jitter) until it reaches the max interval
+    interval = initial_interval
+    for sleep in sleeps:
+        assert interval / 2 <= sleep <= interval
+        interval = min(interval * 2, max_interval)
+
+
+def test_alexa_list_manager_client_poll_invocation_deadline(
+    alexa_client: ListManagerClient, monkeypatch: pytest.MonkeyPatch
+):
+    sleeps: list[float] = []
+    monkeypatch.setattr(alexa_client.event_callback_db, "get", lambda *args, **kwargs: None)
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+
+    # the invocation is about to time out, so we don't wait for the full timeout
+    aws.set_invocation_deadline(time.time() + settings.alexa_callback_poll_deadline_buffer_seconds)
+    try:
+        with pytest.raises(Exception, match="Timed out"):
+            alexa_client._poll_for_event_response(random_string(), timeout=60)
+
+    finally:
+        aws.set_invocation_deadline(None)
+
+    assert not sleeps
@@ -1,11 +1,18 @@
 import random
 from typing import Any
+from unittest import mock
 
 import pytest
 from botocore.exceptions import ClientError
 
 from AppLambda.src.app import settings
-from AppLambda.src.clients.aws import DynamoDB
+from AppLambda.src.clients import aws
+from AppLambda.src.clients.aws import (
+    BATCH_MAX_ATTEMPTS,
+    BATCH_MAX_RETRY_DELAY_SECONDS,
+    DynamoDB,
+    MissingPrimaryKeyError,
+)
 from AppLambda.src.models.aws import DynamoDBAtomicOp
 from tests.utils.generators import random_email, random_int, random_string
 
@@ -41,6 +48,87 @@ def test_get_item(user_client: DynamoDB):
         assert user["username"] == username
 
 
+def test_batch_get_items(user_client: DynamoDB):
+    usernames = [random_email() for _ in range(random_int(105, 120))]
+    for username in usernames:
+        user_client.put({"username": username})
+
+    # invalid and duplicate keys are ignored, and requests larger than the batch limit are split
+    response = user_client.batch_get(usernames + [random_email()] + usernames[:5], consistent_read=True)
+    assert len(response) == len(usernames)
+    assert set(user["username"] for user in response) == set(usernames)
+
+    assert not user_client.batch_get([random_email() for _ in range(random_int(3, 5))])
+
+
+def test_batch_write_items(user_client: DynamoDB):
+    usernames = [random_email() for _ in range(random_int(30, 40))]
+    user_client.batch_write(put_items=[{"username": username} for username in usernames])
+    assert len(user_client.batch_get(usernames, consistent_read=True)) == len(usernames)
+
+    # duplicate puts are collapsed, and keys which are put aren't deleted
+    deleted_usernames = usernames[: random_int(26, 29)]
+    user_client.batch_write(
+        put_items=[{"username": usernames[-1], "email": random_email()}, {"username": usernames[-1]}],
+        delete_primary_key_values=deleted_usernames + [usernames[-1]],
+    )
+
+    remaining_users = user_client.batch_get(usernames, consistent_read=True)
+    assert set(user["username"] for user in remaining_users) == set(usernames) - set(deleted_usernames)
+    assert "email" not in user_client.get(usernames[-1], consistent_read=True)  # type: ignore [operator]
+
+    with pytest.raises(MissingPrimaryKeyError):
+        user_client.batch_write(put_items=[{random_string(): random_string()}])
+
+
+@pytest.mark.parametrize("operation", ["batch_get_item", "batch_write_item"])
+def test_batch_retries_unprocessed_items(user_client: DynamoDB, operation: str):
+    usernames = [random_email() for _ in range(random_int(3, 5))]
+    for username in usernames:
+        user_client.put({"username": username})
+
+    process = getattr(aws._aws.ddb, operation)
+    unprocessed_key = "UnprocessedKeys" if operation == "batch_get_item" else "UnprocessedItems"
+    call_count = 0
+
+    # DynamoDB doesn't process anything until the third request
+    def stub(RequestItems: dict[str, Any]):
+        nonlocal call_count
+        call_count += 1
+        return process(RequestItems=RequestItems) if call_count > 2 else {unprocessed_key: RequestItems}
+
+    with mock.patch.object(aws._aws.ddb, operation, side_effect=stub), mock.patch.object(
+        aws.time, "sleep"
+    ) as mocked_sleep:
+        if operation == "batch_get_item":
+            assert len(user_client.batch_get(usernames, consistent_read=True)) == len(usernames)
+        else:
+            user_client.batch_write(delete_primary_key_values=usernames)
+            assert not user_client.batch_get(usernames, consistent_read=True)
+
+    # unprocessed items are only resent after a growing, capped delay
+    assert call_count == 3
+    assert mocked_sleep.call_count == 2
+    delays = [call.args[0] for call in mocked_sleep.call_args_list]
+    assert all(0 < delay <= BATCH_MAX_RETRY_DELAY_SECONDS for delay in delays)
+    assert delays[0] < delays[1]
+
+
+@pytest.mark.parametrize("operation", ["batch_get_item", "batch_write_item"])
+def test_batch_gives_up_on_unprocessed_items(user_client: DynamoDB, operation: str):
+    unprocessed_key = "UnprocessedKeys" if operation == "batch_get_item" else "UnprocessedItems"
+    with mock.patch.object(
+        aws._aws.ddb, operation, side_effect=lambda RequestItems: {unprocessed_key: RequestItems}
+    ) as mocked_operation, mock.patch.object(aws.time, "sleep"):
+        with pytest.raises(Exception):
+            if operation == "batch_get_item":
+                user_client.batch_get([random_email()])
+            else:
+                user_client.batch_write(put_items=[{"username": random_email()}])
+
+        assert mocked_operation.call_count == BATCH_MAX_ATTEMPTS
+
+
 def test_query_item_by_secondary_index(user_client: DynamoDB):
     secondary_index = random.choice(["alexa_user_id", "todoist_user_id"])
 
@@ -93,6 +181,28 @@ def test_put_new_item(user_client: DynamoDB):
     assert user_client.get(username)
 
 
+def test_update_item(user_client: DynamoDB):
+    username = random_email()
+    test_attr = random_string()
+
+    # updating a missing item creates it, and missing attributes are added to from 0
+    item = user_client.update(username, {"test_attr": test_attr}, add_attributes={"counter": 1})
+    assert item == {"username": username, "test_attr": test_attr, "counter": 1}
+    assert user_client.get(username) == item
+
+    # other attributes are left alone
+    increment = random_int(2, 10)
+    item = user_client.update(username, {}, add_attributes={"counter": increment})
+    assert item == {"username": username, "test_attr": test_attr, "counter": 1 + increment}
+
+    new_test_attr = random_string()
+    item = user_client.update(username, {"test_attr": new_test_attr})
+    assert item == {"username": username, "test_attr": new_test_attr, "counter": 1 + increment}
+
+    with pytest.raises(ValueError):
+        user_client.update(username, {})
+
+
 def test_put_existing_item(user_client: DynamoDB):
     username = random_email()
     first_test_attr = random_string()
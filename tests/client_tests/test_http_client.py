@@ -0,0 +1,92 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from typing import Generator
+
+import pytest
+
+from AppLambda.src.clients.http import HTTPSessionRegistry, TimeoutHTTPAdapter
+from tests.utils.generators import random_int, random_url
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    received_cookies: list[str | None] = []
+
+    def do_GET(self):
+        self.received_cookies.append(self.headers.get("Cookie"))
+
+        body = b"{}"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Set-Cookie", "session=some-user-session; Path=/")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args, **kwargs):
+        return
+
+
+@pytest.fixture()
+def local_server_url() -> Generator[str, None, None]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture()
+def registry() -> Generator[HTTPSessionRegistry, None, None]:
+    _registry = HTTPSessionRegistry(pool_connections=2, pool_maxsize=4, timeout=random_int(10, 20))
+    yield _registry
+    _registry.clear()
+
+
+def test_http_registry_shares_sessions_per_host(registry: HTTPSessionRegistry):
+    url = random_url()
+    other_url = random_url()
+
+    session = registry.get_session(url)
+    assert registry.get_session(url + "/some/path?query=value") is session
+    assert registry.get_session(url.upper()) is session
+    assert registry.get_session(other_url) is not session
+
+
+def test_http_registry_session_adapters(registry: HTTPSessionRegistry):
+    session = registry.get_session(random_url())
+    for prefix in ["https://", "http://"]:
+        adapter = session.get_adapter(prefix + "example.com")
+        assert isinstance(adapter, TimeoutHTTPAdapter)
+        assert adapter.timeout == registry.timeout
+        assert adapter._pool_maxsize == registry.pool_maxsize  # type: ignore [attr-defined]
+
+
+def test_http_registry_stats(registry: HTTPSessionRegistry, local_server_url: str):
+    request_count = random_int(3, 6)
+    session = registry.get_session(local_server_url)
+    for _ in range(request_count):
+        response = session.get(local_server_url)
+        response.raise_for_status()
+
+    stats = registry.get_stats()
+    assert len(stats) == 1
+
+    host_stats = stats[local_server_url]
+    assert host_stats.requests_sent == request_count
+    assert host_stats.connections_opened == 1
+    assert host_stats.connections_reused == request_count - 1
+
+
+def test_http_registry_sessions_ignore_cookies(registry: HTTPSessionRegistry, local_server_url: str):
+    _KeepAliveHandler.received_cookies.clear()
+    session = registry.get_session(local_server_url)
+    for _ in range(2):
+        response = session.get(local_server_url)
+        response.raise_for_status()
+
+    assert not session.cookies
+    assert _KeepAliveHandler.received_cookies == [None, None]
@@ -28,7 +28,7 @@ def test_mealie_client_is_valid(mealie_client: MealieClient):
     assert mealie_client.is_valid
 
     # reach into the mealie client and make its auth token invalid
-    mealie_client.client._client.headers["Authorization"] = f"Bearer {random_string()}"
+    mealie_client.client._headers["Authorization"] = f"Bearer {random_string()}"
     assert not mealie_client.is_valid
 
 
@@ -60,6 +60,23 @@ def test_mealie_client_get_all_records(
     assert all_records == record_store
 
 
+@pytest.mark.parametrize("per_page, max_concurrent_pages", [(1, 1), (3, 4), (7, 2), (10_000, 4)])
+def test_mealie_client_get_all_records_preserves_order(
+    mealie_server: MockMealieServer,
+    mealie_client: MealieClient,
+    mealie_foods: list[Food],
+    per_page: int,
+    max_concurrent_pages: int,
+):
+    assert mealie_foods  # pre-populate database
+    mealie_client.client.per_page = per_page
+    mealie_client.client.max_concurrent_pages = max_concurrent_pages
+
+    expected_food_ids = list(mealie_server.get_all_records(MockMealieDBKey.foods).keys())
+    food_ids = [food.id for food in mealie_client.get_all_foods()]
+    assert food_ids == expected_food_ids
+
+
 @pytest.mark.parametrize(
     "client_method, record_list_fixture",
     [
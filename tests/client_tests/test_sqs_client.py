@@ -0,0 +1,127 @@
+from typing import Any
+from unittest import mock
+
+import pytest
+
+from AppLambda.src.clients import aws
+from AppLambda.src.clients.aws import (
+    SQS_CHANGE_VISIBILITY_BATCH_MAX_MESSAGES,
+    SQS_SEND_BATCH_MAX_ATTEMPTS,
+    SQS_SEND_BATCH_MAX_BYTES,
+    SQS_SEND_BATCH_MAX_MESSAGES,
+    SQSFIFO,
+)
+from tests.utils.generators import random_int, random_string
+
+
+def _build_messages(count: int) -> list[tuple[str, str, str]]:
+    return [(random_string(), random_string(), random_string()) for _ in range(count)]
+
+
+def test_sqs_queues_are_reused():
+    queue_url = random_string()
+    assert aws._aws.get_sqs_queue(queue_url) is aws._aws.get_sqs_queue(queue_url)
+    assert aws._aws.get_sqs_queue(queue_url) is not aws._aws.get_sqs_queue(random_string())
+
+
+def test_send_message_batch():
+    messages = _build_messages(random_int(SQS_SEND_BATCH_MAX_MESSAGES * 2 + 1, SQS_SEND_BATCH_MAX_MESSAGES * 3))
+    sent_messages: list[tuple[str, str, str]] = []
+
+    # the first attempt of every batch fails for one message due to an SQS error
+    failed_batches: set[str] = set()
+
+    def send_messages(Entries: list[dict[str, Any]]):
+        failed_entry = Entries[-1]
+        if len(Entries) > 1 and failed_entry["MessageBody"] not in failed_batches:
+            failed_batches.add(failed_entry["MessageBody"])
+            Entries = Entries[:-1]
+            failed = [{"Id": failed_entry["Id"], "SenderFault": False, "Code": "InternalError"}]
+
+        else:
+            failed = []
+
+        assert len(Entries) <= SQS_SEND_BATCH_MAX_MESSAGES
+        for entry in Entries:
+            sent_messages.append((entry["MessageBody"], entry["MessageDeduplicationId"], entry["MessageGroupId"]))
+
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": failed}
+
+    with mock.patch.object(aws._aws, "get_sqs_queue") as mocked_get_sqs_queue, mock.patch.object(
+        aws.time, "sleep"
+    ) as mocked_sleep:
+        mocked_get_sqs_queue.return_value.send_messages.side_effect = send_messages
+        SQSFIFO(random_string()).send_message_batch(messages)
+
+    assert sorted(sent_messages) == sorted(messages)
+    assert len(failed_batches) == -(-len(messages) // SQS_SEND_BATCH_MAX_MESSAGES)
+
+    # failed messages are only resent after a delay
+    assert mocked_sleep.call_count == len(failed_batches)
+    assert all(call.args[0] > 0 for call in mocked_sleep.call_args_list)
+
+
+def test_send_message_batch_splits_by_size():
+    # only a few of these messages fit in a single request
+    message_size = SQS_SEND_BATCH_MAX_BYTES // random_int(3, 5) + 1
+    messages = [("x" * message_size, random_string(), random_string()) for _ in range(SQS_SEND_BATCH_MAX_MESSAGES)]
+    batches: list[list[dict[str, Any]]] = []
+
+    def send_messages(Entries: list[dict[str, Any]]):
+        batches.append(Entries)
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": []}
+
+    with mock.patch.object(aws._aws, "get_sqs_queue") as mocked_get_sqs_queue:
+        mocked_get_sqs_queue.return_value.send_messages.side_effect = send_messages
+        SQSFIFO(random_string()).send_message_batch(messages)
+
+    assert len(batches) > 1
+    assert sum(len(batch) for batch in batches) == len(messages)
+    for batch in batches:
+        assert sum(len(entry["MessageBody"].encode()) for entry in batch) <= SQS_SEND_BATCH_MAX_BYTES
+
+
+@pytest.mark.parametrize("sender_fault", [True, False])
+def test_send_message_batch_failures(sender_fault: bool):
+    messages = _build_messages(SQS_SEND_BATCH_MAX_MESSAGES)
+
+    def send_messages(Entries: list[dict[str, Any]]):
+        return {
+            "Successful": [{"Id": entry["Id"]} for entry in Entries[1:]],
+            "Failed": [{"Id": Entries[0]["Id"], "SenderFault": sender_fault, "Code": random_string()}],
+        }
+
+    with mock.patch.object(aws._aws, "get_sqs_queue") as mocked_get_sqs_queue, mock.patch.object(aws.time, "sleep"):
+        mocked_get_sqs_queue.return_value.send_messages.side_effect = send_messages
+        with pytest.raises(Exception):
+            SQSFIFO(random_string()).send_message_batch(messages)
+
+        # messages rejected because of the request itself aren't retried
+        send_count = mocked_get_sqs_queue.return_value.send_messages.call_count
+        assert send_count == (1 if sender_fault else SQS_SEND_BATCH_MAX_ATTEMPTS)
+
+
+@pytest.mark.parametrize("fail", [False, True])
+def test_change_message_visibility_batch(fail: bool):
+    receipt_handles = [random_string() for _ in range(random_int(SQS_CHANGE_VISIBILITY_BATCH_MAX_MESSAGES + 1, 25))]
+    visibility_timeout = random_int(1, 300)
+    changed_receipt_handles: list[str] = []
+
+    def change_message_visibility_batch(Entries: list[dict[str, Any]]):
+        assert len(Entries) <= SQS_CHANGE_VISIBILITY_BATCH_MAX_MESSAGES
+        for entry in Entries:
+            assert entry["VisibilityTimeout"] == visibility_timeout
+            changed_receipt_handles.append(entry["ReceiptHandle"])
+
+        failed = [{"Id": Entries[0]["Id"], "SenderFault": True, "Code": random_string()}] if fail else []
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": failed}
+
+    with mock.patch.object(aws._aws, "get_sqs_queue") as mocked_get_sqs_queue:
+        mocked_get_sqs_queue.return_value.change_message_visibility_batch.side_effect = change_message_visibility_batch
+        if fail:
+            with pytest.raises(Exception):
+                SQSFIFO(random_string()).change_message_visibility_batch(receipt_handles, visibility_timeout)
+
+        else:
+            SQSFIFO(random_string()).change_message_visibility_batch(receipt_handles, visibility_timeout)
+            assert changed_receipt_handles == receipt_handles
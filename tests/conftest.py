@@ -4,6 +4,7 @@ from pytest import MonkeyPatch
 
 
 from AppLambda.src.app import app, settings
+from AppLambda.src.routes import event_handlers
 from AppLambda.src.services.smtp import SMTPService
 
 from .fixtures import *
@@ -29,3 +30,11 @@ def api_client():
 def reset_config():
     settings.debug = True
     settings.use_whitelist = False
+    event_handlers._completed_syncs.clear()
+    event_handlers._debounced_events.clear()
+
+    # most sync tests verify item links through Mealie item extras
+    settings.item_links_mirror_to_extras = True
+
+    # most tests stand in for users by changing items with the app's own services, which would be ignored as echoes
+    settings.expected_changes_enabled = False
@@ -6,11 +6,14 @@ from fastapi.testclient import TestClient
 from requests import HTTPError
 
 from AppLambda.src.app import settings
-from AppLambda.src.models.alexa import ObjectType, Operation
+from AppLambda.src.models.alexa import AlexaListItemCreateIn, AlexaListItemUpdateBulkIn, ObjectType, Operation
 from AppLambda.src.routes import event_handlers
+from AppLambda.src.services import alexa as alexa_service
+from AppLambda.src.services.alexa import AlexaListService
 from tests.fixtures.clients.fixture_sqsfifo_client import MockSQSFIFO
 from tests.fixtures.fixture_users import MockLinkedUserAndData
 from tests.utils.event_handlers import build_alexa_list_event
+from tests.utils.generators import random_string
 from tests.utils.info import fully_qualified_name
 from tests.utils.users import get_auth_headers
 
@@ -34,6 +37,49 @@ def test_alexa_event_handler_send_to_queue(api_client: TestClient, user_data_wit
         assert mocked_sync_handler.called
 
 
+def test_alexa_event_handler_invalidates_list_shadow(
+    api_client: TestClient, user_data_with_items: MockLinkedUserAndData
+):
+    list_event = build_alexa_list_event(
+        Operation.update,
+        ObjectType.list_item,
+        list_id=user_data_with_items.alexa_list.list_id,
+        list_item_ids=[item.id for item in user_data_with_items.alexa_list.items or []],
+    )
+
+    with mock.patch(fully_qualified_name(AlexaListService.record_list_event)) as mocked_record_list_event:
+        response = api_client.post(
+            event_handlers.router.url_path_for("alexa_event_notification_handler"),
+            headers=get_auth_headers(user_data_with_items.user),
+            json=jsonable_encoder(list_event.dict()),
+        )
+        response.raise_for_status()
+        mocked_record_list_event.assert_called_once_with(list_event.list_id)
+
+
+def test_alexa_event_handler_keeps_list_shadow_for_expected_changes(
+    api_client: TestClient, user_data_with_items: MockLinkedUserAndData, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(settings, "expected_changes_enabled", True)
+    list_id = user_data_with_items.alexa_list.list_id
+    new_items = (
+        AlexaListService(user_data_with_items.user)
+        .create_list_items(list_id, [AlexaListItemCreateIn(value=random_string())])
+        .list_items
+    )
+
+    # our own changes are already applied to the shadow, so their echoes don't mark it as stale
+    list_event = build_alexa_list_event(Operation.create, ObjectType.list_item, list_id, [new_items[0].id])
+    with mock.patch(fully_qualified_name(AlexaListService.record_list_event)) as mocked_record_list_event:
+        response = api_client.post(
+            event_handlers.router.url_path_for("alexa_event_notification_handler"),
+            headers=get_auth_headers(user_data_with_items.user),
+            json=jsonable_encoder(list_event.dict()),
+        )
+        response.raise_for_status()
+        assert not mocked_record_list_event.called
+
+
 def test_alexa_event_handler_rate_limit(api_client: TestClient, user_data_with_items: MockLinkedUserAndData):
     assert user_data_with_items.alexa_list.items
 
@@ -54,3 +100,73 @@ def test_alexa_event_handler_rate_limit(api_client: TestClient, user_data_with_i
             response.raise_for_status()
 
     assert e_info.value.response.status_code == 429
+
+
+def test_alexa_event_handler_ignores_expected_changes(
+    api_client: TestClient, user_data_with_items: MockLinkedUserAndData, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(settings, "expected_changes_enabled", True)
+    alexa_list_service = AlexaListService(user_data_with_items.user)
+    list_id = user_data_with_items.alexa_list.list_id
+
+    def send_list_event(operation: Operation, list_item_ids: list[str]) -> bool:
+        list_event = build_alexa_list_event(operation, ObjectType.list_item, list_id, list_item_ids)
+        with mock.patch(fully_qualified_name(MockSQSFIFO.send_message)) as mocked_sync_handler:
+            response = api_client.post(
+                event_handlers.router.url_path_for("alexa_event_notification_handler"),
+                headers=get_auth_headers(user_data_with_items.user),
+                json=jsonable_encoder(list_event.dict()),
+            )
+            response.raise_for_status()
+            return mocked_sync_handler.called
+
+    new_items = alexa_list_service.create_list_items(
+        list_id, [AlexaListItemCreateIn(value=random_string()) for _ in range(3)]
+    ).list_items
+    new_item_ids = [item.id for item in new_items]
+
+    # each change we made ignores the first event it triggers
+    assert not send_list_event(Operation.create, new_item_ids)
+    assert send_list_event(Operation.create, new_item_ids)
+
+    # events which include changes we didn't make are synced
+    updated_items = alexa_list_service.update_list_items(
+        list_id, [new_items[0].cast(AlexaListItemUpdateBulkIn, value=random_string())]
+    ).list_items
+    assert send_list_event(Operation.update, [updated_items[0].id, new_items[1].id])
+    assert send_list_event(Operation.delete, [updated_items[0].id])
+
+    # an expected create never hides a later update to the same item
+    new_item = alexa_list_service.create_list_items(list_id, [AlexaListItemCreateIn(value=random_string())]).list_items[
+        0
+    ]
+    assert send_list_event(Operation.update, [new_item.id])
+
+    # changes which fail to reach Alexa are forgotten
+    with mock.patch.object(alexa_service.client, "call_api", side_effect=Exception()):
+        with pytest.raises(Exception):
+            alexa_list_service.update_list_items(
+                list_id, [new_items[2].cast(AlexaListItemUpdateBulkIn, value=random_string())]
+            )
+
+    assert send_list_event(Operation.update, [new_items[2].id])
+
+
+def test_alexa_event_handler_groups_by_list_map(api_client: TestClient, user_data_with_items: MockLinkedUserAndData):
+    list_event = build_alexa_list_event(
+        Operation.update,
+        ObjectType.list_item,
+        list_id=user_data_with_items.alexa_list.list_id,
+        list_item_ids=[item.id for item in user_data_with_items.alexa_list.items or []],
+    )
+
+    with mock.patch(fully_qualified_name(MockSQSFIFO.send_message)) as mocked_sync_handler:
+        response = api_client.post(
+            event_handlers.router.url_path_for("alexa_event_notification_handler"),
+            headers=get_auth_headers(user_data_with_items.user),
+            json=jsonable_encoder(list_event.dict()),
+        )
+        response.raise_for_status()
+
+    group_id = mocked_sync_handler.call_args.args[2]
+    assert group_id == "|".join([user_data_with_items.user.username, user_data_with_items.mealie_list.id])
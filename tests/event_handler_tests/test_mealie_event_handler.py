@@ -1,4 +1,6 @@
+from datetime import datetime
 from unittest import mock
+from uuid import uuid4
 
 import pytest
 from fastapi.encoders import jsonable_encoder
@@ -6,8 +8,12 @@ from fastapi.testclient import TestClient
 from requests import HTTPError
 
 from AppLambda.src.app import settings
-from AppLambda.src.models.mealie import MealieEventType
+from AppLambda.src.models.core import User
+from AppLambda.src.models import core
+from AppLambda.src.models.mealie import Label, MealieEventType, MealieSyncEvent
 from AppLambda.src.routes import event_handlers
+from AppLambda.src.services.mealie import MealieListService
+from tests.fixtures.databases.mealie.mock_mealie_database import MockMealieDBKey, MockMealieServer
 from tests.fixtures.clients.fixture_sqsfifo_client import MockSQSFIFO
 from tests.fixtures.fixture_users import MockLinkedUserAndData
 from tests.utils.event_handlers import build_mealie_event_notification
@@ -103,3 +109,82 @@ def test_mealie_event_handler_rate_limit(api_client: TestClient, user_data_with_
             response.raise_for_status()
 
     assert e_info.value.response.status_code == 429
+
+
+def test_mealie_event_handler_catalog_event_invalidates_cache(
+    api_client: TestClient,
+    user_linked: User,
+    mealie_list_service: MealieListService,
+    mealie_server: MockMealieServer,
+    mealie_labels: list[Label],
+):
+    user = user_linked
+    assert user.configuration.mealie
+    for label in mealie_labels:
+        assert label.name.lower() in mealie_list_service.label_store
+
+    # add a new label directly to Mealie; cached services shouldn't see it
+    new_label = Label(id=str(uuid4()), name=random_string(), color="#FFFFFF")
+    mealie_server._insert_one(MockMealieDBKey.labels, new_label.id, new_label.dict())
+    assert new_label.name not in MealieListService(user).label_store
+
+    event = build_mealie_event_notification(MealieEventType.label_created, "")
+    with mock.patch(fully_qualified_name(MockSQSFIFO.send_message)) as mocked_sync_handler:
+        params = {"username": user.username, "security_hash": user.configuration.mealie.security_hash}
+        response = api_client.post(
+            event_handlers.router.url_path_for("mealie_event_notification_handler"),
+            params=params,
+            json=jsonable_encoder(event.dict()),
+        )
+        response.raise_for_status()
+        assert not mocked_sync_handler.called
+
+    assert new_label.name in MealieListService(user).label_store
+
+
+def test_mealie_event_handler_debounces_events(
+    api_client: TestClient, user_data_with_items: MockLinkedUserAndData, monkeypatch: pytest.MonkeyPatch
+):
+    debounce_seconds = 60
+    monkeypatch.setattr(settings, "mealie_sync_debounce_seconds", debounce_seconds)
+
+    user = user_data_with_items.user
+    assert user.configuration.mealie
+    mealie_list_id = user_data_with_items.mealie_list.id
+    params = {"username": user.username, "security_hash": user.configuration.mealie.security_hash}
+
+    window_start = 1_000_000 * debounce_seconds
+    with mock.patch(fully_qualified_name(MockSQSFIFO.send_message)) as mocked_sync_handler, mock.patch.object(
+        core, "time"
+    ) as mocked_time:
+        # a burst of notifications in one window only queues one sync, which syncs the entire list when the window closes
+        for i in range(5):
+            mocked_time.time.return_value = window_start + i
+            event = build_mealie_event_notification(
+                MealieEventType.shopping_list_updated, mealie_list_id, item_ids=[random_string()]
+            )
+            response = api_client.post(
+                event_handlers.router.url_path_for("mealie_event_notification_handler"),
+                params=params,
+                json=jsonable_encoder(event.dict()),
+            )
+            response.raise_for_status()
+
+        assert mocked_sync_handler.call_count == 1
+        sync_event = MealieSyncEvent.parse_raw(mocked_sync_handler.call_args.args[0])
+        assert sync_event.is_full_sync
+        assert sync_event.not_before == datetime.utcfromtimestamp(window_start + debounce_seconds)
+        assert mocked_sync_handler.call_args.args[1] == sync_event.event_id
+
+        # the next window queues another sync
+        mocked_time.time.return_value = window_start + debounce_seconds
+        event = build_mealie_event_notification(MealieEventType.shopping_list_updated, mealie_list_id)
+        response = api_client.post(
+            event_handlers.router.url_path_for("mealie_event_notification_handler"),
+            params=params,
+            json=jsonable_encoder(event.dict()),
+        )
+        response.raise_for_status()
+
+        assert mocked_sync_handler.call_count == 2
+        assert mocked_sync_handler.call_args.args[1] != sync_event.event_id
@@ -6,8 +6,9 @@ from fastapi.testclient import TestClient
 from requests import HTTPError
 
 from AppLambda.src.app import settings
-from AppLambda.src.models.todoist import TodoistEventType
+from AppLambda.src.models.todoist import TodoistEventType, TodoistSyncResponse
 from AppLambda.src.routes import event_handlers
+from AppLambda.src.services.todoist import get_todoist_task_service
 from tests.fixtures.clients.fixture_sqsfifo_client import MockSQSFIFO
 from tests.fixtures.fixture_users import MockLinkedUserAndData
 from tests.utils.event_handlers import build_todoist_webhook, get_todoist_security_headers
@@ -82,3 +83,66 @@ def test_todoist_event_handler_rate_limit(api_client: TestClient, user_data_with
             response.raise_for_status()
 
     assert e_info.value.response.status_code == 429
+
+
+@pytest.mark.parametrize("use_sync_api", [False, True])
+def test_todoist_event_handler_ignores_expected_changes(
+    use_sync_api: bool,
+    api_client: TestClient,
+    user_data_with_items: MockLinkedUserAndData,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "expected_changes_enabled", True)
+    monkeypatch.setattr(settings, "todoist_use_sync_api", use_sync_api)
+
+    linked_user = user_data_with_items.user
+    project_id = user_data_with_items.todoist_data.project.id
+    assert linked_user.todoist_user_id
+
+    todoist_task_service = get_todoist_task_service(linked_user)
+    new_task = todoist_task_service.add_task(random_string(), project_id, labels=[random_string()])
+    todoist_task_service.flush()
+    task_id = todoist_task_service.resolve_task_id(new_task.id)
+
+    def send_webhook(event_type: TodoistEventType, item: dict) -> bool:
+        webhook = build_todoist_webhook(event_type, linked_user.todoist_user_id or "", project_id, item)
+        with mock.patch(fully_qualified_name(MockSQSFIFO.send_message)) as mocked_sync_handler:
+            response = api_client.post(
+                event_handlers.router.url_path_for("todoist_event_notification_handler"),
+                headers=get_todoist_security_headers(webhook),
+                json=jsonable_encoder(webhook.dict()),
+            )
+            response.raise_for_status()
+            return mocked_sync_handler.called
+
+    # webhooks for the task we added are ignored, even if they're delivered more than once
+    item = {
+        "id": task_id,
+        "project_id": project_id,
+        "content": new_task.content,
+        "labels": new_task.labels,
+        "section_id": None,
+        "checked": False,
+    }
+    for _ in range(2):
+        assert not send_webhook(TodoistEventType.item_added, item)
+
+    # changes we didn't make are synced
+    assert send_webhook(TodoistEventType.item_updated, item | {"content": random_string()})
+    assert send_webhook(TodoistEventType.item_completed, item)
+
+    if not use_sync_api:
+        return
+
+    # changes Todoist rejects aren't expected, so the same change made by the user is synced
+    task = todoist_task_service.get_task(task_id, project_id)
+    assert task
+    with mock.patch.object(
+        TodoistSyncResponse,
+        "get_command_errors",
+        lambda self: {uuid: {"error": random_string()} for uuid in self.sync_status},
+    ):
+        todoist_task_service.close_task(task)
+        assert task.id in todoist_task_service.flush()
+
+    assert send_webhook(TodoistEventType.item_completed, item | {"checked": True})
@@ -31,6 +31,18 @@ class MockSQSFIFO:
         else:
             raise NotImplementedError(f"unsupported queue url {self.queue_url}")
 
+    def send_message_batch(self, messages: list[tuple[str, str, str]]) -> None:
+        if self.queue_url == settings.sync_event_dev_sqs_queue_name or settings.sync_event_sqs_queue_name:
+            self.api_client.post(
+                event_handlers.router.url_path_for("sqs_sync_event_handler"),
+                json={"Records": [self._build_message(content).dict() for content, *_ in messages]},
+            )
+        else:
+            raise NotImplementedError(f"unsupported queue url {self.queue_url}")
+
+    def change_message_visibility_batch(self, receipt_handles: list[str], visibility_timeout: int) -> None:
+        pass
+
 
 @pytest.fixture(scope="session", autouse=True)
 def mock_sqs_fifo_client():
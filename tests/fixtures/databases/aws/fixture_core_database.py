@@ -58,6 +58,38 @@ def inject_mock_database():
             ],
             BillingMode="PAY_PER_REQUEST",
         )
+        ddb_resource.create_table(
+            TableName=settings.alexa_list_shadow_tablename,
+            KeySchema=[{"AttributeName": settings.alexa_list_shadow_pk, "KeyType": "HASH"}],
+            AttributeDefinitions=[
+                {"AttributeName": settings.alexa_list_shadow_pk, "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        ddb_resource.create_table(
+            TableName=settings.item_links_tablename,
+            KeySchema=[{"AttributeName": settings.item_links_pk, "KeyType": "HASH"}],
+            AttributeDefinitions=[
+                {"AttributeName": settings.item_links_pk, "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        ddb_resource.create_table(
+            TableName=settings.sync_fingerprints_tablename,
+            KeySchema=[{"AttributeName": settings.sync_fingerprints_pk, "KeyType": "HASH"}],
+            AttributeDefinitions=[
+                {"AttributeName": settings.sync_fingerprints_pk, "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        ddb_resource.create_table(
+            TableName=settings.expected_changes_tablename,
+            KeySchema=[{"AttributeName": settings.expected_changes_pk, "KeyType": "HASH"}],
+            AttributeDefinitions=[
+                {"AttributeName": settings.expected_changes_pk, "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
         yield
 
     # reset AWS services during teardown
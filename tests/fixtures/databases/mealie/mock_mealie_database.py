@@ -147,13 +147,20 @@ class MockMealieServer:
         return self._get_one(MockMealieDBKey.notifiers, id_or_url)
 
     def _get_all_shopping_list_items(
-        self, shopping_list_id: str, include_checked: bool, params: dict[str, Any]
+        self,
+        shopping_list_id: str,
+        include_checked: bool,
+        params: dict[str, Any],
+        item_ids: list[str] | None = None,
     ) -> dict[str, Any]:
         shopping_list = self._get_one(MockMealieDBKey.shopping_lists, shopping_list_id)
         list_items = cast(list[dict[str, Any]], shopping_list["list_items"])
         if not include_checked:
             list_items = [li for li in list_items if not li["checked"]]
 
+        if item_ids is not None:
+            list_items = [li for li in list_items if li["id"] in item_ids]
+
         return self._paginate(list_items, params).dict()
 
     def _create_shopping_list_item(self, payload: dict[str, Any]) -> dict[str, Any]:
@@ -341,8 +348,14 @@ class MockMealieServer:
                     assert "queryFilter" in params
                     shopping_list_id: str | None = None
                     include_checked = True
+                    item_ids: list[str] | None = None
+
+                    query_filter = cast(str, params["queryFilter"])
+                    if ids_match := re.search(r"\bid IN \[(.*?)\]", query_filter):
+                        item_ids = re.findall(r'"([^"]+)"', ids_match.group(1))
+                        query_filter = query_filter.replace(ids_match.group(0), "")
 
-                    filters = cast(list[str], params["queryFilter"].split())
+                    filters = query_filter.split()
                     for filter in filters:
                         if "shopping_list_id" in filter:
                             shopping_list_id = filter.split("=")[-1]
@@ -351,7 +364,7 @@ class MockMealieServer:
                             include_checked = filter.split("=")[-1].lower()[0] == "t"
 
                     assert shopping_list_id
-                    data = self._get_all_shopping_list_items(shopping_list_id, include_checked, params)
+                    data = self._get_all_shopping_list_items(shopping_list_id, include_checked, params, item_ids)
 
                 elif method == "PUT":
                     assert isinstance(payload, list)
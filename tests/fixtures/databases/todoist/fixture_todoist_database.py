@@ -4,11 +4,13 @@ import pytest
 from pytest import MonkeyPatch
 from todoist_api_python.models import Project, Section, Task
 
+from AppLambda.src.handlers import todoist as todoist_handlers
 from AppLambda.src.routes import account_linking
+from AppLambda.src.services import todoist
 from AppLambda.src.services.todoist import TodoistTaskService
 from tests.utils.generators import random_bool, random_string, random_url
 
-from .mock_todoist_api import MockTodoistAPI, _mock_todoist_server
+from .mock_todoist_api import MockTodoistAPI, MockTodoistSyncClient, _mock_todoist_server
 from .mock_todoist_database import MockTodoistDBKey, MockTodoistServer
 
 
@@ -150,10 +152,14 @@ def mock_todoist_api():
 
     mp = MonkeyPatch()
     mp.setattr(account_linking, "_get_todoist_client", mock_lambda)
-    mp.setattr(TodoistTaskService, "_get_client", mock_lambda)
+    mp.setattr(TodoistTaskService, "_get_client", lambda *args, **kwargs: MockTodoistAPI(args[-1]))
+    mp.setattr(TodoistTaskService, "_get_sync_client", lambda *args, **kwargs: MockTodoistSyncClient(args[-1]))
 
 
 @pytest.fixture(autouse=True)
 def clean_up_database():
     yield
     _mock_todoist_server._clear_db()
+    todoist._sync_states.clear()
+    todoist._section_catalog_cache.clear()
+    todoist_handlers._reconciled_projects.clear()
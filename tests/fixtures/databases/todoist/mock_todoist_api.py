@@ -1,8 +1,10 @@
 from datetime import datetime
+from typing import Any
 
 from requests import HTTPError
 from todoist_api_python.models import Project, Section, Task
 
+from AppLambda.src.models.todoist import TodoistSyncCommand, TodoistSyncResponse
 from tests.utils.generators import random_url
 
 from .mock_todoist_database import MockTodoistDBKey, MockTodoistServer
@@ -88,7 +90,9 @@ class MockTodoistAPI:
 
     def update_task(self, task_id: str, allow_protected_fields=False, **kwargs) -> bool:
         try:
-            existing_task = self.get_task(task_id)
+            existing_task: Task = _mock_todoist_server._assert(
+                _mock_todoist_server._get_one(MockTodoistDBKey.tasks, task_id)
+            )
             for k, v in kwargs.items():
                 if not allow_protected_fields:
                     assert k not in [
@@ -104,6 +108,8 @@ class MockTodoistAPI:
                         "section_id",
                     ]
                 setattr(existing_task, k, v)
+
+            _mock_todoist_server._update_one(MockTodoistDBKey.tasks, existing_task)
         except HTTPError:
             return False
 
@@ -119,3 +125,115 @@ class MockTodoistAPI:
             return False
 
         return True
+
+
+class MockTodoistSyncClient:
+    def __init__(self, token: str, *args, **kwargs) -> None:
+        self.token = token
+        self.api = MockTodoistAPI(token)
+        self.requests: list[list[TodoistSyncCommand]] = []
+        """the commands sent in each request"""
+
+    @classmethod
+    def _task_to_item(cls, task: Task) -> dict[str, Any]:
+        return {
+            "id": task.id,
+            "project_id": task.project_id,
+            "section_id": task.section_id,
+            "content": task.content,
+            "description": task.description,
+            "labels": task.labels,
+            "checked": task.is_completed,
+            "is_deleted": False,
+            "child_order": task.order,
+            "priority": task.priority,
+            "added_at": task.created_at,
+            "added_by_uid": task.creator_id,
+            "assigned_by_uid": task.assigner_id,
+            "responsible_uid": task.assignee_id,
+            "parent_id": task.parent_id,
+            "due": task.due.to_dict() if task.due else None,
+            "url": task.url,
+        }
+
+    @classmethod
+    def _section_to_dict(cls, section: Section) -> dict[str, Any]:
+        return {
+            "id": section.id,
+            "name": section.name,
+            "project_id": section.project_id,
+            "section_order": section.order,
+            "is_deleted": False,
+            "is_archived": False,
+        }
+
+    def _execute_command(self, command: TodoistSyncCommand, temp_id_mapping: dict[str, str]) -> None:
+        args = {k: temp_id_mapping.get(v, v) if isinstance(v, str) else v for k, v in command.args.items()}
+        if command.type == "item_add":
+            new_task = self.api.add_task(**args)
+            temp_id_mapping[command.temp_id or ""] = new_task.id
+
+        elif command.type == "item_update":
+            self.api.update_task(args.pop("id"), **args)
+
+        elif command.type == "item_move":
+            # moving to a project (rather than a section) moves the task out of its section
+            self.api.update_task(args["id"], allow_protected_fields=True, section_id=args.get("section_id"))
+
+        elif command.type == "item_close":
+            self.api.close_task(args["id"])
+
+        elif command.type == "section_add":
+            new_section = self.api.add_section(**args)
+            temp_id_mapping[command.temp_id or ""] = new_section.id
+
+        else:
+            raise NotImplementedError(command.type)
+
+    def sync(
+        self,
+        sync_token: str = "*",
+        resource_types: list[str] | None = None,
+        commands: list[TodoistSyncCommand] | None = None,
+    ) -> TodoistSyncResponse:
+        self.requests.append(commands or [])
+
+        temp_id_mapping: dict[str, str] = {}
+        sync_status: dict[str, Any] = {}
+        for command in commands or []:
+            try:
+                self._execute_command(command, temp_id_mapping)
+                sync_status[command.uuid] = "ok"
+
+            except HTTPError as e:
+                sync_status[command.uuid] = {"error": "mock error", "http_code": e.response.status_code}
+
+        full_sync = sync_token == "*"
+        last_change = -1 if full_sync else int(sync_token)
+        changed_keys = [key for key, change in _mock_todoist_server.changes.items() if change > last_change]
+
+        items: list[dict[str, Any]] = []
+        sections: list[dict[str, Any]] = []
+        for db_key, id in changed_keys:
+            if (db_key, id) in _mock_todoist_server.deleted:
+                if not full_sync:
+                    deleted_data = {"id": id, "is_deleted": True}
+                    (items if db_key is MockTodoistDBKey.tasks else sections).append(deleted_data)
+
+                continue
+
+            obj = _mock_todoist_server._get_one(db_key, id)
+            if db_key is MockTodoistDBKey.tasks:
+                items.append(self._task_to_item(obj))
+
+            elif db_key is MockTodoistDBKey.sections:
+                sections.append(self._section_to_dict(obj))
+
+        return TodoistSyncResponse(
+            sync_token=str(_mock_todoist_server.change_counter),
+            full_sync=full_sync,
+            items=items if "items" in (resource_types or []) else [],
+            sections=sections if "sections" in (resource_types or []) else [],
+            sync_status=sync_status,
+            temp_id_mapping=temp_id_mapping,
+        )
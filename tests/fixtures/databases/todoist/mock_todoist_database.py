@@ -21,6 +21,13 @@ class MockTodoistServer:
     def __init__(self) -> None:
         self.db: defaultdict[MockTodoistDBKey, dict[str, Any]] = defaultdict(dict[str, Any])
 
+        # track changes so the mock Sync API can return incremental updates
+        self.change_counter = 0
+        self.changes: dict[tuple[MockTodoistDBKey, str], int] = {}
+        """map of {(key, id): change counter when last changed}"""
+
+        self.deleted: set[tuple[MockTodoistDBKey, str]] = set()
+
         # all Todoist instances start with an inbox project
         inbox_project: Project = self._add_one(
             MockTodoistDBKey.projects,
@@ -60,12 +67,19 @@ class MockTodoistServer:
 
         return data
 
+    def _record_change(self, key: MockTodoistDBKey, id: str) -> None:
+        self.change_counter += 1
+        self.changes[(key, id)] = self.change_counter
+
     def _clear_db(self) -> None:
         # preserve the default inbox project
         inbox_project = self.db[MockTodoistDBKey.projects][self.inbox_project_id]
         self.db.clear()
         self.db[MockTodoistDBKey.projects][self.inbox_project_id] = inbox_project
 
+        self.changes.clear()
+        self.deleted.clear()
+
     def _get_all(self, key: MockTodoistDBKey) -> list[Any]:
         return list(self.db[key].values())
 
@@ -81,13 +95,17 @@ class MockTodoistServer:
         new_obj = klass.from_dict(data)  # type: ignore
 
         self.db[key][id] = new_obj
+        self._record_change(key, id)
         return new_obj
 
     def _update_one(self, key: MockTodoistDBKey, obj: Any) -> None:
         assert isinstance(obj, self._get_class_from_db_key(key))
         id = getattr(obj, "id")
         self.db[key][id] = obj
+        self._record_change(key, id)
 
     def _delete_one(self, key: MockTodoistDBKey, id: str) -> None:
         self._assert(self._get_one(key, id))
         self.db[key].pop(id)
+        self.deleted.add((key, id))
+        self._record_change(key, id)
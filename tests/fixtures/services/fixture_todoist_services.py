@@ -2,7 +2,7 @@ import pytest
 
 from AppLambda.src.models.account_linking import UserTodoistConfigurationUpdate
 from AppLambda.src.models.core import User
-from AppLambda.src.services.todoist import TodoistTaskService
+from AppLambda.src.services.todoist import TodoistSyncTaskService, TodoistTaskService
 from tests.utils.users import update_todoist_config
 
 
@@ -43,3 +43,16 @@ def todoist_task_service_use_sections_and_descriptions(user_linked: User):
     service = TodoistTaskService(user)
     yield service
     service._clear_cache()
+
+
+@pytest.fixture()
+def todoist_sync_task_service(user_linked: User):
+    assert user_linked.configuration.todoist
+    config = user_linked.configuration.todoist.cast(UserTodoistConfigurationUpdate)
+    config.map_labels_to_sections = True
+    config.add_recipes_to_task_description = True
+
+    user = update_todoist_config(user_linked, config)
+    service = TodoistSyncTaskService(user)
+    yield service
+    service._clear_cache()
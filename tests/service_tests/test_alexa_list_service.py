@@ -1,11 +1,14 @@
 import random
+from unittest import mock
 
 import pytest
 
+from AppLambda.src.app import settings
 from AppLambda.src.models.account_linking import NotLinkedError
 from AppLambda.src.models.alexa import AlexaListItemCreateIn, AlexaListItemOut, AlexaListItemUpdateBulkIn, AlexaListOut
 from AppLambda.src.models.core import User
 from AppLambda.src.services.alexa import AlexaListService
+from AppLambda.src.services.alexa import client as alexa_client
 from tests.utils.generators import random_int, random_string
 
 # TODO: verify service list cache is properly maintained for all operations
@@ -88,6 +91,40 @@ def test_alexa_list_service_get_list_item_cache(
     assert cached_item is not fetched_item
 
 
+def test_alexa_list_service_list_items_view(
+    alexa_list_service: AlexaListService, alexa_lists_with_items: list[AlexaListOut]
+):
+    alexa_list = random.choice(alexa_lists_with_items)
+    assert alexa_list.items
+
+    # views share items with the cache rather than copying them
+    items_view = alexa_list_service.get_list_items_view(alexa_list.list_id)
+    cached_list = alexa_list_service._list_cache[alexa_list.list_id]
+    assert cached_list.items
+    assert list(items_view) == alexa_list.items
+    for view_item, cached_item in zip(items_view, cached_list.items):
+        assert view_item is cached_item
+
+    alexa_item = random.choice(items_view)
+    assert alexa_list_service.get_list_item_view(alexa_list.list_id, alexa_item.id) is alexa_item
+
+    # checked out items can be mutated without modifying the cache
+    original_value = alexa_item.value
+    checked_out_item = alexa_list_service.checkout_list_item(alexa_item)
+    checked_out_item.value = random_string()
+    assert alexa_item.value == original_value
+
+    # updates replace cached items, so existing views are unchanged
+    alexa_list_service.update_list_items(
+        alexa_list.list_id, [AlexaListItemUpdateBulkIn(id=alexa_item.id, value=random_string())]
+    )
+    assert alexa_item.value == original_value
+    updated_item = alexa_list_service.get_list_item_view(alexa_list.list_id, alexa_item.id)
+    assert updated_item
+    assert updated_item is not alexa_item
+    assert updated_item.value != original_value
+
+
 def test_alexa_list_service_get_invalid_list_item(
     alexa_list_service: AlexaListService, alexa_lists_with_items: list[AlexaListOut]
 ):
@@ -180,6 +217,37 @@ def test_alexa_list_service_update_list_items(
             assert fetched_item in original_list.items
 
 
+def test_alexa_list_service_update_and_create_list_items(
+    alexa_list_service: AlexaListService, alexa_lists_with_items: list[AlexaListOut]
+):
+    original_list = random.choice(alexa_lists_with_items)
+    assert original_list.items
+    items_to_update = [
+        AlexaListItemUpdateBulkIn(id=original_item.id, value=random_string())
+        for original_item in random.sample(original_list.items, 5)
+    ]
+    items_to_create = [AlexaListItemCreateIn(value=random_string()) for _ in range(random_int(10, 20))]
+
+    updated_items, new_items = alexa_list_service.update_and_create_list_items(
+        original_list.list_id, items_to_update, items_to_create
+    )
+    values_by_id = {item.id: item.value for item in items_to_update}
+    assert {item.id: item.value for item in updated_items.list_items} == values_by_id
+    assert [item.value for item in new_items.list_items] == [item.value for item in items_to_create]
+
+    # both the updated and created items are persisted
+    alexa_list_service._clear_cache()
+    fetched_list = alexa_list_service.get_list(original_list.list_id)
+    assert fetched_list.items
+    fetched_items_by_id = {item.id: item for item in fetched_list.items}
+    for item in updated_items.list_items + new_items.list_items:
+        assert fetched_items_by_id[item.id].value == item.value
+
+    # nothing to update or create is a no-op
+    updated_items, new_items = alexa_list_service.update_and_create_list_items(original_list.list_id, [], [])
+    assert not (updated_items.list_items or new_items.list_items)
+
+
 def test_alexa_list_service_update_list_items_cache(
     alexa_list_service: AlexaListService, alexa_lists_with_items: list[AlexaListOut]
 ):
@@ -203,3 +271,59 @@ def test_alexa_list_service_update_list_items_cache(
 
         assert cached_item
         assert cached_item is not updated_item
+
+
+def test_alexa_list_service_list_shadow(
+    alexa_list_service: AlexaListService, alexa_lists_with_items: list[AlexaListOut], monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(settings, "alexa_list_shadow_enabled", True)
+    alexa_list = random.choice(alexa_lists_with_items)
+
+    # the first read comes from Alexa and populates the shadow
+    with mock.patch.object(alexa_client, "call_api", wraps=alexa_client.call_api) as mocked_call_api:
+        assert alexa_list_service.get_list(alexa_list.list_id) == alexa_list
+        assert mocked_call_api.call_count == 1
+
+        # subsequent reads are served from the shadow
+        alexa_list_service._clear_cache()
+        assert alexa_list_service.get_list(alexa_list.list_id) == alexa_list
+        assert mocked_call_api.call_count == 1
+
+        # our own writes are applied to the shadow
+        new_items = alexa_list_service.create_list_items(
+            alexa_list.list_id, [AlexaListItemCreateIn(value=random_string())]
+        ).list_items
+        assert mocked_call_api.call_count == 2
+
+        alexa_list_service._clear_cache()
+        shadow_list = alexa_list_service.get_list(alexa_list.list_id)
+        assert mocked_call_api.call_count == 2
+        assert shadow_list.items
+        assert new_items[0] in shadow_list.items
+
+        # a list event from Alexa means the shadow may be stale, so we go back to Alexa
+        AlexaListService.record_list_event(alexa_list.list_id)
+        alexa_list_service._clear_cache()
+        alexa_list_service.get_list(alexa_list.list_id)
+        assert mocked_call_api.call_count == 3
+
+        # shadows which are too old are also refreshed
+        monkeypatch.setattr(settings, "alexa_list_shadow_max_age_seconds", 0)
+        alexa_list_service._clear_cache()
+        alexa_list_service.get_list(alexa_list.list_id)
+        assert mocked_call_api.call_count == 4
+
+
+def test_alexa_list_service_list_shadow_other_user(
+    alexa_list_service: AlexaListService, alexa_lists_with_items: list[AlexaListOut], monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(settings, "alexa_list_shadow_enabled", True)
+    alexa_list = random.choice(alexa_lists_with_items)
+    alexa_list_service.get_list(alexa_list.list_id)
+
+    # shadows are only served to the user who owns the list
+    alexa_list_service._clear_cache()
+    alexa_list_service.user_id = random_string()
+    with mock.patch.object(alexa_client, "call_api", wraps=alexa_client.call_api) as mocked_call_api:
+        alexa_list_service.get_list(alexa_list.list_id)
+        assert mocked_call_api.call_count == 1
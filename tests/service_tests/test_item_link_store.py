@@ -0,0 +1,95 @@
+from unittest import mock
+
+import pytest
+
+from AppLambda.src.app import settings
+from AppLambda.src.models.core import Source
+from AppLambda.src.services import item_links
+from AppLambda.src.services.item_links import ItemLinkStore
+from tests.utils.generators import random_int, random_string
+
+
+def _build_store(username: str, mealie_list_id: str) -> ItemLinkStore:
+    return ItemLinkStore(username, mealie_list_id, Source.todoist)
+
+
+def test_item_link_store_lookups():
+    username = random_string()
+    mealie_list_id = random_string()
+    links = {random_string(): random_string() for _ in range(random_int(30, 40))}
+
+    store = _build_store(username, mealie_list_id)
+    for mealie_item_id, linked_id in links.items():
+        store.link(mealie_item_id, linked_id, linked_version="1")
+
+    store.flush()
+
+    # links can be found in both directions by a new store, with one batched read
+    store = _build_store(username, mealie_list_id)
+    with mock.patch.object(item_links.links_db, "batch_get", wraps=item_links.links_db.batch_get) as batch_get:
+        store.load(mealie_item_ids=list(links), linked_ids=list(links.values()))
+        for mealie_item_id, linked_id in links.items():
+            mealie_link = store.get_by_mealie_item_id(mealie_item_id)
+            assert mealie_link and mealie_link.linked_id == linked_id and mealie_link.linked_version == "1"
+
+            linked_link = store.get_by_linked_id(linked_id)
+            assert linked_link and linked_link.mealie_item_id == mealie_item_id
+
+        assert not store.get_by_mealie_item_id(random_string())
+        assert batch_get.call_count == 2
+
+    # links are scoped to the user's list and system
+    assert not _build_store(username, random_string()).get_by_mealie_item_id(next(iter(links)))
+    other_system_store = ItemLinkStore(username, mealie_list_id, Source.alexa)
+    assert not other_system_store.get_by_mealie_item_id(next(iter(links)))
+
+
+def test_item_link_store_relink_and_unlink():
+    username = random_string()
+    mealie_list_id = random_string()
+    mealie_item_id, original_linked_id, new_linked_id = random_string(), random_string(), random_string()
+    unlinked_mealie_item_id, unlinked_id = random_string(), random_string()
+
+    store = _build_store(username, mealie_list_id)
+    store.link(mealie_item_id, original_linked_id)
+    store.link(unlinked_mealie_item_id, unlinked_id)
+    store.flush()
+
+    # relinking an item removes the reverse side of its original link
+    store = _build_store(username, mealie_list_id)
+    store.link(mealie_item_id, new_linked_id)
+    store.unlink(linked_id=unlinked_id)
+    store.flush()
+
+    store = _build_store(username, mealie_list_id)
+    mealie_link = store.get_by_mealie_item_id(mealie_item_id)
+    assert mealie_link and mealie_link.linked_id == new_linked_id
+    assert not store.get_by_linked_id(original_linked_id)
+
+    assert not store.get_by_mealie_item_id(unlinked_mealie_item_id)
+    assert not store.get_by_linked_id(unlinked_id)
+
+    # links which haven't changed aren't written again
+    with mock.patch.object(item_links.links_db, "batch_write") as batch_write:
+        store.link(mealie_item_id, new_linked_id)
+        store.flush()
+        assert not batch_write.called
+
+
+def test_item_link_store_keeps_changes_which_cant_be_written(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, "debug", False)
+    username = random_string()
+    mealie_list_id = random_string()
+    mealie_item_id, linked_id = random_string(), random_string()
+
+    store = _build_store(username, mealie_list_id)
+    store.link(mealie_item_id, linked_id)
+    with mock.patch.object(item_links.links_db, "batch_write", side_effect=Exception()):
+        assert not store.flush()
+
+    assert not _build_store(username, mealie_list_id).get_by_mealie_item_id(mealie_item_id)
+
+    # the changes are written by the next flush
+    assert store.flush()
+    link = _build_store(username, mealie_list_id).get_by_mealie_item_id(mealie_item_id)
+    assert link and link.linked_id == linked_id
@@ -1,7 +1,10 @@
 import random
 from typing import Callable, Type
+from unittest import mock
+from uuid import uuid4
 
 import pytest
+from fuzzywuzzy import process
 
 from AppLambda.src.models.account_linking import NotLinkedError
 from AppLambda.src.models.core import User
@@ -16,7 +19,7 @@ from AppLambda.src.models.mealie import (
     MealieShoppingListItemUpdateBulk,
     MealieShoppingListOut,
 )
-from AppLambda.src.services.mealie import MealieListService
+from AppLambda.src.services.mealie import FoodMatcher, MealieListService
 from tests.fixtures.databases.mealie.mock_mealie_database import MockMealieDBKey, MockMealieServer
 from tests.utils.generators import random_int, random_string
 
@@ -221,6 +224,44 @@ def test_mealie_list_service_get_all_list_items_cache(
         assert fetched_item is not cached_item
 
 
+def test_mealie_list_service_get_all_list_items_view(
+    mealie_list_service: MealieListService, mealie_shopping_lists: list[MealieShoppingListOut]
+):
+    mealie_list = random.choice(mealie_shopping_lists)
+    assert mealie_list.list_items
+
+    # views share items with the cache rather than copying them
+    items_view = mealie_list_service.get_all_list_items_view(mealie_list.id)
+    cached_items = mealie_list_service._list_items_cache[mealie_list.id]
+    assert len(items_view) == len(cached_items)
+    for view_item, cached_item in zip(items_view, cached_items):
+        assert view_item is cached_item
+
+    mealie_item = random.choice(items_view)
+    assert mealie_list_service.get_item_view(mealie_list.id, mealie_item.id) is mealie_item
+
+    # views are read-only, so they can't modify the cache
+    original_note = mealie_item.note
+    with pytest.raises(TypeError):
+        mealie_item.note = random_string()
+
+    assert mealie_item.note == original_note
+
+    # checked out items can be mutated without modifying the cache
+    checked_out_item = mealie_list_service.checkout_item(mealie_item)
+    checked_out_item.note = random_string()
+    assert type(checked_out_item) is MealieShoppingListItemOut
+    assert mealie_item.note == original_note
+
+    # updates replace cached items, so existing views are unchanged
+    mealie_list_service.update_items([checked_out_item.cast(MealieShoppingListItemUpdateBulk)])
+    assert mealie_item.note == original_note
+    updated_item = mealie_list_service.get_item_view(mealie_list.id, mealie_item.id)
+    assert updated_item
+    assert updated_item is not mealie_item
+    assert updated_item.note == checked_out_item.note
+
+
 def test_mealie_list_service_get_item(
     mealie_list_service: MealieListService, mealie_shopping_lists: list[MealieShoppingListOut]
 ):
@@ -264,6 +305,30 @@ def test_mealie_list_service_get_item_cache(
     assert cached_item is not fetched_item
 
 
+def test_mealie_list_service_get_list_items_view_by_ids(
+    mealie_list_service: MealieListService,
+    mealie_shopping_lists: list[MealieShoppingListOut],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    mealie_list = random.choice(mealie_shopping_lists)
+    assert mealie_list.list_items
+    mealie_items = random.sample(mealie_list.list_items, random_int(2, min(5, len(mealie_list.list_items))))
+    item_ids = [item.id for item in mealie_items]
+
+    # items are fetched without fetching (or caching) the rest of the list; unknown ids are omitted
+    fetched_items = mealie_list_service.get_list_items_view_by_ids(mealie_list.id, item_ids + [random_string()])
+    assert [item.id for item in fetched_items] == item_ids
+    assert mealie_list.id not in mealie_list_service._list_items_cache
+    assert mealie_list_service.get_item_view(mealie_list.id, item_ids[0]) is fetched_items[0]
+    assert mealie_list.id not in mealie_list_service._list_items_cache
+
+    # items are only fetched once
+    monkeypatch.setattr(
+        mealie_list_service._client, "get_shopping_list_items_by_ids", mock.Mock(side_effect=Exception())
+    )
+    assert mealie_list_service.get_list_items_view_by_ids(mealie_list.id, item_ids) == fetched_items
+
+
 def test_mealie_list_service_get_item_by_extra(
     mealie_list_service: MealieListService, mealie_shopping_lists: list[MealieShoppingListOut]
 ):
@@ -317,6 +382,45 @@ def test_mealie_list_service_get_item_by_extra_cache(
     assert cached_item is not fetched_item
 
 
+def test_mealie_list_service_get_item_by_extra_index(
+    mealie_list_service: MealieListService, mealie_shopping_lists: list[MealieShoppingListOut]
+):
+    shopping_list = random.choice(mealie_shopping_lists)
+    mealie_list_service.get_all_list_items(shopping_list.id)  # populate the cache and its indexes
+
+    # created items are indexed
+    todoist_task_id = random_string()
+    mealie_list_service.create_items(
+        [
+            MealieShoppingListItemCreate(
+                shopping_list_id=shopping_list.id,
+                note=random_string(),
+                extras=MealieShoppingListItemExtras(todoist_task_id=todoist_task_id),
+            )
+        ]
+    )
+
+    new_item = mealie_list_service.get_item_by_extra(shopping_list.id, "todoist_task_id", todoist_task_id)
+    assert new_item
+    assert mealie_list_service.get_item(shopping_list.id, new_item.id) == new_item
+
+    # updated items are re-indexed
+    new_todoist_task_id = random_string()
+    assert new_item.extras
+    new_item.extras.todoist_task_id = new_todoist_task_id
+    mealie_list_service.update_items([new_item.cast(MealieShoppingListItemUpdateBulk)])
+
+    assert mealie_list_service.get_item_by_extra(shopping_list.id, "todoist_task_id", todoist_task_id) is None
+    updated_item = mealie_list_service.get_item_by_extra(shopping_list.id, "todoist_task_id", new_todoist_task_id)
+    assert updated_item
+    assert updated_item.id == new_item.id
+
+    # deleted items are removed from the index
+    mealie_list_service.delete_items([updated_item])
+    assert mealie_list_service.get_item_by_extra(shopping_list.id, "todoist_task_id", new_todoist_task_id) is None
+    assert mealie_list_service.get_item(shopping_list.id, updated_item.id) is None
+
+
 def test_mealie_list_service_create_items(
     mealie_list_service: MealieListService, mealie_shopping_lists: list[MealieShoppingListOut]
 ):
@@ -463,3 +567,81 @@ def test_mealie_list_service_item_positions(
     new_items = fetched_list_items[len(fetched_list_items) - len(known_notes) :]
     for new_item, note in zip(new_items, known_notes, strict=True):
         assert new_item.note == note
+
+
+def test_mealie_list_service_catalogs_are_shared(
+    user_linked: User, mealie_list_service: MealieListService, mealie_labels: list[Label]
+):
+    for label in mealie_labels:
+        assert label.name.lower() in mealie_list_service.label_store
+
+    # services for the same Mealie instance share catalogs, so they don't fetch them again
+    new_service = MealieListService(user_linked)
+    new_service._client.get_all_labels = lambda: []  # type: ignore
+    assert new_service.label_store is mealie_list_service.label_store
+
+    # once the catalogs are invalidated, new services fetch them again
+    assert user_linked.configuration.mealie
+    MealieListService.invalidate_catalog_cache(
+        user_linked.configuration.mealie.base_url, user_linked.configuration.mealie.auth_token
+    )
+
+    new_service = MealieListService(user_linked)
+    new_service._client.get_all_labels = lambda: []  # type: ignore
+    assert new_service.label_store == {}
+
+
+def test_mealie_list_service_food_matcher_large_catalog():
+    # overlapping names (e.g. "chicken broth", "chicken breast", "vegetable broth") compete for the same trigrams
+    adjectives = ["fresh", "dried", "frozen", "ground", "smoked", "roasted", "whole", "low fat", "organic", "sweet"]
+    nouns = [
+        "basil", "beef", "bread", "breast", "broth", "butter", "cheese", "chicken", "cream", "flour",
+        "garlic", "juice", "lemon", "milk", "oil", "olive", "onion", "pepper", "pork", "salt",
+        "sugar", "tomato", "vanilla", "vegetable", "yogurt",
+    ]  # fmt: skip
+
+    names = nouns + [f"{adjective} {noun}" for adjective in adjectives for noun in nouns]
+    names += [f"{noun} {other_noun}" for noun in nouns for other_noun in nouns if noun != other_noun]
+    names += [f"{adjective} {name}" for adjective in adjectives[:3] for name in names[-200:]]
+    random.Random(24601).shuffle(names)
+
+    food_store = {name: Food(id=str(uuid4()), name=name) for name in names}
+    food_matcher = FoodMatcher(food_store, shortlist_size=20)
+    assert len(food_store) > food_matcher.shortlist_size * 50
+
+    food_strings = [
+        "2 cups milk",
+        "chicken breasts",
+        "extra virgin olive oil",
+        "fresh basil leaves",
+        "salt and pepper",
+        "low sodium chicken broth",
+        "garlic cloves",
+        "heavy cream",
+        "peanut butter",
+        "lemon juice",
+        "roasted tomatoes",
+        "vanilla extract",
+        "grnd beef",
+    ]
+
+    for food_string in food_strings:
+        nearest_match, score = process.extractOne(food_string, food_store.keys())
+        expected_food = food_store[nearest_match] if score >= 80 else None
+
+        assert food_matcher.match(food_string, 0.8) == expected_food
+
+    # check that no match returns none
+    assert food_matcher.match(random_string(24601), 0.8) is None
+
+
+def test_mealie_list_service_get_foods(mealie_list_service: MealieListService, mealie_foods: list[Food]):
+    food_strings = [str(food) + random_string(1) for food in mealie_foods] + [random_string(24601)]
+    matched_foods = mealie_list_service.get_foods(food_strings)
+
+    assert len(matched_foods) == len(food_strings)
+    for food_string, food in zip(food_strings, mealie_foods, strict=False):
+        assert matched_foods[food_string] == food
+        assert mealie_list_service.get_food(food_string) == food
+
+    assert matched_foods[food_strings[-1]] is None
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from AppLambda.src.app import settings
+from AppLambda.src.services.metrics import MetricsService
+from tests.utils.generators import random_int, random_string
+
+
+def test_metrics_service_build_emf():
+    metrics = MetricsService(namespace=random_string(), service=random_string())
+    assert metrics.build_emf() is None
+
+    counter_name = random_string()
+    timing_name = random_string()
+    increments = [random_int(1, 10) for _ in range(random_int(2, 5))]
+    for increment in increments:
+        metrics.increment(counter_name, increment)
+
+    timing_count = metrics.max_values_per_metric + random_int(1, 10)
+    for i in range(timing_count):
+        metrics.record_timing(timing_name, i)
+
+    document = metrics.build_emf()
+    assert document
+    assert document["service"] == metrics.service
+    assert document[counter_name] == sum(increments)
+    assert document[timing_name] == list(range(timing_count))[-metrics.max_values_per_metric :]
+
+    metric_directive = document["_aws"]["CloudWatchMetrics"][0]
+    assert metric_directive["Namespace"] == metrics.namespace
+    assert {"Name": counter_name, "Unit": "Count"} in metric_directive["Metrics"]
+    assert {"Name": timing_name, "Unit": "Seconds"} in metric_directive["Metrics"]
+
+
+def test_metrics_service_flush(capsys: pytest.CaptureFixture, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, "metrics_enabled", True)
+
+    metrics = MetricsService()
+    counter_name = random_string()
+    metrics.increment(counter_name)
+    metrics.flush()
+
+    document = json.loads(capsys.readouterr().out)
+    assert document[counter_name] == 1
+
+    # metrics are reset after flushing
+    assert not metrics.get_counter(counter_name)
+    metrics.flush()
+    assert not capsys.readouterr().out
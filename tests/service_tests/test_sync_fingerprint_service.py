@@ -0,0 +1,28 @@
+import random
+
+from AppLambda.src.services.sync_fingerprints import SyncFingerprintService, build_fingerprint
+from tests.utils.generators import random_int, random_string
+
+
+def test_build_fingerprint():
+    records = [(random_string(), random_int(0, 100), random.choice([True, False])) for _ in range(10)]
+    fingerprint = build_fingerprint(records)
+
+    # the order of the records doesn't matter, but their content does
+    assert build_fingerprint(random.sample(records, len(records))) == fingerprint
+    assert build_fingerprint(records[:-1]) != fingerprint
+    assert build_fingerprint(records[:-1] + [(random_string(), *records[-1][1:])]) != fingerprint
+
+
+def test_sync_fingerprint_service():
+    fingerprint_service = SyncFingerprintService(random_string())
+    fingerprint = build_fingerprint([random_string() for _ in range(10)])
+    assert not fingerprint_service.is_unchanged(fingerprint)
+
+    fingerprint_service.save(fingerprint)
+    assert fingerprint_service.is_unchanged(fingerprint)
+    assert SyncFingerprintService(fingerprint_service.fingerprint_key).is_unchanged(fingerprint)
+
+    # fingerprints are scoped to their key
+    assert not SyncFingerprintService(random_string()).is_unchanged(fingerprint)
+    assert not fingerprint_service.is_unchanged(build_fingerprint([random_string()]))
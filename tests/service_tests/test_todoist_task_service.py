@@ -3,9 +3,13 @@ import random
 import pytest
 from todoist_api_python.models import Section, Task
 
-from AppLambda.src.services.todoist import TodoistTaskService
+from AppLambda.src.clients.todoist import MAX_COMMANDS_PER_REQUEST
+from AppLambda.src.app import settings
+from AppLambda.src.models.core import User
+from AppLambda.src.services.metrics import metrics
+from AppLambda.src.services.todoist import TodoistSyncTaskService, TodoistTaskService
 from tests.fixtures.databases.todoist.fixture_todoist_database import MockTodoistData
-from tests.fixtures.databases.todoist.mock_todoist_api import MockTodoistAPI
+from tests.fixtures.databases.todoist.mock_todoist_api import MockTodoistAPI, MockTodoistSyncClient
 from tests.utils.generators import random_string
 
 # TODO: verify service task cache is properly maintained for all operations
@@ -32,6 +36,49 @@ def test_todoist_task_service_get_section_by_name(
         assert todoist_task_service.get_section(section.name.upper() + " ", data.project.id) == section
 
 
+def test_todoist_task_service_section_catalog(
+    user_linked: User,
+    todoist_task_service: TodoistTaskService,
+    todoist_data: list[MockTodoistData],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    data = random.choice(todoist_data)
+    assert data.sections
+
+    fetch_count = 0
+    original_get_sections = MockTodoistAPI.get_sections
+
+    def get_sections(self: MockTodoistAPI, **kwargs):
+        nonlocal fetch_count
+        fetch_count += 1
+        return original_get_sections(self, **kwargs)
+
+    def get_section(self: MockTodoistAPI, section_id: str):
+        raise AssertionError("sections should be served from the catalog")
+
+    monkeypatch.setattr(MockTodoistAPI, "get_sections", get_sections)
+    monkeypatch.setattr(MockTodoistAPI, "get_section", get_section)
+
+    # the project's sections are fetched once, then served from the catalog
+    for section in data.sections:
+        assert todoist_task_service.get_section_by_id(section.id, data.project.id) == section
+        assert todoist_task_service.get_section(section.name, data.project.id) == section
+        assert todoist_task_service.get_section_by_id(section.id) == section
+
+    assert fetch_count == 1
+
+    # the catalog is kept current when sections are created, and is shared with other services
+    new_section_name = random_string()
+    new_section = todoist_task_service.get_section(new_section_name, data.project.id)
+    assert new_section
+
+    fetch_count = 0
+    other_service = TodoistTaskService(user_linked)
+    assert other_service.get_section(new_section_name.upper(), data.project.id) == new_section
+    assert other_service.get_section_by_id(new_section.id, data.project.id) == new_section
+    assert not fetch_count
+
+
 def test_todoist_task_service_get_section_by_invalid_name(
     todoist_api: MockTodoistAPI, todoist_task_service: TodoistTaskService, todoist_data: list[MockTodoistData]
 ):
@@ -193,6 +240,36 @@ def test_todoist_task_service_get_task_cache(
     assert cached_task is not fetched_task
 
 
+def test_todoist_task_service_get_tasks_view(
+    todoist_task_service: TodoistTaskService, todoist_data: list[MockTodoistData]
+):
+    data = random.choice(todoist_data)
+    project = data.project
+    assert data.tasks
+
+    # views share tasks with the cache rather than copying them
+    tasks_view = todoist_task_service.get_tasks_view(project_id=project.id)
+    cached_tasks = todoist_task_service._project_tasks_cache[project.id]
+    assert len(tasks_view) == len(cached_tasks)
+    for view_task, cached_task in zip(tasks_view, cached_tasks):
+        assert view_task is cached_task
+
+    task = random.choice(tasks_view)
+    assert todoist_task_service.get_task_view(task.id, project_id=project.id) is task
+    assert not todoist_task_service.get_task_view(random_string(), project_id=project.id)
+
+    # checked out tasks can be mutated without modifying the cache
+    original_content = task.content
+    checked_out_task = todoist_task_service.checkout_task(task)
+    checked_out_task.content = random_string()
+    assert task.content == original_content
+
+    # closing a task doesn't modify existing views
+    todoist_task_service.close_task(task)
+    assert task in tasks_view
+    assert task not in todoist_task_service.get_tasks_view(project_id=project.id)
+
+
 @pytest.mark.parametrize(
     "todoist_task_service_fixture, use_sections, use_descriptions",
     [
@@ -450,6 +527,7 @@ def test_todoist_task_service_update_task_description(
     ],
 )
 def test_todoist_task_service_update_task_with_new_section(
+    todoist_api: MockTodoistAPI,
     todoist_task_service_fixture: str,
     use_sections: bool,
     use_descriptions: bool,
@@ -489,11 +567,10 @@ def test_todoist_task_service_update_task_with_new_section(
         assert new_section
         assert updated_task.section_id == new_section.id != original_task.section_id
 
-        # updating a task's section actually closes/deletes the existing task and adds a new task,
-        # so we need to make sure that happens, as well as verifying the section has been updated
-        assert updated_task.id != original_task.id
+        # the task is moved to the new section in-place, so it keeps its id
+        assert updated_task.id == original_task.id
         assert updated_task.content == original_task.content
-        assert not todoist_task_service.get_task(original_task.id, data.project.id)
+        assert todoist_api.get_task(original_task.id).section_id == new_section.id
 
         fetched_task = todoist_task_service.get_task(updated_task.id, data.project.id)
         assert fetched_task
@@ -536,6 +613,55 @@ def test_todoist_task_service_update_task_with_no_section(
         )
 
 
+@pytest.mark.parametrize("verify_task_updates", [False, True])
+def test_todoist_task_service_update_task_reads(
+    verify_task_updates: bool,
+    todoist_api: MockTodoistAPI,
+    todoist_task_service_use_sections_and_descriptions: TodoistTaskService,
+    todoist_data: list[MockTodoistData],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    todoist_task_service = todoist_task_service_use_sections_and_descriptions
+    monkeypatch.setattr(settings, "todoist_verify_task_updates", verify_task_updates)
+
+    read_count = 0
+    original_get_task = MockTodoistAPI.get_task
+
+    def get_task(self: MockTodoistAPI, task_id: str):
+        nonlocal read_count
+        read_count += 1
+        return original_get_task(self, task_id)
+
+    monkeypatch.setattr(MockTodoistAPI, "get_task", get_task)
+
+    data = random.choice(todoist_data)
+    tasks_to_update = random.sample(data.tasks, 3)
+    metrics.flush()
+    for task in tasks_to_update:
+        updated_task = todoist_task_service.update_task(
+            task.id,
+            data.project.id,
+            content=random_string(),
+            labels=[random_string()],
+            description=random_string(),
+        )
+
+        # the updated task matches Todoist whether or not it was fetched after the update
+        assert updated_task == original_get_task(todoist_api, task.id)
+        assert todoist_task_service.get_task(task.id, data.project.id) == updated_task
+
+    if verify_task_updates:
+        assert read_count == len(tasks_to_update)
+        assert metrics.get_counter("TodoistTaskVerificationReads") == len(tasks_to_update)
+        assert not metrics.get_counter("TodoistTaskReadsAvoided")
+    else:
+        assert not read_count
+        assert not metrics.get_counter("TodoistTaskVerificationReads")
+        assert metrics.get_counter("TodoistTaskReadsAvoided") == len(tasks_to_update)
+
+    metrics.flush()
+
+
 def test_todoist_task_service_update_task_cache(
     todoist_task_service: TodoistTaskService, todoist_data: list[MockTodoistData]
 ):
@@ -576,3 +702,58 @@ def test_todoist_task_service_close_task(todoist_task_service: TodoistTaskServic
     assert task_to_delete.id not in updated_task_ids
     for task_id in updated_task_ids:
         assert task_id in original_task_ids
+
+
+def test_todoist_sync_task_service_incremental_sync(
+    todoist_api: MockTodoistAPI, todoist_sync_task_service: TodoistSyncTaskService, todoist_data: list[MockTodoistData]
+):
+    data = random.choice(todoist_data)
+    assert todoist_sync_task_service.get_tasks(data.project.id) == todoist_api.get_tasks(project_id=data.project.id)
+
+    # the next sync only fetches what changed since the last sync token
+    sync_client = MockTodoistSyncClient(todoist_sync_task_service.config.access_token)
+    todoist_sync_task_service._sync_client = sync_client  # type: ignore [assignment]
+    task_to_update, task_to_close = random.sample(data.tasks, 2)
+    todoist_api.update_task(task_to_update.id, content=random_string())
+    todoist_api.close_task(task_to_close.id)
+
+    todoist_sync_task_service._clear_cache()
+    response = todoist_sync_task_service._sync()
+    assert not response.full_sync
+    assert {item["id"] for item in response.items} == {task_to_update.id, task_to_close.id}
+    assert todoist_sync_task_service.get_tasks(data.project.id) == todoist_api.get_tasks(project_id=data.project.id)
+
+
+def test_todoist_sync_task_service_batches_commands(
+    todoist_api: MockTodoistAPI, todoist_sync_task_service: TodoistSyncTaskService, todoist_data: list[MockTodoistData]
+):
+    data = random.choice(todoist_data)
+    sync_client = MockTodoistSyncClient(todoist_sync_task_service.config.access_token)
+    todoist_sync_task_service._sync_client = sync_client  # type: ignore [assignment]
+
+    # writes aren't sent until the service is flushed
+    original_task_count = len(todoist_api.get_tasks(project_id=data.project.id))
+    new_tasks = [
+        todoist_sync_task_service.add_task(random_string(), data.project.id, section=data.sections[0].name)
+        for _ in range(MAX_COMMANDS_PER_REQUEST + 1)
+    ]
+    assert len(todoist_api.get_tasks(project_id=data.project.id)) == original_task_count
+    assert not sync_client.requests[1:]
+
+    todoist_sync_task_service.flush()
+    assert [len(commands) for commands in sync_client.requests[-2:]] == [MAX_COMMANDS_PER_REQUEST, 1]
+    assert len(todoist_api.get_tasks(project_id=data.project.id)) == original_task_count + len(new_tasks)
+
+    # temp ids resolve to the ids assigned by Todoist
+    for new_task in new_tasks:
+        task_id = todoist_sync_task_service.resolve_task_id(new_task.id)
+        assert task_id != new_task.id
+
+        fetched_task = todoist_api.get_task(task_id)
+        assert fetched_task.content == new_task.content
+        assert fetched_task.section_id == data.sections[0].id
+
+        todoist_sync_task_service.update_task(task_id, data.project.id, content=random_string())
+
+    todoist_sync_task_service.flush()
+    assert [len(commands) for commands in sync_client.requests[-2:]] == [MAX_COMMANDS_PER_REQUEST, 1]
@@ -1,7 +1,10 @@
 import random
+from unittest import mock
 
 import pytest
 
+from AppLambda.src.app import services, settings
+from AppLambda.src.clients.mealie import MealieClient
 from AppLambda.src.models.account_linking import UserMealieConfigurationUpdate
 from AppLambda.src.models.alexa import (
     AlexaListItemCreateIn,
@@ -12,10 +15,12 @@ from AppLambda.src.models.alexa import (
 )
 from AppLambda.src.models.mealie import (
     Food,
+    MealieEventOperation,
     MealieEventType,
     MealieShoppingListItemCreate,
     MealieShoppingListItemUpdateBulk,
 )
+from AppLambda.src.services import item_links
 from AppLambda.src.services.alexa import AlexaListService
 from AppLambda.src.services.mealie import MealieListService
 from tests.fixtures.databases.alexa.mock_alexa_database import MockAlexaServer
@@ -602,6 +607,154 @@ def test_alexa_sync_receive_created_and_updated_items(
         assert mealie_item.extras.alexa_item_id == alexa_item.id
 
 
+def test_alexa_sync_receive_targeted_items(
+    mealie_list_service: MealieListService,
+    alexa_list_service: AlexaListService,
+    user_data_with_mealie_items: MockLinkedUserAndData,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    mealie_list_service._clear_cache()
+
+    user = user_data_with_mealie_items.user
+    mealie_list_id = user_data_with_mealie_items.mealie_list.id
+    alexa_list_id = user_data_with_mealie_items.alexa_list.list_id
+
+    event = build_mealie_event_notification(MealieEventType.shopping_list_updated, mealie_list_id)
+    send_mealie_event_notification(event, user)
+    alexa_list_service._clear_cache()
+    mealie_list_service._clear_cache()
+
+    # update, check, and create some items, and update one item without sending it in the notification
+    original_mealie_items = mealie_list_service.get_all_list_items(mealie_list_id)
+    item_to_update, item_to_check, untracked_item = random.sample(original_mealie_items, 3)
+    mealie_list_service.update_items(
+        [
+            item_to_update.cast(MealieShoppingListItemUpdateBulk, note=random_string()),
+            item_to_check.cast(MealieShoppingListItemUpdateBulk, checked=True),
+            untracked_item.cast(MealieShoppingListItemUpdateBulk, note=random_string()),
+        ]
+    )
+    mealie_list_service.create_items(
+        [MealieShoppingListItemCreate(shopping_list_id=mealie_list_id, note=random_string())]
+    )
+
+    mealie_list_service._clear_cache()
+    new_items = [item for item in mealie_list_service.get_all_list_items(mealie_list_id) if not item.extras]
+    assert len(new_items) == 1
+
+    # the targeted sync should never fetch the entire Mealie list
+    event = build_mealie_event_notification(
+        MealieEventType.shopping_list_updated,
+        mealie_list_id,
+        item_ids=[item_to_update.id, item_to_check.id, new_items[0].id],
+        operation=MealieEventOperation.update,
+    )
+    with monkeypatch.context() as m:
+        m.setattr(MealieClient, "get_all_shopping_list_items", mock.Mock(side_effect=Exception()))
+        send_mealie_event_notification(event, user)
+
+    mealie_list_service._clear_cache()
+    alexa_list_service._clear_cache()
+    alexa_items_by_id = {
+        item.id: item
+        for item in alexa_list_service.get_list(alexa_list_id).items or []
+        if item.status == ListItemState.active.value
+    }
+    assert len(alexa_items_by_id) == len(original_mealie_items)
+
+    for item_id in [item_to_update.id, new_items[0].id]:
+        mealie_item = mealie_list_service.get_item(mealie_list_id, item_id)
+        assert mealie_item and mealie_item.extras and mealie_item.extras.alexa_item_id
+        assert alexa_items_by_id[mealie_item.extras.alexa_item_id].value == mealie_item.display
+
+    assert item_to_check.extras and item_to_check.extras.alexa_item_id
+    assert item_to_check.extras.alexa_item_id not in alexa_items_by_id
+
+    # the item which wasn't in the notification isn't synced
+    assert untracked_item.extras and untracked_item.extras.alexa_item_id
+    assert alexa_items_by_id[untracked_item.extras.alexa_item_id].value == untracked_item.display
+
+
+def test_alexa_sync_links_without_mealie_write_back(
+    mealie_list_service: MealieListService,
+    alexa_list_service: AlexaListService,
+    user_data_with_mealie_items: MockLinkedUserAndData,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "item_links_mirror_to_extras", False)
+    mealie_list_service._clear_cache()
+
+    user = user_data_with_mealie_items.user
+    mealie_list_id = user_data_with_mealie_items.mealie_list.id
+    alexa_list_id = user_data_with_mealie_items.alexa_list.list_id
+
+    mealie_updates: list[list[MealieShoppingListItemUpdateBulk]] = []
+    update_shopping_list_items = MealieClient.update_shopping_list_items
+
+    def _update_shopping_list_items(self: MealieClient, items: list[MealieShoppingListItemUpdateBulk]):
+        mealie_updates.append(items)
+        return update_shopping_list_items(self, items)
+
+    monkeypatch.setattr(MealieClient, "update_shopping_list_items", _update_shopping_list_items)
+
+    # new Alexa items are linked without writing their ids back to Mealie, and aren't created again on the next sync
+    original_mealie_items = mealie_list_service.get_all_list_items(mealie_list_id)
+    for _ in range(2):
+        event = build_mealie_event_notification(MealieEventType.shopping_list_updated, mealie_list_id)
+        send_mealie_event_notification(event, user)
+        alexa_list_service._clear_cache()
+
+        assert not mealie_updates
+        assert len(alexa_list_service.get_list(alexa_list_id).items or []) == len(original_mealie_items)
+
+    mealie_list_service._clear_cache()
+    for mealie_item in mealie_list_service.get_all_list_items(mealie_list_id):
+        assert not (mealie_item.extras and mealie_item.extras.alexa_item_id)
+
+    # checking off an Alexa item finds its linked Mealie item
+    alexa_item_to_check_off = random.choice(alexa_list_service.get_list(alexa_list_id).items or [])
+    alexa_list_service.update_list_items(
+        alexa_list_id, [alexa_item_to_check_off.cast(AlexaListItemUpdateBulkIn, status=ListItemState.completed)]
+    )
+    event = build_alexa_list_event(
+        Operation.update, ObjectType.list_item, list_id=alexa_list_id, list_item_ids=[alexa_item_to_check_off.id]
+    )
+    send_alexa_list_event(event, user)
+    mealie_list_service._clear_cache()
+
+    remaining_mealie_items = mealie_list_service.get_all_list_items(mealie_list_id)
+    assert len(remaining_mealie_items) == len(original_mealie_items) - 1
+    assert alexa_item_to_check_off.value not in {item.display for item in remaining_mealie_items}
+
+
+def test_alexa_sync_writes_links_to_mealie_if_they_cant_be_saved(
+    mealie_list_service: MealieListService,
+    alexa_list_service: AlexaListService,
+    user_data_with_mealie_items: MockLinkedUserAndData,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "debug", False)
+    monkeypatch.setattr(settings, "item_links_mirror_to_extras", False)
+    monkeypatch.setattr(item_links.links_db, "batch_write", mock.Mock(side_effect=Exception()))
+    mealie_list_service._clear_cache()
+
+    user = user_data_with_mealie_items.user
+    mealie_list_id = user_data_with_mealie_items.mealie_list.id
+    alexa_list_id = user_data_with_mealie_items.alexa_list.list_id
+
+    # new Alexa items are linked using Mealie extras instead, so they aren't created again on the next sync
+    original_mealie_items = mealie_list_service.get_all_list_items(mealie_list_id)
+    for _ in range(2):
+        event = build_mealie_event_notification(MealieEventType.shopping_list_updated, mealie_list_id)
+        send_mealie_event_notification(event, user)
+        alexa_list_service._clear_cache()
+        assert len(alexa_list_service.get_list(alexa_list_id).items or []) == len(original_mealie_items)
+
+    mealie_list_service._clear_cache()
+    for mealie_item in mealie_list_service.get_all_list_items(mealie_list_id):
+        assert mealie_item.extras and mealie_item.extras.alexa_item_id
+
+
 @pytest.mark.parametrize("use_foods, overwrite_names", [(False, False), (True, False), (True, True)])
 def test_alexa_sync_full(
     use_foods: bool,
@@ -647,3 +800,56 @@ def test_alexa_sync_full(
         assert mealie_item.extras.alexa_item_id == alexa_item.id
         assert mealie_item.extras.alexa_item_version == "1"
         assert alexa_item.version == 1
+
+
+def test_alexa_sync_skips_unchanged_lists(
+    mealie_list_service: MealieListService,
+    alexa_list_service: AlexaListService,
+    user_data_with_mealie_items: MockLinkedUserAndData,
+):
+    user = user_data_with_mealie_items.user
+    mealie_list_id = user_data_with_mealie_items.mealie_list.id
+    alexa_list_id = user_data_with_mealie_items.alexa_list.list_id
+
+    # the first sync creates Alexa items and the second confirms the lists are in sync
+    for _ in range(2):
+        event = build_mealie_event_notification(MealieEventType.shopping_list_updated, mealie_list_id)
+        send_mealie_event_notification(event, user)
+        mealie_list_service._clear_cache()
+        alexa_list_service._clear_cache()
+
+    # once nothing has changed, the sync is skipped; metrics are normally flushed after each request
+    services.metrics.flush()
+    with mock.patch.object(services.metrics, "flush"), mock.patch.object(
+        AlexaListService, "update_and_create_list_items"
+    ) as update_and_create_list_items:
+        event = build_mealie_event_notification(MealieEventType.shopping_list_updated, mealie_list_id)
+        send_mealie_event_notification(event, user)
+        mealie_list_service._clear_cache()
+        alexa_list_service._clear_cache()
+
+        assert not update_and_create_list_items.called
+
+    assert services.metrics.get_counter("SyncFingerprintHits")
+    assert not services.metrics.get_counter("SyncFingerprintMisses")
+    services.metrics.flush()
+
+    # changing the list syncs it again
+    updated_item = random.choice(mealie_list_service.get_all_list_items(mealie_list_id))
+    mealie_list_service.update_items([updated_item.cast(MealieShoppingListItemUpdateBulk, note=random_string())])
+    mealie_list_service._clear_cache()
+
+    with mock.patch.object(services.metrics, "flush"):
+        event = build_mealie_event_notification(MealieEventType.shopping_list_updated, mealie_list_id)
+        send_mealie_event_notification(event, user)
+        mealie_list_service._clear_cache()
+        alexa_list_service._clear_cache()
+
+    assert services.metrics.get_counter("SyncFingerprintMisses")
+    assert not services.metrics.get_counter("SyncFingerprintHits")
+    services.metrics.flush()
+
+    updated_mealie_item = mealie_list_service.get_item(mealie_list_id, updated_item.id)
+    assert updated_mealie_item
+    alexa_items = alexa_list_service.get_list(alexa_list_id).items or []
+    assert updated_mealie_item.display in [alexa_item.value for alexa_item in alexa_items]
@@ -1,18 +1,35 @@
+import json
 import random
+import time
+from datetime import datetime, timedelta
 from unittest import mock
 from uuid import uuid4
 
 import pytest
 from fastapi.testclient import TestClient
+from freezegun import freeze_time
 
+from AppLambda.src.app import services, settings
 from AppLambda.src.handlers.core import SQSSyncMessageHandler
+from AppLambda.src.handlers.mangum import SQS
+from AppLambda.src.models.account_linking import NotLinkedError
+from AppLambda.src.models.alexa import AlexaListEvent, AlexaSyncEvent, ObjectType, Operation
 from AppLambda.src.models.aws import SQSMessage
-from AppLambda.src.models.core import User
-from AppLambda.src.models.mealie import MealieEventType, MealieShoppingListOut, MealieSyncEvent
+from AppLambda.src.models.core import BaseSyncEvent, SyncEventBatch, User
+from AppLambda.src.models.mealie import (
+    MealieEventOperation,
+    MealieEventType,
+    MealieShoppingListItemExtras,
+    MealieShoppingListItemUpdateBulk,
+    MealieShoppingListOut,
+    MealieSyncEvent,
+)
+from AppLambda.src.models.todoist import TodoistSyncEvent
 from AppLambda.src.routes import event_handlers
+from tests.fixtures.clients.fixture_sqsfifo_client import MockSQSFIFO
 from tests.fixtures.fixture_users import MockLinkedUserAndData
 from tests.utils.event_handlers import build_mealie_event_notification, send_mealie_event_notification
-from tests.utils.generators import random_string
+from tests.utils.generators import random_int, random_string
 from tests.utils.info import fully_qualified_name
 
 
@@ -42,6 +59,427 @@ def test_bulk_sync_events_only_fire_once(api_client: TestClient, user_data_with_
         assert mocked_message_handler.call_count == 1
 
 
+def test_sync_events_are_grouped_by_user(api_client: TestClient):
+    usernames = [random_string() for _ in range(3)]
+    messages = [
+        SQSMessage(
+            message_id=str(uuid4()),
+            receipt_handle=random_string(),
+            body=MealieSyncEvent(username=random.choice(usernames), shopping_list_id=random_string()).json(),
+            attributes={},
+            message_attributes={},
+        )
+        for _ in range(15)
+    ]
+
+    with mock.patch(fully_qualified_name(event_handlers._process_sync_event_group)) as mocked_group_processor:
+        response = api_client.post(
+            event_handlers.router.url_path_for("sqs_sync_event_handler"),
+            json={"Records": [message.dict() for message in messages]},
+        )
+        response.raise_for_status()
+
+    # each user's messages are processed together, in their original order
+    expected_groups: dict[str, list[SQSMessage]] = {}
+    for message in messages:
+        expected_groups.setdefault(message.parse_body(MealieSyncEvent).username, []).append(message)
+
+    processed_groups = [call.args[0] for call in mocked_group_processor.call_args_list]
+    assert len(processed_groups) == len(expected_groups)
+    for expected_group in expected_groups.values():
+        assert expected_group in processed_groups
+
+
+def test_sync_events_are_grouped_by_list_map(api_client: TestClient):
+    username = random_string()
+    list_sync_map_ids = [random_string() for _ in range(3)] + [None]
+    messages = [
+        SQSMessage(
+            message_id=str(uuid4()),
+            receipt_handle=random_string(),
+            body=MealieSyncEvent(
+                username=username,
+                shopping_list_id=random_string(),
+                list_sync_map_id=random.choice(list_sync_map_ids),
+            ).json(),
+            attributes={},
+            message_attributes={},
+        )
+        for _ in range(20)
+    ]
+
+    with mock.patch(fully_qualified_name(event_handlers._process_sync_event_group)) as mocked_group_processor:
+        response = api_client.post(
+            event_handlers.router.url_path_for("sqs_sync_event_handler"),
+            json={"Records": [message.dict() for message in messages]},
+        )
+        response.raise_for_status()
+
+    # each list map's messages are processed together, in their original order; unknown list maps are grouped by user
+    expected_groups: dict[str | None, list[SQSMessage]] = {}
+    for message in messages:
+        expected_groups.setdefault(message.parse_body(MealieSyncEvent).list_sync_map_id, []).append(message)
+
+    processed_groups = [call.args[0] for call in mocked_group_processor.call_args_list]
+    assert len(processed_groups) == len(expected_groups)
+    for expected_group in expected_groups.values():
+        assert expected_group in processed_groups
+
+
+def test_sync_event_batch(user_data: MockLinkedUserAndData):
+    sync_events = [
+        MealieSyncEvent(username=user_data.user.username, shopping_list_id=random_string())
+        for _ in range(random_int(15, 25))
+    ]
+
+    batch = SyncEventBatch()
+    for sync_event in sync_events:
+        batch.add(sync_event)
+
+    with mock.patch(fully_qualified_name(MockSQSFIFO.send_message)) as mocked_send_message, mock.patch(
+        fully_qualified_name(MockSQSFIFO.send_message_batch)
+    ) as mocked_send_message_batch:
+        assert batch.flush() == sync_events
+        assert not mocked_send_message.called
+        assert mocked_send_message_batch.call_count == 1
+        assert mocked_send_message_batch.call_args.args[0] == [
+            (sync_event.json(), sync_event.event_id, sync_event.group_id) for sync_event in sync_events
+        ]
+
+        # events are only queued once
+        assert not batch.flush()
+        assert mocked_send_message_batch.call_count == 1
+
+
+def test_sync_events_skipped_near_deadline(user_data: MockLinkedUserAndData):
+    sync_event = MealieSyncEvent(username=user_data.user.username, shopping_list_id=user_data.mealie_list.id)
+    message = SQSMessage(
+        message_id=str(uuid4()),
+        receipt_handle=random_string(),
+        body=sync_event.json(),
+        attributes={},
+        message_attributes={},
+    )
+
+    with mock.patch(fully_qualified_name(SQSSyncMessageHandler.handle_message)) as mocked_message_handler:
+        event_handlers._process_sync_event_group([message], deadline=time.time())
+        assert not mocked_message_handler.call_count
+
+        event_handlers._process_sync_event_group([message], deadline=time.time() + 60 * 5)
+        assert mocked_message_handler.call_count == 1
+
+
+def test_debounced_sync_events_wait_for_their_window(user_data: MockLinkedUserAndData):
+    delay = 30
+    sync_event = MealieSyncEvent(
+        username=user_data.user.username,
+        shopping_list_id=user_data.mealie_list.id,
+        not_before=datetime.utcnow() + timedelta(seconds=delay),
+    )
+    message = SQSMessage(
+        message_id=str(uuid4()),
+        receipt_handle=random_string(),
+        body=sync_event.json(),
+        attributes={},
+        message_attributes={},
+    )
+
+    with mock.patch(fully_qualified_name(SQSSyncMessageHandler.handle_message)) as mocked_message_handler, mock.patch(
+        fully_qualified_name(MockSQSFIFO.change_message_visibility_batch)
+    ) as mocked_change_visibility:
+        # until the window closes, the event is hidden in the queue and retried later
+        assert event_handlers._process_sync_event_group([message], deadline=time.time() + 60) == [message]
+        assert not mocked_message_handler.call_count
+        assert mocked_change_visibility.call_count == 1
+        assert mocked_change_visibility.call_args.args[0] == [message.receipt_handle]
+        assert 0 < mocked_change_visibility.call_args.kwargs["visibility_timeout"] <= delay
+
+        with freeze_time(datetime.utcnow() + timedelta(seconds=delay + 1)):
+            assert not event_handlers._process_sync_event_group([message], deadline=time.time() + 60)
+
+        assert mocked_message_handler.call_count == 1
+        assert mocked_change_visibility.call_count == 1
+
+
+@pytest.mark.parametrize(
+    "exception, is_retryable",
+    [
+        (Exception(), True),
+        (NotLinkedError(random_string(), random_string()), False),
+    ],
+)
+def test_sync_event_failures_are_reported(
+    exception: Exception,
+    is_retryable: bool,
+    api_client: TestClient,
+    user_data: MockLinkedUserAndData,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    # exceptions are only handled outside of debug mode
+    monkeypatch.setattr(settings, "debug", False)
+
+    messages = [
+        SQSMessage(
+            message_id=str(uuid4()),
+            receipt_handle=random_string(),
+            # use different lists so the messages aren't coalesced
+            body=MealieSyncEvent(username=user_data.user.username, shopping_list_id=random_string()).json(),
+            attributes={},
+            message_attributes={},
+        )
+        for _ in range(5)
+    ]
+
+    # fail the third message
+    side_effects: list = [None, None, exception, None, None]
+    with mock.patch(
+        fully_qualified_name(SQSSyncMessageHandler.handle_message), side_effect=side_effects
+    ) as mocked_message_handler:
+        response = api_client.post(
+            event_handlers.router.url_path_for("sqs_sync_event_handler"),
+            json={"Records": [message.dict() for message in messages]},
+        )
+        response.raise_for_status()
+
+    failed_message_ids = [failure["itemIdentifier"] for failure in response.json()["batchItemFailures"]]
+    if is_retryable:
+        # the failed message and all messages after it in the group are retried, in order
+        assert mocked_message_handler.call_count == 3
+        assert failed_message_ids == [message.message_id for message in messages[2:]]
+
+    else:
+        assert mocked_message_handler.call_count == len(messages)
+        assert not failed_message_ids
+
+
+def test_sync_events_are_coalesced(user_data: MockLinkedUserAndData):
+    username = user_data.user.username
+    list_ids = [random_string() for _ in range(3)]
+    sync_events: list[BaseSyncEvent] = [
+        MealieSyncEvent(username=username, shopping_list_id=random.choice(list_ids)) for _ in range(10)
+    ]
+    sync_events.extend(TodoistSyncEvent(username=username, project_id=list_ids[0]) for _ in range(5))
+    random.shuffle(sync_events)
+
+    messages = [
+        SQSMessage(
+            message_id=str(uuid4()),
+            receipt_handle=random_string(),
+            body=sync_event.json(),
+            attributes={},
+            message_attributes={},
+        )
+        for sync_event in sync_events
+    ]
+
+    services.metrics.flush()
+    coalesced_messages = event_handlers._coalesce_sync_events(messages)
+    coalesce_keys = [sync_event.coalesce_key for sync_event in sync_events]
+    expected_keys = list(dict.fromkeys(coalesce_keys))
+    assert len(coalesced_messages) == len(expected_keys)
+    assert services.metrics.get_counter("SyncEventsCoalesced") == len(messages) - len(expected_keys)
+
+    # each key is processed once, at the position of its first message, and tracks all of its original messages
+    for expected_key, (message, original_messages) in zip(expected_keys, coalesced_messages, strict=True):
+        assert event_handlers._parse_sync_event(message).coalesce_key == expected_key
+        assert original_messages == [
+            original_message
+            for original_message, coalesce_key in zip(messages, coalesce_keys, strict=True)
+            if coalesce_key == expected_key
+        ]
+
+        assert message.message_id == original_messages[0].message_id
+
+    services.metrics.flush()
+
+
+def test_alexa_sync_events_are_coalesced(user_data: MockLinkedUserAndData):
+    list_id = random_string()
+    item_ids = [random_string() for _ in range(5)]
+    sync_events = [
+        AlexaSyncEvent(
+            username=user_data.user.username,
+            list_event=AlexaListEvent(
+                request_id=random_string(),
+                timestamp=datetime.utcnow(),
+                list_id=list_id,
+                list_item_ids=item_ids[max(0, i - 1) : i + 1],  # overlaps with the previous event
+                object_type=ObjectType.list_item,
+                operation=Operation.update,
+            ),
+        )
+        for i in range(len(item_ids))
+    ]
+
+    messages = [
+        SQSMessage(
+            message_id=str(uuid4()),
+            receipt_handle=random_string(),
+            body=sync_event.json(),
+            attributes={},
+            message_attributes={},
+        )
+        for sync_event in sync_events
+    ]
+
+    coalesced_messages = event_handlers._coalesce_sync_events(messages)
+    assert len(coalesced_messages) == 1
+
+    message, original_messages = coalesced_messages[0]
+    assert original_messages == messages
+
+    coalesced_event = message.parse_body(AlexaSyncEvent)
+    assert coalesced_event.event_id == sync_events[0].event_id
+    assert coalesced_event.list_event.list_item_ids == item_ids
+
+
+@pytest.mark.parametrize("include_full_sync", [False, True])
+def test_todoist_sync_events_are_coalesced(include_full_sync: bool, user_data: MockLinkedUserAndData):
+    project_id = random_string()
+    task_ids = [random_string() for _ in range(5)]
+    sync_events = [
+        TodoistSyncEvent(
+            username=user_data.user.username,
+            project_id=project_id,
+            tasks=[{"id": task_id, "project_id": project_id, "content": random_string()}],
+        )
+        for task_id in task_ids + task_ids[:2]  # later events for the same task replace earlier ones
+    ]
+
+    if include_full_sync:
+        sync_events.insert(2, TodoistSyncEvent(username=user_data.user.username, project_id=project_id))
+
+    messages = [
+        SQSMessage(
+            message_id=str(uuid4()),
+            receipt_handle=random_string(),
+            body=sync_event.json(),
+            attributes={},
+            message_attributes={},
+        )
+        for sync_event in sync_events
+    ]
+
+    coalesced_messages = event_handlers._coalesce_sync_events(messages)
+    assert len(coalesced_messages) == 1
+
+    message, original_messages = coalesced_messages[0]
+    assert original_messages == messages
+
+    coalesced_event = message.parse_body(TodoistSyncEvent)
+    if include_full_sync:
+        assert coalesced_event.is_full_sync
+        assert not coalesced_event.tasks
+
+    else:
+        assert not coalesced_event.is_full_sync
+        assert [task["id"] for task in coalesced_event.tasks] == task_ids
+        assert coalesced_event.tasks[0] == sync_events[-2].tasks[0]
+        assert coalesced_event.tasks[1] == sync_events[-1].tasks[0]
+
+
+@pytest.mark.parametrize("include_delete", [False, True])
+def test_mealie_sync_events_are_coalesced(include_delete: bool, user_data: MockLinkedUserAndData):
+    list_id = random_string()
+    item_ids = [random_string() for _ in range(5)]
+    notifications = [
+        build_mealie_event_notification(
+            MealieEventType.shopping_list_updated, list_id, item_ids=[item_id], operation=MealieEventOperation.update
+        )
+        for item_id in item_ids + item_ids[:2]
+    ]
+
+    if include_delete:
+        notifications.insert(
+            2,
+            build_mealie_event_notification(
+                MealieEventType.shopping_list_updated,
+                list_id,
+                item_ids=[random_string()],
+                operation=MealieEventOperation.delete,
+            ),
+        )
+
+    sync_events = [
+        MealieSyncEvent(
+            username=user_data.user.username,
+            shopping_list_id=list_id,
+            item_ids=notification.get_shopping_list_item_ids_from_document_data(),
+            operation=notification.get_operation_from_document_data(),
+        )
+        for notification in notifications
+    ]
+
+    messages = [
+        SQSMessage(
+            message_id=str(uuid4()),
+            receipt_handle=random_string(),
+            body=sync_event.json(),
+            attributes={},
+            message_attributes={},
+        )
+        for sync_event in sync_events
+    ]
+
+    coalesced_messages = event_handlers._coalesce_sync_events(messages)
+    assert len(coalesced_messages) == 1
+
+    coalesced_event = coalesced_messages[0][0].parse_body(MealieSyncEvent)
+    if include_delete:
+        # deleted items can't be fetched, so the entire list is synced
+        assert coalesced_event.is_full_sync
+        assert not coalesced_event.item_ids
+
+    else:
+        assert not coalesced_event.is_full_sync
+        assert coalesced_event.item_ids == item_ids
+        assert coalesced_event.operation == MealieEventOperation.update.value
+
+
+def test_sync_events_covered_by_completed_sync_are_skipped(user_data: MockLinkedUserAndData):
+    def build_message(sync_event: MealieSyncEvent) -> SQSMessage:
+        return SQSMessage(
+            message_id=str(uuid4()),
+            receipt_handle=random_string(),
+            body=sync_event.json(),
+            attributes={},
+            message_attributes={},
+        )
+
+    stale_sync_event = MealieSyncEvent(
+        username=user_data.user.username,
+        shopping_list_id=user_data.mealie_list.id,
+        timestamp=datetime.utcnow() - timedelta(minutes=1),
+    )
+
+    with mock.patch(fully_qualified_name(SQSSyncMessageHandler.handle_message)) as mocked_message_handler:
+        event_handlers._process_sync_event_group([build_message(stale_sync_event.copy())], deadline=None)
+        assert mocked_message_handler.call_count == 1
+
+        # a sync has completed since this event was created, so there's nothing left to do
+        event_handlers._process_sync_event_group([build_message(stale_sync_event.copy())], deadline=None)
+        assert mocked_message_handler.call_count == 1
+
+        # new events are always processed
+        new_sync_event = stale_sync_event.copy(update={"timestamp": datetime.utcnow()})
+        event_handlers._process_sync_event_group([build_message(new_sync_event)], deadline=None)
+        assert mocked_message_handler.call_count == 2
+
+
+def test_sqs_adapter_passes_through_batch_response():
+    message_ids = [str(uuid4()) for _ in range(3)]
+    event = {"Records": [{"messageId": message_id} for message_id in message_ids]}
+    adapter = SQS.with_path(random_string())(event, mock.MagicMock(), mock.MagicMock())  # type: ignore
+
+    batch_response = {"batchItemFailures": [{"itemIdentifier": message_ids[0]}]}
+    response = adapter({"status": 200, "headers": [], "body": json.dumps(batch_response).encode()})
+    assert response == batch_response
+
+    # if the route fails entirely, all records are retried
+    response = adapter({"status": 500, "headers": [], "body": b"Internal Server Error"})
+    assert response == {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in message_ids]}
+
+
 @pytest.mark.parametrize(
     "use_invalid_client_id, use_invalid_client_secret, expect_call",
     [
@@ -97,3 +535,37 @@ def test_user_not_linked_to_mealie(user: User, mealie_shopping_lists: list[Meali
     with mock.patch(fully_qualified_name(SQSSyncMessageHandler.handle_message)) as mocked_message_handler:
         send_mealie_event_notification(event, user)
         assert not mocked_message_handler.call_count
+
+
+def test_merge_mealie_updates(user_data_with_items: MockLinkedUserAndData):
+    message_handler = SQSSyncMessageHandler(user_data_with_items.user)
+    mealie_service = message_handler.mealie
+    original_item, other_item = random.sample(
+        mealie_service.get_all_list_items_view(user_data_with_items.mealie_list.id), 2
+    )
+
+    # simulate two systems writing back their own ids to the same item
+    alexa_item = mealie_service.checkout_item(original_item)
+    alexa_item.extras = alexa_item.extras or MealieShoppingListItemExtras()
+    alexa_item.extras.alexa_item_id = random_string()
+    alexa_item.extras.alexa_item_version = "1"
+
+    todoist_item = mealie_service.checkout_item(original_item)
+    todoist_item.extras = todoist_item.extras or MealieShoppingListItemExtras()
+    todoist_item.extras.todoist_task_id = random_string()
+
+    merged_items = message_handler.merge_mealie_updates(
+        [
+            alexa_item.cast(MealieShoppingListItemUpdateBulk),
+            other_item.cast(MealieShoppingListItemUpdateBulk),
+            todoist_item.cast(MealieShoppingListItemUpdateBulk),
+        ]
+    )
+
+    assert [item.id for item in merged_items] == [original_item.id, other_item.id]
+    merged_item = merged_items[0]
+    assert merged_item.extras
+    assert merged_item.extras.alexa_item_id == alexa_item.extras.alexa_item_id
+    assert merged_item.extras.alexa_item_version == alexa_item.extras.alexa_item_version
+    assert merged_item.extras.todoist_task_id == todoist_item.extras.todoist_task_id
+    assert merged_item.note == original_item.note
@@ -1,19 +1,26 @@
 import random
+from unittest import mock
 
 import pytest
+from requests import HTTPError, Response
 
-from AppLambda.src.app import settings
+from AppLambda.src.app import services, settings
+from AppLambda.src.clients.mealie import MealieClient
+from AppLambda.src.handlers import todoist as todoist_handlers
 from AppLambda.src.models.account_linking import UserMealieConfigurationUpdate, UserTodoistConfigurationUpdate
 from AppLambda.src.models.mealie import (
     Food,
     Label,
+    MealieEventOperation,
     MealieEventType,
     MealieShoppingListItemCreate,
     MealieShoppingListItemUpdateBulk,
 )
-from AppLambda.src.models.todoist import TodoistEventType
+from AppLambda.src.models.todoist import TodoistEventType, TodoistSyncCommand
 from AppLambda.src.services.mealie import MealieListService
+from AppLambda.src.services import todoist as todoist_services
 from AppLambda.src.services.todoist import TodoistTaskService
+from tests.fixtures.databases.todoist.mock_todoist_api import MockTodoistAPI, MockTodoistSyncClient
 from tests.fixtures.fixture_users import MockLinkedUserAndData
 from tests.utils.event_handlers import (
     build_mealie_event_notification,
@@ -266,6 +273,85 @@ def test_todoist_sync_updated_item_section(
             assert mealie_item.label.name == todoist_section.name
 
 
+@pytest.mark.parametrize("use_sync_api", [False, True])
+def test_todoist_sync_webhook_tasks(
+    use_sync_api: bool,
+    mealie_list_service: MealieListService,
+    todoist_api: MockTodoistAPI,
+    todoist_task_service: TodoistTaskService,
+    user_data: MockLinkedUserAndData,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "todoist_use_sync_api", use_sync_api)
+    assert user_data.user.todoist_user_id
+    project_id = user_data.todoist_data.project.id
+
+    # create tasks in Todoist and sync them over to Mealie, which reconciles the entire project
+    for _ in range(5):
+        todoist_task_service.add_task(content=random_string(), project_id=project_id)
+
+    send_todoist_webhook(build_todoist_webhook(TodoistEventType.item_added, user_data.user.todoist_user_id, project_id))
+    todoist_task_service._clear_cache()
+    mealie_list_service._clear_cache()
+    original_mealie_items = mealie_list_service.get_all_list_items(user_data.mealie_list.id)
+    task_to_update, task_to_complete = random.sample(todoist_task_service.get_tasks(project_id), 2)
+
+    # webhooks which carry their task are synced without fetching the project
+    def get_tasks(*args, **kwargs):
+        raise AssertionError("the project should not be fetched")
+
+    monkeypatch.setattr(MockTodoistAPI, "get_tasks", get_tasks)
+    monkeypatch.setattr(MockTodoistSyncClient, "sync", get_tasks)
+
+    todoist_api.update_task(task_to_update.id, content=random_string())
+    updated_item = MockTodoistSyncClient._task_to_item(todoist_api.get_task(task_to_update.id))
+    send_todoist_webhook(
+        build_todoist_webhook(TodoistEventType.item_updated, user_data.user.todoist_user_id, project_id, updated_item)
+    )
+
+    completed_item = MockTodoistSyncClient._task_to_item(todoist_api.get_task(task_to_complete.id))
+    todoist_api.close_task(task_to_complete.id)
+    send_todoist_webhook(
+        build_todoist_webhook(
+            TodoistEventType.item_completed, user_data.user.todoist_user_id, project_id, completed_item
+        )
+    )
+
+    mealie_list_service._clear_cache()
+    updated_mealie_items = mealie_list_service.get_all_list_items(user_data.mealie_list.id)
+    assert len(updated_mealie_items) == len(original_mealie_items) - 1
+
+    mealie_item = mealie_list_service.get_item_by_extra(user_data.mealie_list.id, "todoist_task_id", task_to_update.id)
+    assert mealie_item
+    assert mealie_item.display == updated_item["content"] != task_to_update.content
+    assert not mealie_list_service.get_item_by_extra(user_data.mealie_list.id, "todoist_task_id", task_to_complete.id)
+
+
+def test_todoist_sync_webhook_tasks_reconciliation(
+    mealie_list_service: MealieListService,
+    todoist_api: MockTodoistAPI,
+    todoist_task_service: TodoistTaskService,
+    user_data: MockLinkedUserAndData,
+):
+    assert user_data.user.todoist_user_id
+    project_id = user_data.todoist_data.project.id
+    tasks = [todoist_task_service.add_task(content=random_string(), project_id=project_id) for _ in range(5)]
+
+    # the project hasn't been reconciled yet, so a webhook with a task still syncs the entire project
+    item = MockTodoistSyncClient._task_to_item(todoist_api.get_task(tasks[0].id))
+    send_todoist_webhook(
+        build_todoist_webhook(TodoistEventType.item_added, user_data.user.todoist_user_id, project_id, item)
+    )
+
+    mealie_list_service._clear_cache()
+    mealie_items = mealie_list_service.get_all_list_items(user_data.mealie_list.id)
+    assert len(mealie_items) == len(tasks)
+    for task in tasks:
+        assert mealie_list_service.get_item_by_extra(user_data.mealie_list.id, "todoist_task_id", task.id)
+
+    assert (user_data.user.username, project_id) in todoist_handlers._reconciled_projects
+
+
 @pytest.mark.parametrize("use_foods, overwrite_names", [(False, False), (True, False), (True, True)])
 def test_todoist_sync_checked_items(
     use_foods: bool,
@@ -643,14 +729,18 @@ def test_todoist_sync_receive_checked_items(
         assert not todoist_task_service.get_task(todoist_task_id, project_id)
 
 
+@pytest.mark.parametrize("use_sync_api", [False, True])
 @pytest.mark.parametrize("use_sections, use_descriptions", [(False, False), (True, False), (False, True), (True, True)])
 def test_todoist_sync_receive_mixed_items(
+    use_sync_api: bool,
     use_sections: bool,
     use_descriptions: bool,
     mealie_list_service: MealieListService,
     todoist_task_service: TodoistTaskService,
     user_data_with_mealie_items: MockLinkedUserAndData,
+    monkeypatch: pytest.MonkeyPatch,
 ):
+    monkeypatch.setattr(settings, "todoist_use_sync_api", use_sync_api)
     user_data_with_mealie_items.user = update_mealie_config(
         user_data_with_mealie_items.user,
         UserMealieConfigurationUpdate(use_foods=use_sections),
@@ -702,11 +792,237 @@ def test_todoist_sync_receive_mixed_items(
         assert settings.todoist_mealie_label in task.labels
 
 
+@pytest.mark.parametrize("use_sync_api", [False, True])
+def test_todoist_sync_receive_targeted_items(
+    use_sync_api: bool,
+    mealie_list_service: MealieListService,
+    todoist_task_service: TodoistTaskService,
+    user_data_with_mealie_items: MockLinkedUserAndData,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "todoist_use_sync_api", use_sync_api)
+    mealie_list_service._clear_cache()
+    todoist_task_service._clear_cache()
+
+    user = user_data_with_mealie_items.user
+    mealie_list_id = user_data_with_mealie_items.mealie_list.id
+    project_id = user_data_with_mealie_items.todoist_data.project.id
+    assert user.todoist_user_id
+
+    event = build_mealie_event_notification(MealieEventType.shopping_list_updated, mealie_list_id)
+    send_mealie_event_notification(event, user)
+    mealie_list_service._clear_cache()
+
+    # update, check, and create some items, and update one item without sending it in the notification
+    original_mealie_items = mealie_list_service.get_all_list_items(mealie_list_id)
+    item_to_update, item_to_check, untracked_item = random.sample(original_mealie_items, 3)
+    updated_items = [
+        item_to_update.cast(MealieShoppingListItemUpdateBulk, note=random_string()),
+        item_to_check.cast(MealieShoppingListItemUpdateBulk, checked=True),
+        untracked_item.cast(MealieShoppingListItemUpdateBulk, note=random_string()),
+    ]
+    mealie_list_service.update_items(updated_items)
+    mealie_list_service.create_items(
+        [MealieShoppingListItemCreate(shopping_list_id=mealie_list_id, note=random_string()) for _ in range(2)]
+    )
+
+    mealie_list_service._clear_cache()
+    new_items = [item for item in mealie_list_service.get_all_list_items(mealie_list_id) if not item.extras]
+    changed_item_ids = [item_to_update.id, item_to_check.id] + [item.id for item in new_items]
+    assert len(new_items) == 2
+
+    # the targeted sync should never fetch the entire Mealie list
+    event = build_mealie_event_notification(
+        MealieEventType.shopping_list_updated,
+        mealie_list_id,
+        item_ids=changed_item_ids,
+        operation=MealieEventOperation.update,
+    )
+    with monkeypatch.context() as m:
+        m.setattr(MealieClient, "get_all_shopping_list_items", mock.Mock(side_effect=Exception()))
+        send_mealie_event_notification(event, user)
+
+    mealie_list_service._clear_cache()
+    tasks_by_id = {task.id: task for task in todoist_task_service.get_tasks(project_id)}
+    assert len(tasks_by_id) == len(original_mealie_items) - 1 + len(new_items)
+
+    for item_id in changed_item_ids:
+        mealie_item = mealie_list_service.get_item(mealie_list_id, item_id)
+        if not mealie_item:
+            continue  # checked items aren't cached
+
+        assert mealie_item.extras and mealie_item.extras.todoist_task_id
+        assert tasks_by_id[mealie_item.extras.todoist_task_id].content == mealie_item.display
+
+    assert item_to_check.extras and item_to_check.extras.todoist_task_id
+    assert item_to_check.extras.todoist_task_id not in tasks_by_id
+
+    # the item which wasn't in the notification isn't synced
+    assert untracked_item.extras and untracked_item.extras.todoist_task_id
+    assert tasks_by_id[untracked_item.extras.todoist_task_id].content == untracked_item.display
+
+
+@pytest.mark.parametrize("use_sync_api", [False, True])
+def test_todoist_sync_links_without_mealie_write_back(
+    use_sync_api: bool,
+    mealie_list_service: MealieListService,
+    todoist_task_service: TodoistTaskService,
+    user_data_with_mealie_items: MockLinkedUserAndData,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "todoist_use_sync_api", use_sync_api)
+    monkeypatch.setattr(settings, "item_links_mirror_to_extras", False)
+    mealie_list_service._clear_cache()
+    todoist_task_service._clear_cache()
+
+    user = user_data_with_mealie_items.user
+    mealie_list_id = user_data_with_mealie_items.mealie_list.id
+    project_id = user_data_with_mealie_items.todoist_data.project.id
+    assert user.todoist_user_id
+
+    mealie_updates: list[list[MealieShoppingListItemUpdateBulk]] = []
+    update_shopping_list_items = MealieClient.update_shopping_list_items
+
+    def _update_shopping_list_items(self: MealieClient, items: list[MealieShoppingListItemUpdateBulk]):
+        mealie_updates.append(items)
+        return update_shopping_list_items(self, items)
+
+    monkeypatch.setattr(MealieClient, "update_shopping_list_items", _update_shopping_list_items)
+
+    # new tasks are linked without writing their ids back to Mealie, and aren't created again on the next sync
+    original_mealie_items = mealie_list_service.get_all_list_items(mealie_list_id)
+    for _ in range(2):
+        event = build_mealie_event_notification(MealieEventType.shopping_list_updated, mealie_list_id)
+        send_mealie_event_notification(event, user)
+        todoist_task_service._clear_cache()
+
+        assert not mealie_updates
+        assert len(todoist_task_service.get_tasks(project_id)) == len(original_mealie_items)
+
+    mealie_list_service._clear_cache()
+    for mealie_item in mealie_list_service.get_all_list_items(mealie_list_id):
+        assert not (mealie_item.extras and mealie_item.extras.todoist_task_id)
+
+    # links are found in both directions
+    updated_item = random.choice(original_mealie_items)
+    linked_task = next(
+        task for task in todoist_task_service.get_tasks(project_id) if task.content == updated_item.display
+    )
+    mealie_list_service.update_items([updated_item.cast(MealieShoppingListItemUpdateBulk, note=random_string())])
+    mealie_updates.clear()
+
+    event = build_mealie_event_notification(MealieEventType.shopping_list_updated, mealie_list_id)
+    send_mealie_event_notification(event, user)
+    todoist_task_service._clear_cache()
+    mealie_list_service._clear_cache()
+
+    updated_mealie_item = mealie_list_service.get_item(mealie_list_id, updated_item.id)
+    updated_task = todoist_task_service.get_task(linked_task.id, project_id)
+    assert updated_mealie_item and updated_task
+    assert updated_task.content == updated_mealie_item.display != updated_item.display
+    assert len(todoist_task_service.get_tasks(project_id)) == len(original_mealie_items)
+
+    task_to_close = random.choice(todoist_task_service.get_tasks(project_id))
+    todoist_task_service.close_task(task_to_close)
+    todoist_task_service.flush()
+
+    webhook = build_todoist_webhook(TodoistEventType.item_completed, user.todoist_user_id, project_id)
+    send_todoist_webhook(webhook)
+    mealie_list_service._clear_cache()
+
+    assert len(mealie_list_service.get_all_list_items(mealie_list_id)) == len(original_mealie_items) - 1
+    assert task_to_close.content not in {
+        item.display for item in mealie_list_service.get_all_list_items(mealie_list_id)
+    }
+    assert not any(updates for updates in mealie_updates if not all(item.checked for item in updates))
+
+
+@pytest.mark.parametrize("fail_batch", [False, True])
+def test_todoist_sync_links_accepted_tasks_when_some_fail(
+    fail_batch: bool,
+    mealie_list_service: MealieListService,
+    todoist_task_service: TodoistTaskService,
+    user_data_with_mealie_items: MockLinkedUserAndData,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "todoist_use_sync_api", True)
+    monkeypatch.setattr(settings, "item_links_mirror_to_extras", False)
+    mealie_list_service._clear_cache()
+    todoist_task_service._clear_cache()
+
+    user = user_data_with_mealie_items.user
+    mealie_list_id = user_data_with_mealie_items.mealie_list.id
+    project_id = user_data_with_mealie_items.todoist_data.project.id
+    mealie_items = mealie_list_service.get_all_list_items(mealie_list_id)
+    assert len(mealie_items) > 2
+
+    if fail_batch:
+        # the first batch of commands is applied, but the request for the second batch fails
+        monkeypatch.setattr(todoist_services, "MAX_COMMANDS_PER_REQUEST", 2)
+        sync = MockTodoistSyncClient.sync
+        command_requests: list[int] = []
+
+        def _sync(
+            self: MockTodoistSyncClient,
+            sync_token: str = "*",
+            resource_types: list[str] | None = None,
+            commands: list[TodoistSyncCommand] | None = None,
+        ):
+            if commands and any(command.type == "item_add" for command in commands):
+                command_requests.append(len(commands))
+                if len(command_requests) == 2:
+                    raise Exception("mock request failure")
+
+            return sync(self, sync_token, resource_types, commands)
+
+        monkeypatch.setattr(MockTodoistSyncClient, "sync", _sync)
+
+    else:
+        # one command in the batch is rejected by Todoist
+        execute_command = MockTodoistSyncClient._execute_command
+        rejected_commands: list[str] = []
+
+        def _execute_command(self: MockTodoistSyncClient, command: TodoistSyncCommand, *args, **kwargs):
+            if command.type == "item_add" and not rejected_commands:
+                rejected_commands.append(command.uuid)
+                response = Response()
+                response.status_code = 400
+                raise HTTPError(response=response)
+
+            return execute_command(self, command, *args, **kwargs)
+
+        monkeypatch.setattr(MockTodoistSyncClient, "_execute_command", _execute_command)
+
+    event = build_mealie_event_notification(MealieEventType.shopping_list_updated, mealie_list_id)
+    with pytest.raises(Exception):
+        send_mealie_event_notification(event, user)
+
+    todoist_task_service._clear_cache()
+    created_task_ids = {task.id for task in todoist_task_service.get_tasks(project_id)}
+    assert 0 < len(created_task_ids) < len(mealie_items)
+
+    # retry the sync
+    monkeypatch.undo()
+    monkeypatch.setattr(settings, "todoist_use_sync_api", True)
+    monkeypatch.setattr(settings, "item_links_mirror_to_extras", False)
+    send_mealie_event_notification(event, user)
+    todoist_task_service._clear_cache()
+
+    # the tasks which were already created are kept, rather than being replaced by duplicates
+    tasks = todoist_task_service.get_tasks(project_id)
+    assert created_task_ids <= {task.id for task in tasks}
+    assert sorted(task.content for task in tasks) == sorted(item.display for item in mealie_items)
+
+
+@pytest.mark.parametrize("use_sync_api", [False, True])
 def test_todoist_full_sync(
+    use_sync_api: bool,
     mealie_list_service: MealieListService,
     todoist_task_service: TodoistTaskService,
     user_data_with_mealie_items: MockLinkedUserAndData,
+    monkeypatch: pytest.MonkeyPatch,
 ):
+    monkeypatch.setattr(settings, "todoist_use_sync_api", use_sync_api)
     user = user_data_with_mealie_items.user
     mealie_list_id = user_data_with_mealie_items.mealie_list.id
     project_id = user_data_with_mealie_items.todoist_data.project.id
@@ -740,3 +1056,56 @@ def test_todoist_full_sync(
         assert mealie_item.extras
         assert mealie_item.extras.todoist_task_id == task.id
         assert settings.todoist_mealie_label in task.labels
+
+
+def test_todoist_sync_skips_unchanged_lists(
+    mealie_list_service: MealieListService,
+    todoist_task_service: TodoistTaskService,
+    user_data_with_mealie_items: MockLinkedUserAndData,
+):
+    user = user_data_with_mealie_items.user
+    mealie_list_id = user_data_with_mealie_items.mealie_list.id
+    project_id = user_data_with_mealie_items.todoist_data.project.id
+
+    # the first sync creates tasks and the second confirms the lists are in sync
+    for _ in range(2):
+        event = build_mealie_event_notification(MealieEventType.shopping_list_updated, mealie_list_id)
+        send_mealie_event_notification(event, user)
+        mealie_list_service._clear_cache()
+        todoist_task_service._clear_cache()
+
+    # once nothing has changed, the sync is skipped; metrics are normally flushed after each request
+    services.metrics.flush()
+    with mock.patch.object(services.metrics, "flush"), mock.patch.object(
+        TodoistTaskService, "update_task"
+    ) as update_task, mock.patch.object(TodoistTaskService, "add_task") as add_task:
+        event = build_mealie_event_notification(MealieEventType.shopping_list_updated, mealie_list_id)
+        send_mealie_event_notification(event, user)
+        mealie_list_service._clear_cache()
+        todoist_task_service._clear_cache()
+
+        assert not update_task.called and not add_task.called
+
+    assert services.metrics.get_counter("SyncFingerprintHits")
+    assert not services.metrics.get_counter("SyncFingerprintMisses")
+    services.metrics.flush()
+
+    # changing the list syncs it again
+    updated_item = random.choice(mealie_list_service.get_all_list_items(mealie_list_id))
+    mealie_list_service.update_items([updated_item.cast(MealieShoppingListItemUpdateBulk, note=random_string())])
+    mealie_list_service._clear_cache()
+
+    services.metrics.flush()
+    with mock.patch.object(services.metrics, "flush"):
+        event = build_mealie_event_notification(MealieEventType.shopping_list_updated, mealie_list_id)
+        send_mealie_event_notification(event, user)
+        mealie_list_service._clear_cache()
+        todoist_task_service._clear_cache()
+
+    assert services.metrics.get_counter("SyncFingerprintMisses")
+    assert not services.metrics.get_counter("SyncFingerprintHits")
+    services.metrics.flush()
+
+    updated_mealie_item = mealie_list_service.get_item(mealie_list_id, updated_item.id)
+    assert updated_mealie_item
+    assert updated_mealie_item.display in [task.content for task in todoist_task_service.get_tasks(project_id)]
@@ -3,6 +3,7 @@ import hashlib
 import hmac
 import json
 from datetime import datetime
+from typing import Any
 
 from fastapi.encoders import jsonable_encoder
 from fastapi.testclient import TestClient
@@ -10,7 +11,7 @@ from fastapi.testclient import TestClient
 from AppLambda.src.app import app, secrets, settings
 from AppLambda.src.models.alexa import AlexaListEvent, ObjectType, Operation
 from AppLambda.src.models.core import User
-from AppLambda.src.models.mealie import MealieEventNotification, MealieEventType
+from AppLambda.src.models.mealie import MealieEventNotification, MealieEventOperation, MealieEventType
 from AppLambda.src.models.todoist import TodoistEventType, TodoistWebhook
 from AppLambda.src.routes import event_handlers
 from tests.utils.users import get_auth_headers
@@ -23,8 +24,21 @@ def _get_api_client():
 
 
 def build_mealie_event_notification(
-    event_type: MealieEventType, shopping_list_id: str, use_internal_integration_id=False
+    event_type: MealieEventType,
+    shopping_list_id: str,
+    use_internal_integration_id=False,
+    item_ids: list[str] | None = None,
+    operation: MealieEventOperation | None = None,
 ) -> MealieEventNotification:
+    """Builds a Mealie event notification; if item ids are provided they're included in the document data"""
+
+    document_data: dict[str, Any] = {"shoppingListId": shopping_list_id}
+    if item_ids is not None:
+        document_data["shoppingListItemIds"] = item_ids
+
+    if operation:
+        document_data["operation"] = operation.value
+
     return MealieEventNotification(
         event_id=random_string(),
         timestamp=datetime.utcnow(),
@@ -33,13 +47,21 @@ def build_mealie_event_notification(
         message=random_string(),
         event_type=event_type,
         integration_id=settings.mealie_integration_id if use_internal_integration_id else random_string(),
-        document_data=json.dumps({"shoppingListId": shopping_list_id}),
+        document_data=json.dumps(document_data),
     )
 
 
-def build_todoist_webhook(event_type: TodoistEventType, todoist_user_id: str, project_id: str) -> TodoistWebhook:
+def build_todoist_webhook(
+    event_type: TodoistEventType, todoist_user_id: str, project_id: str, item: dict[str, Any] | None = None
+) -> TodoistWebhook:
+    """Builds a Todoist webhook; if an item is provided it's used as the event data, like real item webhooks"""
+
     return TodoistWebhook(
-        version=9, event_name=event_type, user_id=todoist_user_id, initiator={}, event_data={"project_id": project_id}
+        version=9,
+        event_name=event_type,
+        user_id=todoist_user_id,
+        initiator={},
+        event_data=item or {"project_id": project_id},
     )
 
 